@@ -5,6 +5,9 @@ This package contains function for creating the app and resetting the database.
 from flask import Flask
 
 from app.extensions import csrf, db
+from app.utils import sqlite
+from app.utils.instrumentation import sql_instrumentation
+from app.utils.unit_of_work import unit_of_work
 from config import Config
 
 
@@ -20,6 +23,50 @@ def create_app(config_class: Config = Config) -> Flask:
     # Register db ( deferred initialization )
     db.init_app(app=app)
 
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            sqlite.configure(db.engine, app.config.get("SQLITE_PRAGMAS", {}))
+
+    # Queries per request, registered first so that its after_request hook
+    # runs last, once the unit of work has committed
+    sql_instrumentation.init_app(app=app)
+
+    # One commit per request
+    unit_of_work.init_app(app=app)
+
+    # Write-behind buffers
+    from app.models.sale import sale_buffer
+    from app.models.vending_machine_record import snapshot_buffer
+
+    snapshot_buffer.init_app(app=app)
+    sale_buffer.init_app(app=app)
+
+    # Group commit of purchases
+    from app.models.vending_machine import purchase_scheduler
+
+    purchase_scheduler.init_app(app=app)
+
+    # Compaction of sharded balances
+    from app.models.machine_balance import balance_compactor
+
+    balance_compactor.init_app(app=app)
+
+    # Refresh of the sales rollups
+    from app.models.sale_rollup import rollup_scheduler
+
+    rollup_scheduler.init_app(app=app)
+
+    # Purchases served from memory
+    from app.models.inventory import inventory
+
+    inventory.init_app(app=app)
+
+    # In-process indexes and caches
+    from app.models.product import product_catalog, product_search
+
+    product_catalog.init_app(app=app)
+    product_search.init_app(app=app)
+
     # Blueprint registration
     from app.main import bp as main_bp
     from app.product import bp as product_bp
@@ -29,10 +76,29 @@ def create_app(config_class: Config = Config) -> Flask:
     app.register_blueprint(machine_bp)
     app.register_blueprint(product_bp)
 
+    # Command line
+    from app.cli import balance_cli, db_cli, inventory_cli, rollup_cli
+
+    app.cli.add_command(db_cli)
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(balance_cli)
+    app.cli.add_command(rollup_cli)
+
     return app
 
 
+# Recreates every table from the models, dropping all data. Migrations are
+# recorded as applied, the tables being up to date.
 def reset_db(app: Flask) -> None:
+    from app import migrations
+    from app.models.inventory import inventory
+    from app.models.product import product_catalog, product_search
+
     with app.app_context():
+        if inventory.enabled:
+            inventory.reset()
         db.drop_all()
         db.create_all()
+        migrations.stamp()
+        product_catalog.clear()
+        product_search.clear()
@@ -0,0 +1,109 @@
+"""
+Commands registered with the flask command line.
+"""
+
+from typing import Optional
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import migrations
+from app.extensions import db
+from app.models.inventory import inventory
+from app.models.machine_balance import MachineBalance
+from app.models.sale_rollup import SaleRollup
+
+inventory_cli = AppGroup("inventory", help="Manage the in-memory inventory.")
+balance_cli = AppGroup("balance", help="Manage machine balances.")
+rollup_cli = AppGroup("rollup", help="Manage the sales rollups.")
+db_cli = AppGroup("db", help="Migrate the database schema.")
+
+
+@inventory_cli.command("flush")
+def flush_inventory() -> None:
+    """Write sales held in memory back to the database."""
+    if not inventory.enabled:
+        raise click.ClickException("The in-memory inventory is not enabled.")
+
+    click.echo(f"Flushed {inventory.flush()} stock row(s).")
+
+
+@inventory_cli.command("reconcile")
+@click.option("--fix", is_flag=True, help="Reload machines which differ.")
+def reconcile_inventory(fix: bool) -> None:
+    """Compare the in-memory inventory against the database."""
+    if not inventory.enabled:
+        raise click.ClickException("The in-memory inventory is not enabled.")
+
+    differences = inventory.reconcile(fix=fix)
+    for difference in differences:
+        click.echo(current_app.json.dumps(difference))
+    click.echo(f"{len(differences)} difference(s) found.")
+
+
+@balance_cli.command("compact")
+def compact_balances() -> None:
+    """Fold balance shards into the balance of their machine."""
+    folded = MachineBalance.compact()
+    db.session.commit()
+    click.echo(f"Folded {folded} balance shard(s).")
+
+
+@rollup_cli.command("refresh")
+@click.option("--lag", type=float, help="Seconds sales are left to settle.")
+def refresh_rollups(lag: Optional[float]) -> None:
+    """Add sales recorded since the last refresh to the rollups."""
+    added = SaleRollup.refresh(lag=lag)
+    db.session.commit()
+    click.echo(f"Added {added} sale(s) to the rollups.")
+
+
+@rollup_cli.command("rebuild")
+def rebuild_rollups() -> None:
+    """Rebuild the rollups from the whole sales ledger."""
+    SaleRollup.rebuild()
+    added = SaleRollup.refresh()
+    db.session.commit()
+    click.echo(f"Added {added} sale(s) to the rollups.")
+
+
+@db_cli.command("upgrade")
+@click.argument("revision", required=False)
+def upgrade_db(revision: Optional[str]) -> None:
+    """Apply migrations up to REVISION ( the latest by default )."""
+    try:
+        revisions = migrations.upgrade(target=revision)
+    except migrations.MigrationError as error:
+        raise click.ClickException(str(error))
+
+    for applied in revisions:
+        click.echo(f"Applied {applied}.")
+    click.echo(f"At revision {migrations.current()}.")
+
+
+@db_cli.command("stamp")
+@click.argument("revision", required=False)
+def stamp_db(revision: Optional[str]) -> None:
+    """Mark migrations up to REVISION as applied without running them."""
+    try:
+        migrations.stamp(target=revision)
+    except migrations.MigrationError as error:
+        raise click.ClickException(str(error))
+
+    click.echo(f"At revision {migrations.current()}.")
+
+
+@db_cli.command("current")
+def current_db() -> None:
+    """Show the revision of the database."""
+    click.echo(migrations.current() or "None")
+
+
+@db_cli.command("history")
+def db_history() -> None:
+    """List every migration, marking those applied."""
+    done = set(migrations.applied())
+    for migration in migrations.MIGRATIONS:
+        mark = "x" if migration.revision in done else " "
+        click.echo(f"[{mark}] {migration.revision} {migration.description}")
@@ -0,0 +1,95 @@
+"""
+Versioned schema migrations, applied with `flask db upgrade`.
+
+Each module of `app.migrations.versions` changes the schema from the revision before it
+and is listed, in order, in MIGRATIONS. Applied revisions are recorded in
+`schema_migration`, so upgrading only runs what a database is missing. Databases
+created from the models by `reset_db` are stamped with the latest revision.
+"""
+
+from datetime import datetime
+from types import ModuleType
+from typing import List, Optional
+
+from app.extensions import db
+from app.migrations.operations import MigrationError, Operations
+from app.migrations.versions import MIGRATIONS
+
+
+class SchemaMigration(db.Model):
+    revision = db.Column(db.String(32), primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+
+def head() -> str:
+    return MIGRATIONS[-1].revision
+
+
+def _find(revision: str) -> int:
+    for index, migration in enumerate(MIGRATIONS):
+        if migration.revision == revision:
+            return index
+    raise MigrationError(f"Unknown revision. ({revision})")
+
+
+def applied() -> List[str]:
+    ops = Operations()
+    if not ops.has_table(SchemaMigration.__tablename__):
+        return []
+
+    with ops.begin() as connection:
+        return list(connection.scalars(db.select(SchemaMigration.revision)))
+
+
+# Latest applied revision, None for a database never migrated
+def current() -> Optional[str]:
+    done = set(applied())
+    revisions = [m.revision for m in MIGRATIONS if m.revision in done]
+    return revisions[-1] if revisions else None
+
+
+# Migrations not applied yet, up to and including `target` ( the head by default )
+def pending(target: Optional[str] = None) -> List[ModuleType]:
+    done = set(applied())
+    upto = _find(target or head())
+    return [m for m in MIGRATIONS[: upto + 1] if m.revision not in done]
+
+
+def _record(ops: Operations, migration: ModuleType) -> None:
+    with ops.begin() as connection:
+        connection.execute(
+            db.insert(SchemaMigration),
+            {
+                "revision": migration.revision,
+                "description": migration.description,
+                "applied_at": datetime.today(),
+            },
+        )
+
+
+# Applies pending migrations in order, recording each as it completes.
+# Returns the revisions applied.
+def upgrade(target: Optional[str] = None) -> List[str]:
+    ops = Operations()
+    ops.create_table(SchemaMigration.__table__)
+
+    revisions = []
+    for migration in pending(target):
+        migration.upgrade(ops)
+        _record(ops, migration)
+        revisions.append(migration.revision)
+    return revisions
+
+
+# Records migrations up to `target` as applied without running them, for
+# databases whose schema was created otherwise
+def stamp(target: Optional[str] = None) -> List[str]:
+    ops = Operations()
+    ops.create_table(SchemaMigration.__table__)
+
+    revisions = []
+    for migration in pending(target):
+        _record(ops, migration)
+        revisions.append(migration.revision)
+    return revisions
@@ -0,0 +1,164 @@
+"""
+Schema changes safe to run against a live database.
+
+Each operation runs in its own short transaction and skips work already done, so an
+upgrade interrupted halfway ( MySQL commits DDL implicitly, it can't be rolled back )
+is simply run again. On MySQL, indexes and columns are added with
+ALGORITHM=INPLACE, LOCK=NONE so reads and writes carry on while they are built, and
+every statement waits at most MIGRATION_LOCK_TIMEOUT seconds for the metadata lock
+instead of queueing every query behind it. Backfills update MIGRATION_BATCH_SIZE rows
+per transaction, in primary key order, pausing MIGRATION_BATCH_PAUSE seconds between
+batches.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import current_app
+from sqlalchemy import Connection
+from sqlalchemy.schema import CreateColumn
+
+from app.extensions import db
+
+ONLINE = "ALGORITHM=INPLACE, LOCK=NONE"
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Operations:
+    def __init__(self) -> None:
+        self.engine = db.engine
+        self.dialect = self.engine.dialect.name
+        self.lock_timeout = current_app.config.get("MIGRATION_LOCK_TIMEOUT", 5)
+        self.batch_size = current_app.config.get("MIGRATION_BATCH_SIZE", 1000)
+        self.batch_pause = current_app.config.get("MIGRATION_BATCH_PAUSE", 0.0)
+
+    @contextmanager
+    def begin(self) -> Iterator[Connection]:
+        with self.engine.begin() as connection:
+            if self.dialect == "mysql":
+                connection.exec_driver_sql(
+                    f"SET SESSION lock_wait_timeout = {int(self.lock_timeout)}"
+                )
+            yield connection
+
+    def _quote(self, name: str) -> str:
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def has_table(self, name: str) -> bool:
+        with self.begin() as connection:
+            return db.inspect(connection).has_table(name)
+
+    def has_column(self, table: str, column: str) -> bool:
+        with self.begin() as connection:
+            columns = db.inspect(connection).get_columns(table)
+        return any(existing["name"] == column for existing in columns)
+
+    def has_index(self, table: str, name: str) -> bool:
+        with self.begin() as connection:
+            inspector = db.inspect(connection)
+            indexes = inspector.get_indexes(table)
+            indexes += inspector.get_unique_constraints(table)
+        return any(index["name"] == name for index in indexes)
+
+    # Reflects the table as it is in the database
+    def table(self, name: str) -> db.Table:
+        with self.begin() as connection:
+            return db.Table(name, db.MetaData(), autoload_with=connection)
+
+    # Creates the table, along with its indexes, unless it exists
+    def create_table(self, table: db.Table) -> None:
+        with self.begin() as connection:
+            table.create(connection, checkfirst=True)
+
+    # Unique indexes double as unique constraints, on SQLite too
+    def create_index(
+        self, name: str, table: str, columns: List[str], unique: bool = False
+    ) -> None:
+        if self.has_index(table, name):
+            return
+
+        if unique:
+            self._check_unique(table, columns)
+
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        keys = ", ".join(self._quote(column) for column in columns)
+        sql = f"CREATE {kind} {self._quote(name)} ON {self._quote(table)} ({keys})"
+        if self.dialect == "mysql":
+            sql += f" {ONLINE}"
+
+        with self.begin() as connection:
+            connection.exec_driver_sql(sql)
+
+    # Adds a column, nullable or with a server default, unless it exists.
+    # Existing rows are filled in with `backfill`.
+    def add_column(self, table: str, column: db.Column) -> None:
+        if self.has_column(table, column.name):
+            return
+
+        # Columns are compiled as part of a table
+        db.Table(table, db.MetaData(), column)
+        spec = CreateColumn(column).compile(dialect=self.engine.dialect)
+        sql = f"ALTER TABLE {self._quote(table)} ADD COLUMN {spec}"
+        if self.dialect == "mysql":
+            sql += f", {ONLINE}"
+
+        with self.begin() as connection:
+            connection.exec_driver_sql(sql)
+
+    # Sets `values` on the rows matching `where`, a batch at a time, walking
+    # the primary key so no batch rescans rows already done. Returns the
+    # number of rows updated.
+    def backfill(
+        self,
+        table: db.Table,
+        values: Dict[str, Any],
+        where: Optional[Any] = None,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        batch_size = batch_size or self.batch_size
+        key = db.tuple_(*table.primary_key.columns)
+
+        find = db.select(*table.primary_key.columns).order_by(
+            *table.primary_key.columns
+        )
+        if where is not None:
+            find = find.where(where)
+
+        updated = 0
+        last = None
+        while True:
+            with self.begin() as connection:
+                batch = find if last is None else find.where(key > db.tuple_(*last))
+                keys = connection.execute(batch.limit(batch_size)).all()
+                if not keys:
+                    return updated
+
+                connection.execute(
+                    db.update(table)
+                    .where(key.in_([tuple(row) for row in keys]))
+                    .values(values)
+                )
+
+            updated += len(keys)
+            last = keys[-1]
+            if self.batch_pause:
+                time.sleep(self.batch_pause)
+
+    # Fails with the offending values rather than halfway through the build
+    def _check_unique(self, table: str, columns: List[str]) -> None:
+        reflected = self.table(table)
+        keys = [reflected.c[column] for column in columns]
+        with self.begin() as connection:
+            duplicates = connection.execute(
+                db.select(*keys).group_by(*keys).having(db.func.count() > 1).limit(10)
+            ).all()
+
+        if duplicates:
+            found = ", ".join(str(tuple(row)) for row in duplicates)
+            raise MigrationError(
+                f"Duplicate values of ({', '.join(columns)}) in {table}, resolve them first: {found}"
+            )
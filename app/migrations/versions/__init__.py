@@ -0,0 +1,11 @@
+"""
+Migrations, oldest first. Revisions are never edited once released, a change to the
+schema is a new module appended here.
+"""
+
+from app.migrations.versions import v0001_baseline, v0002_ledgers_and_indexes
+
+MIGRATIONS = [
+    v0001_baseline,
+    v0002_ledgers_and_indexes,
+]
@@ -0,0 +1,71 @@
+"""
+The schema as first released, created with `db.create_all`. Existing databases already
+have these tables and are left untouched.
+"""
+
+from app.extensions import db
+from app.migrations.operations import Operations
+
+revision = "0001"
+description = "Machines, products, stock and stock records"
+
+metadata = db.MetaData()
+
+machine = db.Table(
+    "machine",
+    metadata,
+    db.Column("machine_id", db.Integer, primary_key=True, autoincrement=True),
+    db.Column("machine_name", db.String(20), nullable=False),
+    db.Column("location", db.String(20), nullable=False),
+    db.Column("balance", db.DECIMAL(20, 2), nullable=False),
+)
+
+product = db.Table(
+    "product",
+    metadata,
+    db.Column("product_id", db.Integer, primary_key=True, autoincrement=True),
+    db.Column("product_name", db.String(20), unique=True, nullable=False),
+    db.Column("product_price", db.DECIMAL(8, 2), nullable=False),
+)
+
+machine_stock = db.Table(
+    "machine_stock",
+    metadata,
+    db.Column(
+        "machine_id",
+        db.Integer,
+        db.ForeignKey("machine.machine_id"),
+        primary_key=True,
+    ),
+    db.Column(
+        "product_id",
+        db.Integer,
+        db.ForeignKey("product.product_id"),
+        primary_key=True,
+    ),
+    db.Column("quantity", db.Integer, nullable=False),
+)
+
+stock_record = db.Table(
+    "stock_record",
+    metadata,
+    db.Column(
+        "product_id",
+        db.Integer,
+        db.ForeignKey("product.product_id"),
+        primary_key=True,
+    ),
+    db.Column(
+        "machine_id",
+        db.Integer,
+        db.ForeignKey("machine.machine_id"),
+        primary_key=True,
+    ),
+    db.Column("time_stamp", db.DateTime, primary_key=True),
+    db.Column("quantity", db.Integer, nullable=False),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for table in metadata.sorted_tables:
+        op.create_table(table)
@@ -0,0 +1,131 @@
+"""
+Tables and indexes of the hot paths: the in-memory inventory checkpoint, sharded
+machine balances, the sales ledger and its rollups, covering indexes for stock
+lookups and time range scans, and the unique key on machines.
+
+Indexes on existing tables are built online, the new tables start out empty.
+"""
+
+from sqlalchemy.dialects import mysql
+
+from app.extensions import db
+from app.migrations.operations import Operations
+
+revision = "0002"
+description = "Balance shards, sales ledger, rollups and hot path indexes"
+
+metadata = db.MetaData()
+
+# Referenced by the foreign keys below, not created here
+db.Table("machine", metadata, db.Column("machine_id", db.Integer, primary_key=True))
+db.Table("product", metadata, db.Column("product_id", db.Integer, primary_key=True))
+
+inventory_checkpoint = db.Table(
+    "inventory_checkpoint",
+    metadata,
+    db.Column("name", db.String(32), primary_key=True),
+    db.Column("seq", db.BigInteger, nullable=False),
+)
+
+machine_balance = db.Table(
+    "machine_balance",
+    metadata,
+    db.Column(
+        "machine_id",
+        db.Integer,
+        db.ForeignKey("machine.machine_id"),
+        primary_key=True,
+    ),
+    db.Column("shard", db.Integer, primary_key=True, autoincrement=False),
+    db.Column("amount", db.DECIMAL(20, 2), nullable=False),
+)
+
+sale = db.Table(
+    "sale",
+    metadata,
+    db.Column(
+        "sale_id",
+        db.BigInteger().with_variant(db.Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    ),
+    db.Column("purchase_id", db.String(32), nullable=False),
+    db.Column(
+        "machine_id", db.Integer, db.ForeignKey("machine.machine_id"), nullable=False
+    ),
+    db.Column(
+        "product_id", db.Integer, db.ForeignKey("product.product_id"), nullable=False
+    ),
+    db.Column("quantity", db.Integer, nullable=False),
+    db.Column("unit_price", db.DECIMAL(20, 2), nullable=False),
+    db.Column("amount", db.DECIMAL(20, 2), nullable=False),
+    db.Column("paid", db.DECIMAL(20, 2), nullable=False),
+    db.Column("change", db.DECIMAL(20, 2), nullable=False),
+    db.Column(
+        "sold_at",
+        db.DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"),
+        nullable=False,
+    ),
+    db.Index("ix_sale_machine_time", "machine_id", "sold_at"),
+    db.Index("ix_sale_product_time", "product_id", "sold_at"),
+)
+
+sale_rollup = db.Table(
+    "sale_rollup",
+    metadata,
+    db.Column("period", db.String(8), primary_key=True),
+    db.Column("bucket", db.DateTime, primary_key=True),
+    db.Column(
+        "machine_id",
+        db.Integer,
+        db.ForeignKey("machine.machine_id"),
+        primary_key=True,
+    ),
+    db.Column(
+        "product_id",
+        db.Integer,
+        db.ForeignKey("product.product_id"),
+        primary_key=True,
+    ),
+    db.Column("sales", db.Integer, nullable=False),
+    db.Column("units", db.Integer, nullable=False),
+    db.Column("revenue", db.DECIMAL(20, 2), nullable=False),
+    db.Index("ix_sale_rollup_machine_time", "period", "machine_id", "bucket"),
+    db.Index("ix_sale_rollup_product_time", "period", "product_id", "bucket"),
+)
+
+rollup_watermark = db.Table(
+    "rollup_watermark",
+    metadata,
+    db.Column("name", db.String(32), primary_key=True),
+    db.Column("sale_id", db.BigInteger, nullable=False),
+)
+
+
+def upgrade(op: Operations) -> None:
+    for table in (
+        inventory_checkpoint,
+        machine_balance,
+        sale,
+        sale_rollup,
+        rollup_watermark,
+    ):
+        op.create_table(table)
+
+    op.create_index(
+        "ix_machine_stock_product",
+        "machine_stock",
+        ["product_id", "machine_id", "quantity"],
+    )
+    op.create_index(
+        "ix_stock_record_product_time", "stock_record", ["product_id", "time_stamp"]
+    )
+    op.create_index(
+        "ix_stock_record_machine_time", "stock_record", ["machine_id", "time_stamp"]
+    )
+    op.create_index(
+        "uq_machine_location_name",
+        "machine",
+        ["location", "machine_name"],
+        unique=True,
+    )
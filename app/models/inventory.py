@@ -0,0 +1,510 @@
+"""
+Optional in-memory inventory engine, enabled with INVENTORY_MODE = "memory".
+
+Stock counts and balances of the machines being sold from are held in flat arrays,
+indexed by slots handed out per ( machine, product ) pair and per machine. Purchases
+are checked and applied in memory under one lock, and appended to a write-ahead log
+before being acknowledged, so the purchase path never waits on the database.
+
+A background flusher writes what was sold since its last run back to the database
+every INVENTORY_FLUSH_INTERVAL seconds, in one transaction, as deltas
+( quantity - sold, balance + income ) along with the sequence number of the last
+log record it covers. On restart, log records past that number are replayed.
+Since the database is only ever changed by deltas, restocking through the regular
+endpoints adds up with sales which are yet to be flushed; machines restocked that
+way are reloaded on their next purchase. Editing or removing stock sets quantities
+outright instead, sales of those rows which are yet to be flushed are then dropped
+once the change commits.
+
+The engine is authoritative for the process holding it, so only one process may
+serve purchases while it is enabled. Reads of stock and balances through the
+database lag behind by up to one flush interval.
+"""
+
+import atexit
+import os
+import threading
+from array import array
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import Flask, current_app
+
+from app.extensions import db
+from app.models.machine_balance import MachineBalance
+from app.utils.periodic import PeriodicWorker
+from app.utils.upsert import upsert
+from app.utils.wal import WriteAheadLog
+
+MODE_DATABASE = "database"
+MODE_MEMORY = "memory"
+
+# Amounts of money are kept in cents
+CENTS = Decimal(100)
+
+StockKey = Tuple[int, int]  # ( machine_id, product_id )
+
+
+class InventoryCheckpoint(db.Model):
+    # Sequence number of the last write-ahead log record flushed to the database
+    name = db.Column(db.String(32), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class _Inventory:
+    def __init__(self, app: Flask, wal: WriteAheadLog, interval: float) -> None:
+        self.app = app
+        self.wal = wal
+
+        # Guards everything below, held only briefly
+        self.lock = threading.Lock()
+        # Held while talking to the database, so that loads never see
+        # a flush half way through
+        self.flush_lock = threading.Lock()
+
+        self.stock_slots: Dict[StockKey, int] = {}
+        self.stock_keys: List[StockKey] = []
+        self.quantities = array("q")
+        self.sold = array("q")  # Since the last flush
+
+        self.machine_slots: Dict[int, int] = {}
+        self.machine_keys: List[int] = []
+        self.balances = array("q")
+        self.income = array("q")  # Since the last flush
+
+        self.loaded: Set[int] = set()
+        self.dirty_stock: Set[int] = set()
+        self.dirty_machines: Set[int] = set()
+
+        self.seq = 0
+        self.recovered = False
+
+        self.worker = PeriodicWorker("inventory-flusher", interval, self.flush)
+
+    def stock_slot(self, key: StockKey) -> int:
+        if (slot := self.stock_slots.get(key)) is None:
+            slot = self.stock_slots[key] = len(self.stock_keys)
+            self.stock_keys.append(key)
+            self.quantities.append(0)
+            self.sold.append(0)
+        return slot
+
+    def machine_slot(self, machine_id: int) -> int:
+        if (slot := self.machine_slots.get(machine_id)) is None:
+            slot = self.machine_slots[machine_id] = len(self.machine_keys)
+            self.machine_keys.append(machine_id)
+            self.balances.append(0)
+            self.income.append(0)
+        return slot
+
+    # Records a sale in memory, expects the lock to be held
+    def apply(self, machine_id: int, amounts: Dict[int, int], income: int) -> None:
+        for product_id, amount in amounts.items():
+            slot = self.stock_slot((machine_id, product_id))
+            self.quantities[slot] -= amount
+            self.sold[slot] += amount
+            self.dirty_stock.add(slot)
+
+        slot = self.machine_slot(machine_id)
+        self.balances[slot] += income
+        self.income[slot] += income
+        self.dirty_machines.add(slot)
+
+    # Drops what was sold from the given slots since the last flush, and has
+    # their machines reloaded. Expects the lock to be held.
+    def settle(self, keys: Iterable[StockKey]) -> None:
+        for key in keys:
+            if (slot := self.stock_slots.get(key)) is not None:
+                self.sold[slot] = 0
+                self.dirty_stock.discard(slot)
+            self.loaded.discard(key[0])
+
+    # Drops the slots of deleted machines along with what they sold since the
+    # last flush, expects the lock to be held
+    def forget(self, machine_ids: Set[int]) -> None:
+        for key in [key for key in self.stock_slots if key[0] in machine_ids]:
+            slot = self.stock_slots.pop(key)
+            self.sold[slot] = 0
+            self.dirty_stock.discard(slot)
+
+        for machine_id in machine_ids & self.machine_slots.keys():
+            slot = self.machine_slots.pop(machine_id)
+            self.income[slot] = 0
+            self.dirty_machines.discard(slot)
+
+        self.loaded.difference_update(machine_ids)
+
+    # Replays log records which did not make it to the database, expects the
+    # flush lock to be held and an app context
+    def recover(self) -> None:
+        if self.recovered:
+            return
+
+        checkpoint = db.session.get(InventoryCheckpoint, MODE_MEMORY)
+        flushed = checkpoint.seq if checkpoint else 0
+
+        with self.lock:
+            self.seq = flushed
+            for record in self.wal.replay():
+                if record["seq"] <= flushed:
+                    continue
+                amounts = {int(pid): amount for pid, amount in record["sold"].items()}
+                self.apply(record["machine_id"], amounts, record["income"])
+                self.seq = max(self.seq, record["seq"])
+
+            # What was replayed is not reflected by loaded quantities yet
+            self.loaded.clear()
+            self.recovered = True
+
+    # Reads the stock and balance of a machine, minus what is yet to be
+    # flushed. Expects the flush lock to be held and an app context.
+    def load(self, machine_id: int) -> None:
+        from app.models.vending_machine import Machine
+        from app.models.vending_machine_stock import MachineStock
+
+        balance = db.session.execute(
+            db.select(Machine.balance).where(Machine.machine_id == machine_id)
+        ).scalar_one_or_none()
+        if balance is None:
+            return
+
+        rows = db.session.execute(
+            db.select(MachineStock.product_id, MachineStock.quantity).where(
+                MachineStock.machine_id == machine_id
+            )
+        ).all()
+
+        with self.lock:
+            for product_id, quantity in rows:
+                slot = self.stock_slot((machine_id, product_id))
+                self.quantities[slot] = quantity - self.sold[slot]
+
+            slot = self.machine_slot(machine_id)
+            self.balances[slot] = int(balance * CENTS) + self.income[slot]
+            self.loaded.add(machine_id)
+
+    # Writes everything sold so far to the database, returns the number of
+    # stock rows updated
+    def flush(self) -> int:
+        with self.flush_lock, self.app.app_context():
+            self.recover()
+
+            with self.lock:
+                sold = {
+                    self.stock_keys[slot]: self.sold[slot] for slot in self.dirty_stock
+                }
+                income = {
+                    self.machine_keys[slot]: self.income[slot]
+                    for slot in self.dirty_machines
+                }
+                for slot in self.dirty_stock:
+                    self.sold[slot] = 0
+                for slot in self.dirty_machines:
+                    self.income[slot] = 0
+                self.dirty_stock.clear()
+                self.dirty_machines.clear()
+
+                seq = self.seq
+                segments = self.wal.rotate()
+
+            if not sold and not income:
+                self.wal.discard(segments)
+                return 0
+
+            try:
+                self.write(sold, income, seq)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Failed to flush the inventory.")
+
+                # Keep it for the next attempt, the log segments stay on disk
+                with self.lock:
+                    for key, amount in sold.items():
+                        slot = self.stock_slot(key)
+                        self.sold[slot] += amount
+                        self.dirty_stock.add(slot)
+                    for machine_id, cents in income.items():
+                        slot = self.machine_slot(machine_id)
+                        self.income[slot] += cents
+                        self.dirty_machines.add(slot)
+                return 0
+
+            self.wal.discard(segments)
+            return len(sold)
+
+    # Sales of machines deleted in the meantime ( or replayed from the log after
+    # they were ) are left out, there is nothing to write them to
+    @staticmethod
+    def write(sold: Dict[StockKey, int], income: Dict[int, int], seq: int) -> None:
+        from app.models.vending_machine import Machine
+        from app.models.vending_machine_record import StockRecord
+        from app.models.vending_machine_stock import MachineStock
+
+        machine_ids = {machine_id for machine_id, _ in sold} | set(income)
+        existing = set(
+            db.session.execute(
+                db.select(Machine.machine_id).where(Machine.machine_id.in_(machine_ids))
+            ).scalars()
+        )
+
+        by_machine: Dict[int, Dict[int, int]] = {}
+        for (machine_id, product_id), amount in sold.items():
+            if machine_id in existing:
+                by_machine.setdefault(machine_id, {})[product_id] = amount
+
+        for machine_id, amounts in by_machine.items():
+            taken = db.case(amounts, value=MachineStock.product_id)
+            db.session.execute(
+                db.update(MachineStock)
+                .where(
+                    MachineStock.machine_id == machine_id,
+                    MachineStock.product_id.in_(list(amounts)),
+                )
+                .values(quantity=MachineStock.quantity - taken)
+            )
+            StockRecord.make_many(
+                machine_id=machine_id,
+                quantities=MachineStock.quantities(machine_id, amounts),
+            )
+
+        MachineBalance.credit_many(
+            {
+                machine_id: Decimal(cents) / CENTS
+                for machine_id, cents in income.items()
+                if machine_id in existing
+            }
+        )
+
+        db.session.execute(
+            upsert(InventoryCheckpoint.__table__, keys=("name",), replace=("seq",)),
+            [{"name": MODE_MEMORY, "seq": seq}],
+        )
+
+    def close(self) -> None:
+        self.worker.stop()
+
+        # Nothing can have been sold before recovering
+        if self.recovered:
+            self.flush()
+        self.wal.close()
+
+
+class InventoryEngine:
+    def __init__(self, name: str, config_prefix: str) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+
+    def init_app(self, app: Flask) -> None:
+        prefix = self.config_prefix
+        if app.config.get(f"{prefix}_MODE", MODE_DATABASE) != MODE_MEMORY:
+            app.extensions.pop(self.name, None)
+            return
+
+        directory = app.config.get(f"{prefix}_WAL_DIR")
+        wal = WriteAheadLog(
+            directory=directory or os.path.join(app.instance_path, "inventory"),
+            name="inventory",
+            sync=app.config.get(f"{prefix}_WAL_SYNC", False),
+        )
+        state = _Inventory(
+            app=app, wal=wal, interval=app.config.get(f"{prefix}_FLUSH_INTERVAL", 0.5)
+        )
+        app.extensions[self.name] = state
+        atexit.register(state.close)
+
+    @property
+    def enabled(self) -> bool:
+        return self.name in current_app.extensions
+
+    @property
+    def _state(self) -> _Inventory:
+        return current_app.extensions[self.name]
+
+    def _ensure_loaded(self, state: _Inventory, machine_id: int) -> None:
+        if state.recovered and machine_id in state.loaded:
+            return
+
+        with state.flush_lock:
+            state.recover()
+            if machine_id not in state.loaded:
+                state.load(machine_id)
+
+    # Returns { product_id: ( price, quantity ) } for the given products of a
+    # machine, leaving out those it does not stock
+    def listings(
+        self, machine_id: int, product_ids: Iterable[int]
+    ) -> Dict[int, Tuple[Decimal, int]]:
+        from app.models.product import Product
+
+        state = self._state
+        self._ensure_loaded(state, machine_id)
+
+        with state.lock:
+            quantities = {
+                product_id: state.quantities[slot]
+                for product_id in product_ids
+                if (slot := state.stock_slots.get((machine_id, product_id))) is not None
+            }
+
+        products = Product.cached_many(quantities)
+        return {
+            product_id: (products[product_id].product_price, quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        }
+
+    def listing(
+        self, machine_id: int, product_id: int
+    ) -> Optional[Tuple[Decimal, int]]:
+        return self.listings(machine_id, [product_id]).get(product_id)
+
+    # Takes the given amounts ( { product_id: amount } ) of stock and credits
+    # `income` to the machine, only if enough of every product is left.
+    # Returns whether it happened, once it is in the write-ahead log.
+    def take(self, machine_id: int, amounts: Dict[int, int], income: Decimal) -> bool:
+        state = self._state
+        self._ensure_loaded(state, machine_id)
+        cents = int(income * CENTS)
+
+        with state.lock:
+            for product_id, amount in amounts.items():
+                slot = state.stock_slots.get((machine_id, product_id))
+                if slot is None or state.quantities[slot] < amount:
+                    return False
+
+            state.seq += 1
+            state.wal.append(
+                {
+                    "seq": state.seq,
+                    "machine_id": machine_id,
+                    "sold": amounts,
+                    "income": cents,
+                }
+            )
+            state.apply(machine_id, amounts, cents)
+
+        state.worker.start()
+        return True
+
+    # Machines whose stock was changed in the database directly are
+    # reloaded on their next purchase
+    def evict(self, machine_ids: Iterable[int]) -> None:
+        state = self._state
+        with state.lock:
+            state.loaded.difference_update(machine_ids)
+
+    # Returns { product_id: amount } sold from a machine and not flushed yet,
+    # the stock stored in the database is that much too high
+    def unflushed(self, machine_id: int) -> Dict[int, int]:
+        state = self._state
+        with state.lock:
+            return {
+                product_id: state.sold[slot]
+                for (key_machine_id, product_id), slot in state.stock_slots.items()
+                if key_machine_id == machine_id and state.sold[slot]
+            }
+
+    # Stock given an absolute quantity, rather than restocked by an amount,
+    # already accounts for what was sold. Sales from it which are yet to be
+    # flushed are dropped, so they are not subtracted from it again.
+    def settle(self, keys: Iterable[StockKey]) -> None:
+        state = self._state
+        with state.lock:
+            state.settle(keys)
+
+    # Drops machines which were deleted, sales of theirs yet to be flushed included
+    def forget(self, machine_ids: Iterable[int]) -> None:
+        state = self._state
+        with state.lock:
+            state.forget(set(machine_ids))
+
+    def flush(self) -> int:
+        return self._state.flush()
+
+    # Flushes, then compares every machine held in memory against the database.
+    # Returns the differences found, with `fix` the machines are reloaded.
+    def reconcile(self, fix: bool = False) -> List[Dict]:
+        from app.models.vending_machine import Machine
+        from app.models.vending_machine_stock import MachineStock
+
+        state = self._state
+        flushed = state.flush()
+
+        differences = []
+        with state.flush_lock:
+            machine_ids = sorted(state.loaded)
+            rows = db.session.execute(
+                db.select(
+                    MachineStock.machine_id,
+                    MachineStock.product_id,
+                    MachineStock.quantity,
+                ).where(MachineStock.machine_id.in_(machine_ids))
+            )
+            stock = {
+                (machine_id, product_id): quantity
+                for machine_id, product_id, quantity in rows
+            }
+            balances = dict(
+                db.session.execute(
+                    db.select(Machine.machine_id, Machine.balance).where(
+                        Machine.machine_id.in_(machine_ids)
+                    )
+                ).all()
+            )
+
+            with state.lock:
+                for key, slot in state.stock_slots.items():
+                    if key[0] not in state.loaded:
+                        continue
+                    memory = state.quantities[slot] + state.sold[slot]
+                    if memory != stock.get(key):
+                        differences.append(
+                            {
+                                "machine_id": key[0],
+                                "product_id": key[1],
+                                "memory": memory,
+                                "database": stock.get(key),
+                            }
+                        )
+
+                for machine_id in machine_ids:
+                    slot = state.machine_slots[machine_id]
+                    memory = Decimal(state.balances[slot] - state.income[slot]) / CENTS
+                    if memory != balances.get(machine_id):
+                        differences.append(
+                            {
+                                "machine_id": machine_id,
+                                "balance": {
+                                    "memory": memory,
+                                    "database": balances.get(machine_id),
+                                },
+                            }
+                        )
+
+                if fix:
+                    state.loaded.difference_update(
+                        difference["machine_id"] for difference in differences
+                    )
+
+        current_app.logger.info(
+            "Inventory reconciled, %d rows flushed, %d differences.",
+            flushed,
+            len(differences),
+        )
+        return differences
+
+    # Forgets everything held in memory and on disk, for when the database is reset
+    def reset(self) -> None:
+        state = self._state
+        state.worker.stop()
+        atexit.unregister(state.close)
+        with state.flush_lock, state.lock:
+            state.wal.discard(state.wal.rotate())
+            state.wal.close()
+            state.recovered = False
+        self.init_app(state.app)
+
+
+# Enabled with INVENTORY_MODE = "memory"
+inventory = InventoryEngine(name="inventory", config_prefix="INVENTORY")
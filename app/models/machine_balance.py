@@ -0,0 +1,147 @@
+"""
+Machine balances, accumulated into sharded counter rows.
+
+Every credit is added onto one of BALANCE_SHARDS rows of the machine, picked at
+random, instead of onto the machine row itself, so concurrent purchases from one
+machine only contend when they land on the same shard and never block edits of the
+machine. The balance of a machine is its settled balance plus its shards, summed
+in the query loading it. Shards are periodically folded back into the settled
+balance ( see `compact` ), every BALANCE_COMPACT_INTERVAL seconds.
+"""
+
+import atexit
+import random
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from flask import Flask, current_app
+
+from app.extensions import db
+from app.utils.periodic import PeriodicWorker
+from app.utils.upsert import upsert
+
+
+class MachineBalance(db.Model):
+    machine_id = db.Column(
+        db.Integer, db.ForeignKey("machine.machine_id"), primary_key=True
+    )
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    amount = db.Column(db.DECIMAL(20, 2), nullable=False, default=0.0)
+
+    # Sum of the shards of the machine in the enclosing query, for column_property
+    @staticmethod
+    def pending(machine_id: db.Column):  # noqa: ANN205
+        return (
+            db.select(db.func.coalesce(db.func.sum(MachineBalance.amount), 0))
+            .where(MachineBalance.machine_id == machine_id)
+            .correlate_except(MachineBalance)
+            .scalar_subquery()
+        )
+
+    # Adds `credits` ( { machine_id: amount } ) onto a random shard of each machine
+    @staticmethod
+    def credit_many(credits: Dict[int, Decimal]) -> None:
+        shards = current_app.config.get("BALANCE_SHARDS", 8)
+        rows = [
+            {
+                "machine_id": machine_id,
+                "shard": random.randrange(shards),
+                "amount": amount,
+            }
+            for machine_id, amount in credits.items()
+            if amount
+        ]
+        if not rows:
+            return
+
+        db.session.execute(
+            upsert(
+                MachineBalance.__table__,
+                keys=("machine_id", "shard"),
+                increment=("amount",),
+            ),
+            rows,
+        )
+        balance_compactor.start()
+
+    @staticmethod
+    def credit(machine_id: int, amount: Decimal) -> None:
+        MachineBalance.credit_many({machine_id: amount})
+
+    # Folds the shards of the given machines ( every machine by default ) into
+    # their settled balance and deletes them. Returns the number of shards folded.
+    @staticmethod
+    def compact(machine_ids: Optional[Iterable[int]] = None) -> int:
+        from app.models.vending_machine import Machine
+
+        stmt = db.select(
+            MachineBalance.machine_id, MachineBalance.shard, MachineBalance.amount
+        )
+        if machine_ids is not None:
+            stmt = stmt.where(MachineBalance.machine_id.in_(list(machine_ids)))
+
+        # Credits landing on these shards meanwhile wait for the lock, credits
+        # creating new shards are left for the next run
+        shards = db.session.execute(stmt.with_for_update()).all()
+        if not shards:
+            return 0
+
+        totals: Dict[int, Decimal] = {}
+        for machine_id, _, amount in shards:
+            totals[machine_id] = totals.get(machine_id, Decimal(0)) + amount
+
+        folded = db.case(totals, value=Machine.machine_id)
+        db.session.execute(
+            db.update(Machine)
+            .where(Machine.machine_id.in_(list(totals)))
+            .values({Machine.settled_balance: Machine.settled_balance + folded}),
+            execution_options={"synchronize_session": False},
+        )
+        db.session.execute(
+            db.delete(MachineBalance).where(
+                db.tuple_(MachineBalance.machine_id, MachineBalance.shard).in_(
+                    [(machine_id, shard) for machine_id, shard, _ in shards]
+                )
+            )
+        )
+        return len(shards)
+
+    @staticmethod
+    def remove(machine_id: int) -> None:
+        db.session.execute(
+            db.delete(MachineBalance).where(MachineBalance.machine_id == machine_id)
+        )
+
+
+class BalanceCompactor:
+    def __init__(self, name: str, config_prefix: str) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+
+    def init_app(self, app: Flask) -> None:
+        interval = app.config.get(f"{self.config_prefix}_COMPACT_INTERVAL", 60.0)
+        if not interval:
+            app.extensions.pop(self.name, None)
+            return
+
+        def compact() -> None:
+            with app.app_context():
+                try:
+                    MachineBalance.compact()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Failed to compact balances.")
+
+        worker = PeriodicWorker(f"{self.name}-worker", interval, compact)
+        app.extensions[self.name] = worker
+        atexit.register(worker.stop)
+
+    # Safe to call repeatedly, the worker is started on the first credit
+    def start(self) -> None:
+        if worker := current_app.extensions.get(self.name):
+            worker.start()
+
+
+# Disabled with BALANCE_COMPACT_INTERVAL = 0
+balance_compactor = BalanceCompactor(name="balance_compactor", config_prefix="BALANCE")
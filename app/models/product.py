@@ -1,10 +1,16 @@
 import math
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Union
 
 from app.extensions import db
 from app.utils import common
+from app.utils.commit_tracker import CommitTracker
+from app.utils.integrity import try_insert
 from app.utils.log import Log
+from app.utils.lru_cache import ReadThroughCache
+from app.utils.name_index import NameSearch
+from app.utils.pagination import Page, PageRequest, paginate
 from app.utils.result import Result
 
 
@@ -30,6 +36,9 @@ class Product(db.Model):
     ERROR_CREATE_FAIL = "Product Creation Error"
     ERROR_EDIT_FAIL = "Product Edit Error"
 
+    # Default number of results returned by a name search
+    SEARCH_LIMIT = 50
+
     def __init__(self, name: str, price: float):  # noqa: ANN204
         self.product_name = name
         self.product_price = price
@@ -38,39 +47,73 @@ class Product(db.Model):
     def find_by_id(product_id: int) -> OptProduct:
         return db.session.get(Product, {"product_id": product_id})
 
+    # Read only lookups, served from the catalog cache. Use find_by_id for
+    # products which are going to be modified.
+    @staticmethod
+    def cached(product_id: int) -> Optional["CatalogProduct"]:
+        return product_catalog.get(product_id)
+
+    @staticmethod
+    def cached_many(product_ids: Iterable[int]) -> Dict[int, "CatalogProduct"]:
+        return product_catalog.get_many(product_ids)
+
+    # Returns the subset of the given IDs which belong to existing products
+    @staticmethod
+    def existing_ids(product_ids: Iterable[int]) -> Set[int]:
+        found = db.session.execute(
+            db.select(Product.product_id).where(
+                Product.product_id.in_(list(product_ids))
+            )
+        )
+        return set(found.scalars())
+
+    # Returns a page of products, in order of ID
+    @staticmethod
+    def page(page_request: PageRequest) -> Page:
+        return paginate(
+            db.select(Product), Product.product_id, page_request, scalars=True
+        )
+
+    # Exact lookups go through the unique index on product_name, everything
+    # else through the name index, ranked exact, then prefix, then substring
     @staticmethod
     def find_by_name(
-        name: str, first: bool = False
+        name: str, first: bool = False, limit: int = SEARCH_LIMIT
     ) -> Union[OptProduct, Optional[List["Product"]]]:
 
-        exact_match = name == Product.product_name
-        similar_match = Product.product_name.ilike(
-            f"%{ name }%"
-        )  # ilike is case insensitive
+        if first:
+            return Product.query.filter_by(product_name=name).first()
 
-        found = Product.query.filter(exact_match or similar_match)
+        ranked = [key for _, key in product_search.search(name, limit)]
+        if not ranked:
+            return []
 
-        if first:
-            return found.first()
+        found = Product.cached_many(ranked)
 
-        return found.all()
+        # The index may briefly lag behind deletes made by another process
+        return [found[key] for key in ranked if key in found]
 
     @staticmethod
     def find_by_name_or_id(
-        identifier: (int | str), first: bool = False
+        identifier: (int | str), first: bool = False, limit: int = SEARCH_LIMIT
     ) -> Union[OptProduct, Optional[List["Product"]]]:
         if common.isnumber(identifier):
-            return Product.find_by_id(identifier)
+            # Numbers which can't be an ID, like 1.5, match nothing
+            try:
+                return Product.cached(int(identifier))
+            except ValueError:
+                return None
         else:
-            return Product.find_by_name(identifier, first)
+            return Product.find_by_name(identifier, first, limit)
 
     @staticmethod
-    def make(name: str, price: float) -> Result:
+    def make(name: str, price: float, savepoint: bool = True) -> Result:
         """Returns newly created product if succeeded, error otherwise.
 
         Args:
             name (str): Name of product.
             price (str): Price of product.
+            savepoint (bool): Insert in a savepoint, see try_insert.
 
         Returns:
             Result: Newly created product and success/fail message.
@@ -89,13 +132,15 @@ class Product(db.Model):
             if casted_price < 0.0:
                 return Result.error("Invalid price value. (price < 0.00)")
 
-            if Product.find_by_name(name=name, first=True):
+            # The unique key on product_name rejects duplicates
+            new_product = Product(name=name, price=casted_price)
+            if not try_insert(new_product, savepoint):
                 return Result.error(
                     f"A product with the given name already exists. (Product Name: {name})"
                 )
 
             return Result(
-                Product(name=name, price=casted_price),
+                new_product,
                 f"Successfully added product: [{ name }, { casted_price }]",
             )
 
@@ -175,22 +220,91 @@ class Product(db.Model):
 
         return log
 
-    # Returns a list of machines that the product can be found in
-    # [ {id, loc, name}, ... ]
-    def found_in(self) -> Optional[List[Dict[str, str]]]:
+    # Returns a page of machines that the product can be found in
+    # [ {id, loc, name, quantity}, ... ], from one join of machine_stock
+    # ( indexed by product ) with machine
+    @staticmethod
+    def found_in(
+        product_id: int,
+        page_request: PageRequest,
+        in_stock_only: bool = False,
+        min_quantity: Optional[int] = None,
+    ) -> Page:
+        from app.models.vending_machine import Machine
+        from app.models.vending_machine_stock import MachineStock
+
+        if in_stock_only:
+            min_quantity = max(min_quantity or 0, 1)
+
+        stmt = (
+            db.select(
+                Machine.machine_id,
+                Machine.location,
+                Machine.machine_name,
+                MachineStock.quantity,
+            )
+            .join(MachineStock.vending_machine)
+            .where(MachineStock.product_id == product_id)
+        )
+
+        if min_quantity is not None:
+            stmt = stmt.where(MachineStock.quantity >= min_quantity)
 
-        if len(self.machine_products) == 0:
-            return None
+        page = paginate(stmt, MachineStock.machine_id, page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
 
-        machines: List[Dict[str, str]] = []
 
-        for machine_stock in self.machine_products:
-            machine = machine_stock.vending_machine
-            entry = {
-                "machine_id": machine.machine_id,
-                "location": machine.location,
-                "machine_name": machine.machine_name,
-            }
-            machines.append(entry)
+# Immutable copy of a product, as held by the catalog cache.
+# Serializes the same way as Product.
+@dataclass(frozen=True)
+class CatalogProduct:
+    product_id: int
+    product_name: str
+    product_price: Decimal
+
 
-        return machines
+def _load_catalog(product_ids: Iterable[int]) -> Dict[int, CatalogProduct]:
+    rows = db.session.execute(
+        db.select(
+            Product.product_id, Product.product_name, Product.product_price
+        ).where(Product.product_id.in_(list(product_ids)))
+    )
+    return {row.product_id: CatalogProduct(*row) for row in rows}
+
+
+# In-process product cache backing Product.cached
+product_catalog = ReadThroughCache(
+    name="product_catalog", config_prefix="PRODUCT_CATALOG", load=_load_catalog
+)
+
+# In-process name index backing Product.find_by_name
+product_search = NameSearch(
+    name="product_search",
+    config_prefix="PRODUCT_SEARCH",
+    load=lambda: db.session.execute(
+        db.select(Product.product_id, Product.product_name)
+    ),
+)
+
+# Reports committed product writes, keeping in-process state in sync
+product_changes = CommitTracker(
+    Product,
+    key="product_id",
+    capture=lambda product: {
+        "product_name": product.product_name,
+        "product_price": product.product_price,
+    },
+)
+
+
+@product_changes.subscribe
+def _sync_catalog(changed: Dict[int, Dict], deleted: Set[int]) -> None:
+    product_catalog.invalidate([*changed, *deleted])
+
+
+@product_changes.subscribe
+def _sync_search(changed: Dict[int, Dict], deleted: Set[int]) -> None:
+    product_search.apply(
+        {key: values["product_name"] for key, values in changed.items()}, deleted
+    )
@@ -0,0 +1,158 @@
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.extensions import db
+from app.utils.pagination import Page, PageRequest, paginate
+from app.utils.time_series import TimeRange, bucket_start
+from app.utils.write_buffer import WriteBehindBuffer
+
+# Money, as stored by the machine balance
+Money = db.DECIMAL(20, 2)
+
+# { product_id: ( quantity, unit price ) }
+SaleLines = Dict[int, Tuple[int, Decimal]]
+
+
+@dataclass
+class Sale(db.Model):
+    # For serializing
+    sale_id: int
+    purchase_id: str
+    machine_id: int
+    product_id: int
+    quantity: int
+    unit_price: Decimal
+    amount: Decimal
+    paid: Decimal
+    change: Decimal
+    sold_at: datetime
+
+    sale_id = db.Column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    # Shared by the lines of one purchase, `paid` and `change` are those of
+    # the whole purchase
+    purchase_id = db.Column(db.String(32), nullable=False)
+    machine_id = db.Column(
+        db.Integer, db.ForeignKey("machine.machine_id"), nullable=False
+    )
+    product_id = db.Column(
+        db.Integer, db.ForeignKey("product.product_id"), nullable=False
+    )
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
+    amount = db.Column(Money, nullable=False)
+    paid = db.Column(Money, nullable=False)
+    change = db.Column(Money, nullable=False)
+    sold_at = db.Column(
+        db.DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False
+    )
+
+    # Time range scans over the sales of one machine, or of one product
+    __table_args__ = (
+        db.Index("ix_sale_machine_time", "machine_id", "sold_at"),
+        db.Index("ix_sale_product_time", "product_id", "sold_at"),
+    )
+
+    # Records one purchase, of one or more products, from a machine. The rows
+    # are written along with the current transaction, when buffered they are
+    # queued once it commits, or right away if `in_transaction` is False.
+    @staticmethod
+    def record(
+        machine_id: int, lines: SaleLines, paid: float, in_transaction: bool = True
+    ) -> None:
+        sold_at = datetime.today()
+        purchase_id = uuid.uuid4().hex
+        paid = Decimal(str(paid))
+        change = paid - sum(price * quantity for quantity, price in lines.values())
+
+        rows = [
+            {
+                "purchase_id": purchase_id,
+                "machine_id": machine_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": price,
+                "amount": price * quantity,
+                "paid": paid,
+                "change": change,
+                "sold_at": sold_at,
+            }
+            for product_id, (quantity, price) in lines.items()
+        ]
+
+        if sale_buffer.enabled:
+            put = sale_buffer.put if in_transaction else sale_buffer.queue
+            for row in rows:
+                put((purchase_id, row["product_id"]), row)
+            return
+
+        Sale.write(rows)
+
+    @staticmethod
+    def write(rows: List[Dict]) -> None:
+        db.session.execute(db.insert(Sale), rows)
+
+    # Along with sales still waiting in the buffer
+    @staticmethod
+    def remove(machine_id: int) -> None:
+        sale_buffer.discard(machine_id=machine_id)
+        db.session.execute(db.delete(Sale).where(Sale.machine_id == machine_id))
+
+    @staticmethod
+    def _totals():  # noqa: ANN205
+        return (
+            db.func.count().label("sales"),
+            db.func.coalesce(db.func.sum(Sale.quantity), 0).label("units"),
+            db.type_coerce(db.func.coalesce(db.func.sum(Sale.amount), 0), Money).label(
+                "revenue"
+            ),
+        )
+
+    # Units sold and revenue made by a machine, or of a product, within the range
+    @staticmethod
+    def totals(
+        owner: InstrumentedAttribute, owner_id: int, time_range: TimeRange
+    ) -> Dict:
+        stmt = time_range.apply(
+            db.select(*Sale._totals()).where(owner == owner_id), Sale.sold_at
+        )
+        return {owner.key: owner_id, **db.session.execute(stmt).one()._asdict()}
+
+    # Returns a page of totals per bucket, oldest first
+    @staticmethod
+    def buckets(
+        owner: InstrumentedAttribute,
+        owner_id: int,
+        page_request: PageRequest,
+        time_range: TimeRange,
+    ) -> Page:
+        bucket = bucket_start(Sale.sold_at, time_range.bucket)
+        summary = (
+            time_range.apply(
+                db.select(bucket.label("bucket"), *Sale._totals()).where(
+                    owner == owner_id
+                ),
+                Sale.sold_at,
+            )
+            .group_by(bucket)
+            .subquery()
+        )
+
+        page = paginate(db.select(summary), summary.c.bucket, page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
+
+
+# Buffered writer for sales, enabled with SALE_MODE = "buffered"
+sale_buffer = WriteBehindBuffer(
+    name="sale_buffer", config_prefix="SALE", writer=Sale.write
+)
@@ -0,0 +1,216 @@
+"""
+Hourly and daily totals of the sales ledger, per machine and product.
+
+Rollups are refreshed incrementally: each refresh adds up the sales recorded since
+the last one, found by sale ID past a persisted watermark, and adds them onto the
+existing rollup rows. Sales younger than ROLLUP_LAG seconds are left for the next
+refresh, giving purchases still in flight ( or in a write buffer ) time to land,
+since a sale committed below the watermark would never be counted.
+
+Refreshes run every ROLLUP_INTERVAL seconds in-process, or with `flask rollup refresh`.
+"""
+
+import atexit
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import Flask, current_app
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.extensions import db
+from app.models.sale import Money, Sale
+from app.utils.pagination import Page, PageRequest, paginate
+from app.utils.periodic import PeriodicWorker
+from app.utils.result import Result
+from app.utils.time_series import TimeRange, bucket_start
+from app.utils.upsert import upsert
+
+PERIODS = ("hour", "day")
+
+
+# Rollups are read per `bucket` of the time range, daily by default
+def parse_period(time_range: TimeRange) -> Result:
+    period = time_range.bucket or "day"
+    if period not in PERIODS:
+        return Result.error(
+            f"Invalid bucket. (Expected one of {', '.join(PERIODS)}, got {period})"
+        )
+    return Result(period)
+
+
+class RollupWatermark(db.Model):
+    # ID of the last sale added to the rollups
+    name = db.Column(db.String(32), primary_key=True)
+    sale_id = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class SaleRollup(db.Model):
+    period = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    machine_id = db.Column(
+        db.Integer, db.ForeignKey("machine.machine_id"), primary_key=True
+    )
+    product_id = db.Column(
+        db.Integer, db.ForeignKey("product.product_id"), primary_key=True
+    )
+    sales = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+
+    # Time range scans of one machine, or of one product, per period
+    __table_args__ = (
+        db.Index("ix_sale_rollup_machine_time", "period", "machine_id", "bucket"),
+        db.Index("ix_sale_rollup_product_time", "period", "product_id", "bucket"),
+    )
+
+    WATERMARK = "sale"
+
+    # Adds sales recorded since the last refresh onto the rollups. Returns the
+    # number of sales added, nothing is committed.
+    @staticmethod
+    def refresh(lag: Optional[float] = None) -> int:
+        if lag is None:
+            lag = current_app.config.get("ROLLUP_LAG", 60.0)
+
+        watermark = db.session.get(RollupWatermark, SaleRollup.WATERMARK)
+        after = watermark.sale_id if watermark else 0
+
+        settled = datetime.today() - timedelta(seconds=lag)
+        upto, count = db.session.execute(
+            db.select(db.func.max(Sale.sale_id), db.func.count()).where(
+                Sale.sale_id > after, Sale.sold_at < settled
+            )
+        ).one()
+        if upto is None:
+            return 0
+
+        for period in PERIODS:
+            bucket = bucket_start(Sale.sold_at, period)
+            rows = db.session.execute(
+                db.select(
+                    bucket.label("bucket"),
+                    Sale.machine_id,
+                    Sale.product_id,
+                    db.func.count().label("sales"),
+                    db.func.sum(Sale.quantity).label("units"),
+                    db.func.sum(Sale.amount).label("revenue"),
+                )
+                .where(Sale.sale_id > after, Sale.sale_id <= upto)
+                .group_by(bucket, Sale.machine_id, Sale.product_id)
+            ).all()
+
+            db.session.execute(
+                upsert(
+                    SaleRollup.__table__,
+                    keys=("period", "bucket", "machine_id", "product_id"),
+                    increment=("sales", "units", "revenue"),
+                ),
+                [{"period": period, **row._asdict()} for row in rows],
+            )
+
+        db.session.execute(
+            upsert(RollupWatermark.__table__, keys=("name",), replace=("sale_id",)),
+            [{"name": SaleRollup.WATERMARK, "sale_id": upto}],
+        )
+        return count
+
+    # Drops every rollup, the next refresh rebuilds them from the whole ledger
+    @staticmethod
+    def rebuild() -> None:
+        db.session.execute(db.delete(SaleRollup))
+        db.session.execute(
+            db.delete(RollupWatermark).where(
+                RollupWatermark.name == SaleRollup.WATERMARK
+            )
+        )
+
+    @staticmethod
+    def remove(machine_id: int) -> None:
+        db.session.execute(
+            db.delete(SaleRollup).where(SaleRollup.machine_id == machine_id)
+        )
+
+    @staticmethod
+    def _totals():  # noqa: ANN205
+        return (
+            db.func.sum(SaleRollup.sales).label("sales"),
+            db.func.sum(SaleRollup.units).label("units"),
+            db.type_coerce(db.func.sum(SaleRollup.revenue), Money).label("revenue"),
+        )
+
+    @staticmethod
+    def _in_range(period: str, time_range: TimeRange):  # noqa: ANN205
+        return time_range.apply(
+            db.select().where(SaleRollup.period == period), SaleRollup.bucket
+        )
+
+    # Returns a page of totals of a machine, or of a product, per bucket of
+    # `period`, oldest first
+    @staticmethod
+    def buckets(
+        owner: InstrumentedAttribute,
+        owner_id: int,
+        period: str,
+        page_request: PageRequest,
+        time_range: TimeRange,
+    ) -> Page:
+        summary = (
+            SaleRollup._in_range(period, time_range)
+            .add_columns(SaleRollup.bucket, *SaleRollup._totals())
+            .where(owner == owner_id)
+            .group_by(SaleRollup.bucket)
+            .subquery()
+        )
+
+        page = paginate(db.select(summary), summary.c.bucket, page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
+
+    # Returns a page of totals per machine, or per product, in order of ID
+    @staticmethod
+    def ranking(
+        owner: InstrumentedAttribute,
+        period: str,
+        page_request: PageRequest,
+        time_range: TimeRange,
+    ) -> Page:
+        summary = (
+            SaleRollup._in_range(period, time_range)
+            .add_columns(owner, *SaleRollup._totals())
+            .group_by(owner)
+            .subquery()
+        )
+
+        page = paginate(db.select(summary), summary.c[owner.key], page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
+
+
+class RollupScheduler:
+    def __init__(self, name: str, config_prefix: str) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+
+    def init_app(self, app: Flask) -> None:
+        interval = app.config.get(f"{self.config_prefix}_INTERVAL", 300.0)
+        if not interval:
+            app.extensions.pop(self.name, None)
+            return
+
+        def refresh() -> None:
+            with app.app_context():
+                try:
+                    SaleRollup.refresh()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Failed to refresh the sales rollups.")
+
+        worker = PeriodicWorker(f"{self.name}-worker", interval, refresh)
+        app.extensions[self.name] = worker
+        atexit.register(worker.stop)
+        worker.start()
+
+
+# Disabled with ROLLUP_INTERVAL = 0
+rollup_scheduler = RollupScheduler(name="rollup_scheduler", config_prefix="ROLLUP")
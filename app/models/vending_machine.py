@@ -1,12 +1,25 @@
 from dataclasses import dataclass
-from typing import List, Optional, Union
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.orm import Mapped, column_property, selectinload
 
 from app.extensions import db
-from app.models.vending_machine_record import take_snapshot
+from app.models.inventory import inventory
+from app.models.machine_balance import MachineBalance
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.sale_rollup import SaleRollup
+from app.models.vending_machine_record import StockRecord, take_snapshot
 from app.models.vending_machine_stock import MachineStock
 from app.utils import common
+from app.utils.commit_tracker import CommitTracker
+from app.utils.group_commit import GroupCommit
+from app.utils.integrity import try_insert
 from app.utils.log import Log
+from app.utils.pagination import Page, PageRequest, paginate
 from app.utils.result import Result
+from app.utils.upsert import upsert
 
 
 @dataclass
@@ -16,15 +29,35 @@ class Machine(db.Model):
     machine_name: str
     location: str
     machine_products: List[MachineStock]
-    balance: float
+    balance: Mapped[float]
 
     machine_id = db.Column(
         "machine_id", db.Integer, primary_key=True, autoincrement=True
     )
     machine_name = db.Column(db.String(20), unique=False, nullable=False)
     location = db.Column(db.String(20), unique=False, nullable=False)
-    products = db.relationship("MachineStock", backref="vending_machine", lazy=True)
-    balance = db.Column(db.DECIMAL(20, 2), nullable=False, default=0.0)
+    products = db.relationship(
+        "MachineStock",
+        backref="vending_machine",
+        lazy=True,
+        order_by="MachineStock.product_id",
+    )
+    settled_balance = db.Column(
+        "balance", db.DECIMAL(20, 2), nullable=False, default=0.0
+    )
+    # Credits are kept in sharded rows until compacted, see MachineBalance
+    balance = column_property(
+        db.type_coerce(
+            settled_balance + MachineBalance.pending(machine_id), settled_balance.type
+        )
+    )
+
+    # One machine of a name per location
+    __table_args__ = (
+        db.UniqueConstraint(
+            "location", "machine_name", name="uq_machine_location_name"
+        ),
+    )
 
     # Aliases
     ListOfMachines = List["Machine"]
@@ -40,11 +73,38 @@ class Machine(db.Model):
 
     @property
     def machine_products(self) -> List[MachineStock]:
-        machines = MachineStock.query.filter_by(machine_id=self.machine_id).all()
-        return [machine.to_dict() for machine in machines]
+        # Use the stock loaded along with the machine ( see stock_loader ),
+        # otherwise fetch it together with its products in one query
+        if "products" in db.inspect(self).unloaded:
+            stocks = (
+                MachineStock.with_product()
+                .filter_by(machine_id=self.machine_id)
+                .order_by(MachineStock.product_id)
+                .all()
+            )
+        else:
+            stocks = self.products
+        return [stock.to_dict() for stock in stocks]
 
+    # Loader option fetching the stock of machines, and the product of
+    # each stock row, in one extra query however many machines are loaded
     @staticmethod
-    def make(location: str, name: str) -> Result:
+    def stock_loader():  # noqa: ANN205
+        return selectinload(Machine.products).joinedload(MachineStock.product)
+
+    # Returns a page of machines, in order of ID, along with their stock
+    @staticmethod
+    def page(page_request: PageRequest) -> Page:
+        return paginate(
+            db.select(Machine).options(Machine.stock_loader()),
+            Machine.machine_id,
+            page_request,
+            scalars=True,
+        )
+
+    # `savepoint` as in try_insert
+    @staticmethod
+    def make(location: str, name: str, savepoint: bool = True) -> Result:
 
         if common.isnumber(location):
             return Result.error("Location can not be a number.")
@@ -52,21 +112,25 @@ class Machine(db.Model):
         if common.isnumber(name):
             return Result.error("Name can not be a number.")
 
-        if Machine.find(name=name, location=location):
+        # The unique key on ( location, machine_name ) rejects duplicates
+        new_machine = Machine(location=location, machine_name=name)
+        if not try_insert(new_machine, savepoint):
             return Result.error(
                 f"A machine with given name and location already exists. (Location: {location}, Name: {name})"
             )
 
-        new_machine = Machine(location=location, machine_name=name)
-
         return Result(
             new_machine,
             f"Successfully added vending machine named '{name}' at '{location}'!",
         )
 
     @staticmethod
-    def find_by_id(machine_id: int) -> Result:
-        if machine := db.session.get(Machine, {"machine_id": machine_id}):
+    def find_by_id(machine_id: int, with_stock: bool = False) -> Result:
+        options = [Machine.stock_loader()] if with_stock else []
+
+        if machine := db.session.get(
+            Machine, {"machine_id": machine_id}, options=options
+        ):
             return Result(machine)
         return Result.error(f"No machine with id {machine_id} found.")
 
@@ -89,7 +153,11 @@ class Machine(db.Model):
 
     @staticmethod
     def find_by_location(location: str) -> Optional[ListOfMachines]:
-        return Machine.__find_by_location(location=location).all()
+        return (
+            Machine.__find_by_location(location=location)
+            .options(Machine.stock_loader())
+            .all()
+        )
 
     @staticmethod
     def find(
@@ -127,12 +195,9 @@ class Machine(db.Model):
             stock.quantity += quantity
             return Result(stock, f"Updated stock: {old_quantity} -> {stock.quantity}")
 
-        new_stock = MachineStock.make(
+        return MachineStock.make(
             machine_id=self.machine_id, product_id=product_id, quantity=quantity
         )
-        db.session.add(new_stock.object)
-        db.session.commit()
-        return new_stock
 
     # Returns the change log
     def _edit_name(self, new_name: str) -> Result:
@@ -200,11 +265,7 @@ class Machine(db.Model):
             log.add_result("Edit", machine_info, result, Machine.ERROR_EDIT_FAIL)
 
         if new_stock:
-            # Delete current stock
-            self.remove_all_stock()
-
-        product_log = self.add_products(new_stock)
-        log += product_log
+            log += self.replace_stock(new_stock)
 
         return log
 
@@ -214,10 +275,78 @@ class Machine(db.Model):
 
         log = Log()
 
-        # Add all new stock
+        # Resolve every product and existing stock row up front
+        product_ids = {
+            product_id for product_id, _ in stocks if isinstance(product_id, int)
+        }
+        known_products = Product.existing_ids(product_ids)
+        quantities = MachineStock.quantities(self.machine_id, product_ids)
+        added: Dict[int, int] = {}
+
+        for product_id, quantity in stocks:
+            stock_info, message = self._stage_stock(
+                product_id=product_id,
+                quantity=quantity,
+                quantities=quantities,
+                known_products=known_products,
+            )
+
+            if stock_info:
+                added[product_id] = added.get(product_id, 0) + quantity
+                log.add("Product", f"Product ID {product_id}", message)
+            else:
+                log.error(f"Product ID {product_id}", message)
+
+        rows = [
+            {
+                "machine_id": self.machine_id,
+                "product_id": product_id,
+                "quantity": amount,
+            }
+            for product_id, amount in added.items()
+            if amount > 0
+        ]
+
+        if rows:
+            db.session.execute(
+                upsert(
+                    MachineStock.__table__,
+                    keys=("machine_id", "product_id"),
+                    increment=("quantity",),
+                ),
+                rows,
+            )
+            self._expire_stock()
+
+        StockRecord.make_many(
+            machine_id=self.machine_id,
+            quantities={
+                product_id: quantities[product_id]
+                for product_id in product_ids
+                if product_id in quantities
+            },
+        )
+
+        return log
+
+    # Replaces the stock of the machine with `stocks`. Entries are validated
+    # as if the machine was empty, but only rows which differ from the current
+    # stock are written, with one statement per kind of change.
+    def replace_stock(self, stocks: MachineStock.ListOfStockInfo) -> Log:
+        log = Log()
+
+        product_ids = {
+            product_id for product_id, _ in stocks if isinstance(product_id, int)
+        }
+        known_products = Product.existing_ids(product_ids)
+        wanted: Dict[int, int] = {}
+
         for product_id, quantity in stocks:
-            stock_info, message = self.add_product(
-                product_id=product_id, quantity=quantity
+            stock_info, message = self._stage_stock(
+                product_id=product_id,
+                quantity=quantity,
+                quantities=wanted,
+                known_products=known_products,
             )
 
             if stock_info:
@@ -225,67 +354,398 @@ class Machine(db.Model):
             else:
                 log.error(f"Product ID {product_id}", message)
 
+        current = MachineStock.quantities(self.machine_id)
+        if inventory.enabled:
+            for product_id, sold in inventory.unflushed(self.machine_id).items():
+                if product_id in current:
+                    current[product_id] -= sold
+        removed = [product_id for product_id in current if product_id not in wanted]
+        added = {
+            product_id: quantity
+            for product_id, quantity in wanted.items()
+            if product_id not in current
+        }
+        updated = {
+            product_id: quantity
+            for product_id, quantity in wanted.items()
+            if product_id in current and current[product_id] != quantity
+        }
+
+        if removed:
+            db.session.execute(
+                db.delete(MachineStock).where(
+                    MachineStock.machine_id == self.machine_id,
+                    MachineStock.product_id.in_(removed),
+                )
+            )
+
+        if updated:
+            db.session.execute(
+                db.update(MachineStock)
+                .where(
+                    MachineStock.machine_id == self.machine_id,
+                    MachineStock.product_id.in_(list(updated)),
+                )
+                .values(quantity=db.case(updated, value=MachineStock.product_id)),
+                execution_options={"synchronize_session": False},
+            )
+
+        if added:
+            db.session.execute(
+                db.insert(MachineStock),
+                [
+                    {
+                        "machine_id": self.machine_id,
+                        "product_id": product_id,
+                        "quantity": quantity,
+                    }
+                    for product_id, quantity in added.items()
+                ],
+            )
+
+        if removed or updated or added:
+            self._expire_stock()
+            for product_id in [*removed, *updated]:
+                stock_overwrites.mark(db.session, (self.machine_id, product_id))
+
+        # Removed products are recorded as sold out
+        StockRecord.make_many(
+            machine_id=self.machine_id,
+            quantities={
+                **{product_id: 0 for product_id in removed},
+                **updated,
+                **added,
+            },
+        )
+
         return log
 
+    # Validates one stock entry the same way add_product does, but against the
+    # in memory `quantities` so repeated products within one request add up.
+    def _stage_stock(
+        self,
+        product_id: int,
+        quantity: int,
+        quantities: Dict[int, int],
+        known_products: Set[int],
+    ) -> Result:
+        if not isinstance(quantity, int):
+            return Result.error(
+                f"Invalid quantity type. Expect int, got={type(quantity).__name__}"
+            )
+
+        if quantity < 0:
+            return Result.error(f"Quantity can not be negative. (got {quantity})")
+
+        if not isinstance(product_id, int):
+            return Result.error(
+                f"Invalid product ID type. Expected int, got={type(product_id).__name__}"
+            )
+
+        if product_id in quantities:
+            old_quantity = quantities[product_id]
+            quantities[product_id] += quantity
+            return Result.success(
+                f"Updated stock: {old_quantity} -> {quantities[product_id]}"
+            )
+
+        if product_id not in known_products:
+            return Result.error(f"No product with ID {product_id} found.")
+
+        if quantity <= 0:
+            return Result.error(f"Invalid quantity. ({quantity} <= 0)")
+
+        quantities[product_id] = quantity
+        return Result.success(
+            f"Added product {product_id} to machine {self.machine_id} successfully. (qt={quantity})"
+        )
+
     def remove_all_stock(self) -> None:
         delete_stock = MachineStock.__table__.delete().where(
             MachineStock.machine_id == self.machine_id
         )
         db.session.execute(delete_stock)
+        self._expire_stock()
+
+    # Bulk statements bypass the session, make sure stock
+    # already loaded for this machine is refreshed on next access
+    def _expire_stock(self) -> None:
+        MachineStock.expire(self.machine_id)
+        db.session.expire(self, ["products"])
+        stock_changes.mark(db.session, self.machine_id)
 
     # Returns ( Change, Message )
     def buy_product(self, product_id: int, payment: float) -> Log:
+        # Under load, purchases of one machine are committed together
+        if purchase_scheduler.enabled and not inventory.enabled:
+            return purchase_scheduler.submit(self.machine_id, (product_id, payment))
+
+        casted_payment, log = Machine._read_payment(payment)
+        if casted_payment is None:
+            return log
+
+        stock = inventory if inventory.enabled else MachineStock
+        listing = stock.listing(self.machine_id, product_id)
+        if refusal := Machine._refuse_purchase(listing, casted_payment):
+            return log.error(Machine.ERROR_PURCHASE_FAIL, refusal)
+
+        price, _ = listing
+
+        # Sold in memory, the inventory flusher writes it back later
+        if inventory.enabled:
+            if not inventory.take(self.machine_id, {product_id: 1}, price):
+                return log.error(
+                    Machine.ERROR_PURCHASE_FAIL, "Product is out of stock."
+                )
+            Sale.record(
+                self.machine_id,
+                {product_id: (1, price)},
+                casted_payment,
+                in_transaction=False,
+            )
+            return Machine._receipt(casted_payment, price)
+
+        # The guarded decrement is what actually decides the sale, the
+        # quantity read above may already be stale under concurrent purchases
+        if not MachineStock.take(self.machine_id, product_id):
+            return log.error(Machine.ERROR_PURCHASE_FAIL, "Product is out of stock.")
+
+        self.credit(price)
+        Sale.record(self.machine_id, {product_id: (1, price)}, casted_payment)
+        StockRecord.make(product_id=product_id, machine_id=self.machine_id)
+
+        return Machine._receipt(casted_payment, price)
+
+    # Applies a batch of purchases ( [ ( product_id, payment ), ... ] ) of one
+    # machine in order, returning the log of each. The stock involved is read
+    # and locked once, then written back with one statement, along with one
+    # balance update and one batch of snapshots. Nothing is committed.
+    @staticmethod
+    def apply_purchases(
+        machine_id: int, purchases: List[Tuple[int, float]]
+    ) -> List[Log]:
+        listings = MachineStock.listings(
+            machine_id,
+            {product_id for product_id, _ in purchases if isinstance(product_id, int)},
+            for_update=True,
+        )
+
+        logs = []
+        taken: Dict[int, int] = {}
+        income = Decimal(0)
+
+        for product_id, payment in purchases:
+            casted_payment, log = Machine._read_payment(payment)
+            if casted_payment is None:
+                logs.append(log)
+                continue
+
+            # Account for the purchases ahead of this one in the batch
+            listing = listings.get(product_id)
+            if listing is not None:
+                price, quantity = listing
+                listing = (price, quantity - taken.get(product_id, 0))
+
+            if refusal := Machine._refuse_purchase(listing, casted_payment):
+                logs.append(log.error(Machine.ERROR_PURCHASE_FAIL, refusal))
+                continue
+
+            price, _ = listing
+            taken[product_id] = taken.get(product_id, 0) + 1
+            income += price
+            Sale.record(machine_id, {product_id: (1, price)}, casted_payment)
+            logs.append(Machine._receipt(casted_payment, price))
+
+        if taken:
+            # The rows are locked, so this can only fail if the lock did
+            # not hold, in which case the whole batch is rolled back
+            if not MachineStock.take_many(machine_id, taken):
+                raise RuntimeError(f"Stock of machine {machine_id} changed under lock.")
+
+            MachineBalance.credit(machine_id, income)
+            StockRecord.make_many(
+                machine_id=machine_id,
+                quantities={
+                    product_id: listings[product_id][1] - amount
+                    for product_id, amount in taken.items()
+                },
+            )
+
+        return logs
+
+    # Returns the payment as a float along with the log to report on, or
+    # None along with the error log
+    @staticmethod
+    def _read_payment(payment: float) -> Tuple[Optional[float], Log]:
         if payment is None:
-            return Log().error(Machine.ERROR_PURCHASE_FAIL, "No payment received.")
+            return None, Log().error(
+                Machine.ERROR_PURCHASE_FAIL, "No payment received."
+            )
 
         log: Log = Log().add(name="Transaction", specific="Change", info=str(payment))
-        casted_payment: float
         try:
             # Ideally we should never get an
             # invalid json value type but just incase
-            casted_payment = float(payment)
-
+            return float(payment), log
         except ValueError:
-            return log.error(Machine.ERROR_PURCHASE_FAIL, "Invalid payment type.")
+            return None, log.error(Machine.ERROR_PURCHASE_FAIL, "Invalid payment type.")
 
-        product_stock = MachineStock.get(self.machine_id, product_id)
-        product_found_in_machine = product_stock is not None
+    # Returns why a product with the given ( price, quantity ) listing
+    # can not be bought, None if it can
+    @staticmethod
+    def _refuse_purchase(
+        listing: Optional[Tuple[Decimal, int]], payment: float
+    ) -> Optional[str]:
+        # Product not found, product not in inventory
+        if listing is None:
+            return "Product is not in stock."
 
-        if product_found_in_machine:
+        price, quantity = listing
 
-            if product_stock.out_of_stock():
-                return log.error(
-                    Machine.ERROR_PURCHASE_FAIL, "Product is out of stock."
-                )
+        if quantity <= 0:
+            return "Product is out of stock."
 
-            price = product_stock.product.product_price
-            payment_insufficient = price > casted_payment
+        if price > payment:
+            return f"Not enough money, costs {float(price)} Baht, got {float(payment)} Baht."
 
-            if payment_insufficient:
-                return log.error(
-                    Machine.ERROR_PURCHASE_FAIL,
-                    f"Not enough money, costs {float(price)} Baht, got {float(payment)} Baht.",
+        return None
+
+    @staticmethod
+    def _receipt(payment: float, price: Decimal) -> Log:
+        return (
+            Log()
+            .add(
+                name="Transaction",
+                specific="Success",
+                info="Successfully bought product.",
+            )
+            .add(
+                name="Transaction",
+                specific="Change",
+                info=str(payment - float(price)),
+            )
+        )
+
+    # Takes every amount or none of them, a partial decrement is undone by
+    # rolling back its savepoint and leaves the rest of the transaction alone
+    def _take_all(self, amounts: Dict[int, int]) -> bool:
+        savepoint = db.session.begin_nested()
+        if MachineStock.take_many(self.machine_id, amounts):
+            savepoint.commit()
+            return True
+
+        savepoint.rollback()
+        return False
+
+    # Buys every item of the cart ( [ ( product_id, quantity ), ... ] ) or none
+    # of them: availability and the total are checked with one query, then all
+    # stock is decremented with one statement, the balance credited and
+    # the snapshots written in one batch, before a single commit.
+    def buy_products(
+        self, cart: Optional[MachineStock.ListOfStockInfo], payment: float
+    ) -> Log:
+        casted_payment, log = Machine._read_payment(payment)
+        if casted_payment is None:
+            return log
+
+        if not cart:
+            return log.error(Machine.ERROR_PURCHASE_FAIL, "The cart is empty.")
+
+        # Merge repeated products
+        amounts: Dict[int, int] = {}
+        for product_id, quantity in cart:
+            if not isinstance(product_id, int):
+                log.error(
+                    f"Product ID {product_id}",
+                    f"Invalid product ID type. Expected int, got={type(product_id).__name__}",
+                )
+            elif not isinstance(quantity, int) or isinstance(quantity, bool):
+                log.error(
+                    f"Product ID {product_id}",
+                    f"Invalid quantity type. Expect int, got={type(quantity).__name__}",
+                )
+            elif quantity <= 0:
+                log.error(
+                    f"Product ID {product_id}", f"Invalid quantity. ({quantity} <= 0)"
                 )
             else:
-                product_stock.decrease_stock()
-                self.balance = float(self.balance) + float(price)
-                db.session.commit()
-                return (
-                    Log()
-                    .add(
-                        name="Transaction",
-                        specific="Success",
-                        info="Successfully bought product.",
-                    )
-                    .add(
-                        name="Transaction",
-                        specific="Change",
-                        info=str(casted_payment - float(price)),
-                    )
+                amounts[product_id] = amounts.get(product_id, 0) + quantity
+
+        stock = inventory if inventory.enabled else MachineStock
+        listings = stock.listings(self.machine_id, amounts)
+
+        total = Decimal(0)
+        for product_id, amount in amounts.items():
+            if product_id not in listings:
+                log.error(f"Product ID {product_id}", "Product is not in stock.")
+                continue
+
+            price, quantity = listings[product_id]
+            if quantity < amount:
+                log.error(
+                    f"Product ID {product_id}",
+                    f"Not enough stock. (wanted {amount}, {quantity} left)",
                 )
+            total += price * amount
 
-        # Product not found, product not in inventory
-        return log.error(Machine.ERROR_PURCHASE_FAIL, "Product is not in stock.")
+        if log.has_error():
+            return log.error(Machine.ERROR_PURCHASE_FAIL, "Nothing was bought.")
+
+        if total > Decimal(str(casted_payment)):
+            return log.error(
+                Machine.ERROR_PURCHASE_FAIL,
+                f"Not enough money, costs {float(total)} Baht, got {float(payment)} Baht.",
+            )
+
+        lines = {
+            product_id: (amount, listings[product_id][0])
+            for product_id, amount in amounts.items()
+        }
+
+        # As in buy_product, the guarded decrement is what decides the sale
+        if inventory.enabled:
+            if sold := inventory.take(self.machine_id, amounts, total):
+                Sale.record(
+                    self.machine_id, lines, casted_payment, in_transaction=False
+                )
+        elif sold := self._take_all(amounts):
+            self.credit(total)
+            Sale.record(self.machine_id, lines, casted_payment)
+            StockRecord.make_many(
+                machine_id=self.machine_id,
+                quantities=MachineStock.quantities(self.machine_id, amounts),
+            )
+
+        if not sold:
+            return log.error(
+                Machine.ERROR_PURCHASE_FAIL,
+                "Products went out of stock, nothing was bought.",
+            )
+
+        log = Log()
+        for product_id, amount in amounts.items():
+            price, _ = listings[product_id]
+            log.add(
+                name="Cart",
+                specific=f"Product ID {product_id}",
+                info=f"Bought {amount} for {float(price * amount)} Baht.",
+            )
+
+        return log.add(
+            name="Transaction",
+            specific="Success",
+            info=f"Successfully bought {sum(amounts.values())} product(s).",
+        ).add(
+            name="Transaction",
+            specific="Change",
+            info=str(casted_payment - float(total)),
+        )
+
+    # Adds to one of the balance shards of the machine, so concurrent
+    # purchases neither overwrite nor wait on each other
+    def credit(self, amount: Decimal) -> None:
+        MachineBalance.credit(self.machine_id, amount)
+        db.session.expire(self, ["balance"])
 
     def remove_stock(self, product_id: id) -> Result:
         if stock := MachineStock.get(machine_id=self.machine_id, product_id=product_id):
@@ -297,7 +757,53 @@ class Machine(db.Model):
             f"Product not found in machine. (Machine ID: {self.machine_id}, Product ID: {product_id})"
         )
 
+    # Along with everything referencing the machine, its history included
     def destroy(self) -> str:
         self.remove_all_stock()
+        MachineBalance.remove(self.machine_id)
+        StockRecord.remove(self.machine_id)
+        Sale.remove(self.machine_id)
+        SaleRollup.remove(self.machine_id)
         db.session.delete(self)
         return "Successfully deleted."
+
+
+# Groups concurrent purchases of a machine into one transaction,
+# enabled with PURCHASE_MODE = "grouped"
+purchase_scheduler = GroupCommit(
+    name="purchase_scheduler",
+    config_prefix="PURCHASE",
+    apply=Machine.apply_purchases,
+)
+
+
+# Stock changed through the database directly, by restocking or editing machines,
+# is reloaded by the inventory engine on the next purchase
+stock_changes = CommitTracker(MachineStock, key="machine_id", capture=lambda _: {})
+
+
+@stock_changes.subscribe
+def _evict_changed(changed: Dict[int, Dict], deleted: Set[int]) -> None:
+    if inventory.enabled:
+        inventory.evict([*changed, *deleted])
+
+
+# Stock given an absolute quantity, by editing or removing it, rather than
+# restocked by an amount. Changes made through the ORM are all of this kind.
+stock_overwrites = CommitTracker(MachineStock, key="stock_key", capture=lambda _: {})
+
+
+@stock_overwrites.subscribe
+def _settle_overwritten(changed: Dict[Tuple, Dict], deleted: Set[Tuple]) -> None:
+    if inventory.enabled:
+        inventory.settle([*changed, *deleted])
+
+
+# Machines deleted, reported so the inventory engine stops flushing their sales
+machine_changes = CommitTracker(Machine, key="machine_id", capture=lambda _: {})
+
+
+@machine_changes.subscribe
+def _forget_deleted(changed: Dict[int, Dict], deleted: Set[int]) -> None:
+    if inventory.enabled and deleted:
+        inventory.forget(deleted)
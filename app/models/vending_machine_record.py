@@ -1,8 +1,16 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import ColumnElement, Select
+from sqlalchemy.orm import InstrumentedAttribute, aliased
 
 from app.extensions import db
+from app.utils.pagination import CursorKey, Page, PageKey, PageRequest, paginate
+from app.utils.streaming import stream_rows
+from app.utils.time_series import TimeRange, bucket_start
+from app.utils.upsert import upsert
+from app.utils.write_buffer import WriteBehindBuffer
 
 
 @dataclass
@@ -21,8 +29,22 @@ class StockRecord(db.Model):
     time_stamp = db.Column(db.DateTime, primary_key=True, nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
 
+    # Time range scans over the history of one machine, or of one product
+    __table_args__ = (
+        db.Index("ix_stock_record_machine_time", "machine_id", "time_stamp"),
+        db.Index("ix_stock_record_product_time", "product_id", "time_stamp"),
+    )
+
     ERROR_NOT_FOUND = "Record not found"
 
+    # Along with snapshots still waiting in the buffer
+    @staticmethod
+    def remove(machine_id: int) -> None:
+        snapshot_buffer.discard(machine_id=machine_id)
+        db.session.execute(
+            db.delete(StockRecord).where(StockRecord.machine_id == machine_id)
+        )
+
     @staticmethod
     def make(product_id: int, machine_id: int) -> None:
         from app.models.vending_machine_stock import MachineStock
@@ -31,6 +53,17 @@ class StockRecord(db.Model):
         stock = db.session.get(
             MachineStock, {"product_id": product_id, "machine_id": machine_id}
         )
+
+        if stock is None:
+            return
+
+        # Leave the write to the buffer, outside of the hot path
+        if snapshot_buffer.put(
+            (machine_id, product_id, time_stamp),
+            StockRecord._row(machine_id, product_id, time_stamp, stock.quantity),
+        ):
+            return
+
         stock_record = db.session.get(
             StockRecord,
             {
@@ -40,24 +73,60 @@ class StockRecord(db.Model):
             },
         )
 
-        stock_exist = stock is not None
-        has_existing_stock_record = stock_record is not None
-
-        if stock_exist:
-            quantity = stock.quantity
-
-            if has_existing_stock_record:
-                # Update the quantity
-                stock_record.quantity = quantity
-            else:
-                new_record = StockRecord(
-                    product_id=product_id,
-                    machine_id=machine_id,
-                    time_stamp=time_stamp,
-                    quantity=quantity,
-                )
-                db.session.add(new_record)
-            db.session.commit()
+        if stock_record is not None:
+            # Update the quantity
+            stock_record.quantity = stock.quantity
+        else:
+            new_record = StockRecord(
+                product_id=product_id,
+                machine_id=machine_id,
+                time_stamp=time_stamp,
+                quantity=stock.quantity,
+            )
+            db.session.add(new_record)
+
+    # Snapshots several products of one machine with a single statement.
+    # Expects { product_id: quantity, ... }, nothing is committed.
+    @staticmethod
+    def make_many(machine_id: int, quantities: Dict[int, int]) -> None:
+        if not quantities:
+            return
+
+        time_stamp = datetime.today().replace(microsecond=0)
+        rows = [
+            StockRecord._row(machine_id, product_id, time_stamp, quantity)
+            for product_id, quantity in quantities.items()
+        ]
+
+        if snapshot_buffer.enabled:
+            for row in rows:
+                snapshot_buffer.put((machine_id, row["product_id"], time_stamp), row)
+            return
+
+        StockRecord.write(rows)
+
+    # Inserts the given records, replacing the quantity of existing ones
+    @staticmethod
+    def write(rows: List[Dict]) -> None:
+        db.session.execute(
+            upsert(
+                StockRecord.__table__,
+                keys=("machine_id", "product_id", "time_stamp"),
+                replace=("quantity",),
+            ),
+            rows,
+        )
+
+    @staticmethod
+    def _row(
+        machine_id: int, product_id: int, time_stamp: datetime, quantity: int
+    ) -> Dict:
+        return {
+            "machine_id": machine_id,
+            "product_id": product_id,
+            "time_stamp": time_stamp,
+            "quantity": quantity,
+        }
 
     @staticmethod
     def product_time_stamp_in_records(product_id: int) -> Optional[List["StockRecord"]]:
@@ -69,6 +138,190 @@ class StockRecord(db.Model):
         stock_record = StockRecord.query.filter_by(machine_id=machine_id).all()
         return stock_record
 
+    # Returns a page of the records of a machine, oldest first
+    @staticmethod
+    def machine_records(
+        machine_id: int,
+        page_request: PageRequest,
+        time_range: Optional[TimeRange] = None,
+    ) -> Page:
+        return paginate(
+            StockRecord._history(
+                db.select(StockRecord), StockRecord.machine_id, machine_id, time_range
+            ),
+            MACHINE_RECORDS_KEY,
+            page_request,
+            scalars=True,
+        )
+
+    # Returns a page of the records of a product across machines, oldest first
+    @staticmethod
+    def product_records(
+        product_id: int,
+        page_request: PageRequest,
+        time_range: Optional[TimeRange] = None,
+    ) -> Page:
+        return paginate(
+            StockRecord._history(
+                db.select(StockRecord), StockRecord.product_id, product_id, time_range
+            ),
+            PRODUCT_RECORDS_KEY,
+            page_request,
+            scalars=True,
+        )
+
+    # Same as machine_records, as plain rows read in batches, for streaming
+    @staticmethod
+    def machine_record_rows(
+        machine_id: int,
+        after: Optional[CursorKey] = None,
+        time_range: Optional[TimeRange] = None,
+    ) -> Iterator[Dict]:
+        return stream_rows(
+            StockRecord._history(
+                db.select(*StockRecord.__table__.columns),
+                StockRecord.machine_id,
+                machine_id,
+                time_range,
+            ),
+            MACHINE_RECORDS_KEY,
+            after,
+        )
+
+    # Same as product_records, as plain rows read in batches, for streaming
+    @staticmethod
+    def product_record_rows(
+        product_id: int,
+        after: Optional[CursorKey] = None,
+        time_range: Optional[TimeRange] = None,
+    ) -> Iterator[Dict]:
+        return stream_rows(
+            StockRecord._history(
+                db.select(*StockRecord.__table__.columns),
+                StockRecord.product_id,
+                product_id,
+                time_range,
+            ),
+            PRODUCT_RECORDS_KEY,
+            after,
+        )
+
+    # Returns a page of per product summaries of a machine's stock, one for
+    # each bucket of time_range.bucket, oldest first
+    @staticmethod
+    def machine_buckets(
+        machine_id: int, page_request: PageRequest, time_range: TimeRange
+    ) -> Page:
+        stmt, key = StockRecord._buckets(
+            StockRecord.machine_id, machine_id, StockRecord.product_id, time_range
+        )
+        page = paginate(stmt, key, page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
+
+    # Returns a page of per machine summaries of a product's stock, one for
+    # each bucket of time_range.bucket, oldest first
+    @staticmethod
+    def product_buckets(
+        product_id: int, page_request: PageRequest, time_range: TimeRange
+    ) -> Page:
+        stmt, key = StockRecord._buckets(
+            StockRecord.product_id, product_id, StockRecord.machine_id, time_range
+        )
+        page = paginate(stmt, key, page_request)
+        page.items = [row._asdict() for row in page.items]
+        return page
+
+    # Restricts `stmt` to the records of one machine ( or product ) within the
+    # time range, answered from the ( owner, time_stamp ) indexes
+    @staticmethod
+    def _history(
+        stmt: Select,
+        owner: InstrumentedAttribute,
+        owner_id: int,
+        time_range: Optional[TimeRange],
+    ) -> Select:
+        stmt = stmt.where(owner == owner_id)
+        if time_range is not None:
+            stmt = time_range.apply(stmt, StockRecord.time_stamp)
+        return stmt
+
+    # Summarises the records of one machine ( or product ) per bucket and per
+    # `series` ( the products of the machine, or the machines of the product ):
+    #   last        quantity of the latest record in the bucket
+    #   min, max    lowest and highest quantity recorded in the bucket
+    #   net_change  last minus the last of the previous bucket, or minus the
+    #               first record in the bucket for the first bucket in range
+    @staticmethod
+    def _buckets(
+        owner: InstrumentedAttribute,
+        owner_id: int,
+        series: InstrumentedAttribute,
+        time_range: TimeRange,
+    ) -> Tuple[Select, PageKey]:
+        bucket = bucket_start(StockRecord.time_stamp, time_range.bucket)
+
+        grouped = (
+            StockRecord._history(
+                db.select(
+                    series.label("series"),
+                    bucket.label("bucket"),
+                    db.func.min(StockRecord.quantity).label("min"),
+                    db.func.max(StockRecord.quantity).label("max"),
+                    db.func.min(StockRecord.time_stamp).label("first_at"),
+                    db.func.max(StockRecord.time_stamp).label("last_at"),
+                ),
+                owner,
+                owner_id,
+                time_range,
+            )
+            .group_by(series, bucket)
+            .subquery()
+        )
+
+        # The first and last record of each bucket, found by primary key
+        first, last = aliased(StockRecord), aliased(StockRecord)
+
+        def record_at(record: StockRecord, time_stamp: ColumnElement) -> ColumnElement:
+            return db.and_(
+                getattr(record, owner.key) == owner_id,
+                getattr(record, series.key) == grouped.c.series,
+                record.time_stamp == time_stamp,
+            )
+
+        previous_last = db.func.lag(last.quantity).over(
+            partition_by=grouped.c.series, order_by=grouped.c.bucket
+        )
+
+        summary = (
+            db.select(
+                grouped.c.bucket,
+                grouped.c.series.label(series.key),
+                last.quantity.label("last"),
+                grouped.c.min,
+                grouped.c.max,
+                (last.quantity - db.func.coalesce(previous_last, first.quantity)).label(
+                    "net_change"
+                ),
+            )
+            .select_from(grouped)
+            .join(last, record_at(last, grouped.c.last_at))
+            .join(first, record_at(first, grouped.c.first_at))
+            .subquery()
+        )
+
+        return db.select(summary), (summary.c.bucket, summary.c[series.key])
+
+
+# Keys records are paged by, the time stamp alone is not unique
+MACHINE_RECORDS_KEY = (StockRecord.time_stamp, StockRecord.product_id)
+PRODUCT_RECORDS_KEY = (StockRecord.time_stamp, StockRecord.machine_id)
+
+# Buffered writer for snapshots, enabled with SNAPSHOT_MODE = "buffered"
+snapshot_buffer = WriteBehindBuffer(
+    name="snapshot_buffer", config_prefix="SNAPSHOT", writer=StockRecord.write
+)
+
 
 def take_snapshot(func):  # noqa: ANN001, ANN201
     def wrapper(self, *args, **kwargs):  # noqa: ANN001, ANN002, ANN003, ANN201
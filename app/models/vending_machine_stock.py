@@ -1,9 +1,13 @@
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, TypeAlias
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple, TypeAlias
+
+from sqlalchemy.orm import joinedload
 
 from app.extensions import db
-from app.models import product, vending_machine
+from app.models import product
 from app.models.vending_machine_record import take_snapshot
+from app.utils.integrity import try_insert
 from app.utils.result import Result
 
 """
@@ -28,6 +32,11 @@ class MachineStock(db.Model):
     )
     quantity = db.Column(db.Integer, nullable=False)
 
+    # Serves "which machines stock product X" without touching the table rows
+    __table_args__ = (
+        db.Index("ix_machine_stock_product", "product_id", "machine_id", "quantity"),
+    )
+
     # Aliases
     ProductQuantity: TypeAlias = int
     ProductID: TypeAlias = int
@@ -43,14 +52,115 @@ class MachineStock(db.Model):
             "quantity": self.quantity,
         }
 
+    # Query for stock which loads the product alongside each row
+    @staticmethod
+    def with_product():  # noqa: ANN205
+        return MachineStock.query.options(joinedload(MachineStock.product))
+
     @staticmethod
     def get(machine_id: int, product_id: int) -> OptStock:
         return db.session.get(
             MachineStock, {"machine_id": machine_id, "product_id": product_id}
         )
 
+    # Returns ( price, quantity ) of a product in a machine, None if not stocked
+    @staticmethod
+    def listing(machine_id: int, product_id: int) -> Optional[Tuple[Decimal, int]]:
+        return db.session.execute(
+            db.select(product.Product.product_price, MachineStock.quantity)
+            .join(MachineStock.product)
+            .where(
+                MachineStock.machine_id == machine_id,
+                MachineStock.product_id == product_id,
+            )
+        ).first()
+
+    # Returns { product_id: ( price, quantity ) } for the given products
+    # of a machine, leaving out those it does not stock. With `for_update`,
+    # the stock rows stay locked until the transaction ends.
+    @staticmethod
+    def listings(
+        machine_id: int, product_ids: Iterable[int], for_update: bool = False
+    ) -> Dict[int, Tuple[Decimal, int]]:
+        stmt = (
+            db.select(
+                MachineStock.product_id,
+                product.Product.product_price,
+                MachineStock.quantity,
+            )
+            .join(MachineStock.product)
+            .where(
+                MachineStock.machine_id == machine_id,
+                MachineStock.product_id.in_(list(product_ids)),
+            )
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=MachineStock)
+
+        rows = db.session.execute(stmt)
+        return {product_id: (price, quantity) for product_id, price, quantity in rows}
+
+    # Decrements the stock only if enough is left, as a single
+    # UPDATE ... WHERE quantity >= amount. Returns whether it happened.
+    @staticmethod
+    def take(machine_id: int, product_id: int, amount: int = 1) -> bool:
+        result = db.session.execute(
+            db.update(MachineStock)
+            .where(
+                MachineStock.machine_id == machine_id,
+                MachineStock.product_id == product_id,
+                MachineStock.quantity >= amount,
+            )
+            .values(quantity=MachineStock.quantity - amount)
+        )
+        return result.rowcount == 1
+
+    # Same as take, for several products at once ( { product_id: amount } ):
+    #   UPDATE ... SET quantity = quantity - CASE product_id WHEN ... END
+    #   WHERE product_id IN (...) AND quantity >= CASE product_id WHEN ... END
+    # Returns whether every product had enough left. When not, the rows which
+    # did are decremented all the same, so the transaction has to be rolled back.
+    @staticmethod
+    def take_many(machine_id: int, amounts: Dict[int, int]) -> bool:
+        amount = db.case(amounts, value=MachineStock.product_id)
+        result = db.session.execute(
+            db.update(MachineStock)
+            .where(
+                MachineStock.machine_id == machine_id,
+                MachineStock.product_id.in_(list(amounts)),
+                MachineStock.quantity >= amount,
+            )
+            .values(quantity=MachineStock.quantity - amount)
+        )
+        return result.rowcount == len(amounts)
+
+    # Returns { product_id: quantity } for the given products of a machine,
+    # or for every product it stocks
+    @staticmethod
+    def quantities(
+        machine_id: int, product_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, int]:
+        stmt = db.select(MachineStock.product_id, MachineStock.quantity).where(
+            MachineStock.machine_id == machine_id
+        )
+        if product_ids is not None:
+            stmt = stmt.where(MachineStock.product_id.in_(list(product_ids)))
+        return {
+            product_id: quantity for product_id, quantity in db.session.execute(stmt)
+        }
+
+    # Bulk statements bypass the session, so any stock of the
+    # machine already loaded has to be refreshed on next access
+    @staticmethod
+    def expire(machine_id: int) -> None:
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, MachineStock) and obj.machine_id == machine_id:
+                db.session.expire(obj)
+
     @staticmethod
     def make(machine_id: int, product_id: int, quantity: int) -> Result:
+        # vending_machine imports this module
+        from app.models.vending_machine import Machine
 
         if not isinstance(product_id, int):
             return Result.error(
@@ -62,46 +172,52 @@ class MachineStock(db.Model):
                 f"Invalid machine ID type. Expected int, got={type(machine_id).__name__}"
             )
 
-        target_machine, machine_not_found_msg = vending_machine.Machine.find_by_id(
-            machine_id
-        )
+        target_machine, machine_not_found_msg = Machine.find_by_id(machine_id)
         if target_machine is None:
             return Result.error(machine_not_found_msg)
 
-        target_product = product.Product.find_by_name_or_id(
-            identifier=product_id, first=True
-        )
+        target_product = product.Product.cached(product_id)
         if target_product is None:
             return Result.error(f"No product with ID {product_id} found.")
 
         if quantity <= 0:
             return Result.error(f"Invalid quantity. ({quantity} <= 0)")
 
-        # Prevent duplicate entry
-        if MachineStock.get(
+        # The primary key rejects duplicate entries
+        new_stock = MachineStock(
             machine_id=machine_id,
-            product_id=product_id,
-        ):
+            product_id=target_product.product_id,
+            quantity=quantity,
+        )
+        if not try_insert(new_stock):
             return Result.error(
                 f"An existing entry already exists for machine {machine_id} and product {target_product.product_id}"
             )
 
         return Result(
-            MachineStock(
-                machine_id=machine_id,
-                product_id=target_product.product_id,
-                quantity=quantity,
-            ),
+            new_stock,
             f"Added product {target_product.product_id} to machine {machine_id} successfully. (qt={quantity})",
         )
 
+    # The product loaded along with the stock, or its catalog entry
+    # rather than lazily loading it
+    @property
+    def _product(self) -> "product.CatalogProduct | product.Product":
+        if "product" in db.inspect(self).unloaded:
+            return product.Product.cached(self.product_id)
+        return self.product
+
     @property
     def product_name(self) -> str:
-        return self.product.product_name
+        return self._product.product_name
 
     @property
     def product_price(self) -> float:
-        return self.product.product_price
+        return self._product.product_price
+
+    @property
+    def stock_key(self) -> Tuple[int, int]:
+        return (self.machine_id, self.product_id)
 
     """
     Processes the following json body into a list of tuples ( pid, quantity )
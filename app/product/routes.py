@@ -1,9 +1,11 @@
 from flask import Response, jsonify, request
 
-from app.extensions import db
-from app.models.product import Product
+from app.models.product import Product, product_catalog
+from app.models.sale import Sale
+from app.models.sale_rollup import SaleRollup, parse_period
+from app.models.vending_machine_stock import MachineStock
 from app.product import bp
-from app.utils import common
+from app.utils import common, pagination, time_series
 from app.utils.log import Log
 
 """
@@ -22,11 +24,9 @@ def create_product() -> Response:
         product_name = content.get("product_name")
         product_price = content.get("product_price")
 
-        result = Product.make(product_name, product_price)
-
-        if result.object:
-            db.session.add(result.object)
-            db.session.commit()
+        # Creating the product is all this request does, a duplicate
+        # can roll it back as a whole
+        result = Product.make(product_name, product_price, savepoint=False)
 
         return jsonify(
             Log().add_result(
@@ -42,7 +42,11 @@ def create_product() -> Response:
 
 @bp.route("/search/<identifier>", methods=["GET"])
 def search_product(identifier: str | int) -> Response:
-    if product := Product.find_by_name_or_id(identifier):
+    limit = request.args.get("limit", default=Product.SEARCH_LIMIT, type=int)
+    if limit <= 0:
+        return jsonify(Log().error(pagination.ERROR, f"Invalid limit. ({limit} <= 0)"))
+
+    if product := Product.find_by_name_or_id(identifier, limit=limit):
         return jsonify(product)
 
     return jsonify(
@@ -54,7 +58,7 @@ def search_product(identifier: str | int) -> Response:
 
 @bp.route("/<int:product_id>", methods=["GET"])
 def get_product(product_id: int) -> Response:
-    if product := Product.find_by_id(product_id):
+    if product := Product.cached(product_id):
         return jsonify(product)
 
     return jsonify(
@@ -84,8 +88,6 @@ def edit_product(product_id: int) -> Response:
 
             changelog = product.edit(new_name=new_name, new_price=new_price)
 
-            db.session.commit()
-
             return jsonify(changelog)
 
         return jsonify(common.JSON_ERROR)
@@ -97,24 +99,64 @@ def edit_product(product_id: int) -> Response:
     )
 
 
+"""
+Optional query string:
+    limit=<int>, after=<cursor>, count=<bool>
+"""
+
+
 @bp.route("/all", methods=["GET"])
 def get_all_products() -> Response:
-    if products := Product.query.all():
-        return jsonify(products)
+    page_request, page_error = pagination.parse_request(request, Product.product_id)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = Product.page(page_request)
+    if page.items or page_request.after is not None:
+        return page.apply(jsonify(page.items))
 
     return jsonify(
         Log().error(Product.ERROR_NOT_FOUND, "There are no existing products")
     )
 
 
+"""
+Optional query string:
+    in_stock_only=<bool>, min_quantity=<int>, limit=<int>, after=<cursor>, count=<bool>
+"""
+
+
 @bp.route("/<int:product_id>/where", methods=["GET"])
 def get_machine_with_stock(product_id: int) -> Response:
-    if product := Product.find_by_id(product_id):
+    page_request, page_error = pagination.parse_request(
+        request, MachineStock.machine_id
+    )
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    min_quantity = request.args.get("min_quantity")
+    if min_quantity is not None:
+        if not min_quantity.isdecimal() or not min_quantity.isascii():
+            return jsonify(
+                Log().error(
+                    pagination.ERROR,
+                    f"Invalid min_quantity. (Expected a non-negative integer, got {min_quantity})",
+                )
+            )
+        min_quantity = int(min_quantity)
 
-        if machines := product.found_in():
+    page = Product.found_in(
+        product_id,
+        page_request,
+        in_stock_only=request.args.get("in_stock_only", False, type=common.istrue),
+        min_quantity=min_quantity,
+    )
 
-            return jsonify(machines)
+    # Only look the product up when there is nothing to show
+    if page.items or page_request.after is not None:
+        return page.apply(jsonify(page.items))
 
+    if Product.cached(product_id):
         return jsonify(
             Log().error(Product.ERROR_NOT_FOUND, "Product not found in any machine.")
         )
@@ -124,3 +166,97 @@ def get_machine_with_stock(product_id: int) -> Response:
             Product.ERROR_NOT_FOUND, f"Product not found. (Product ID: {product_id})"
         )
     )
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<minute|hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/<int:product_id>/sales", methods=["GET"])
+def get_product_sales(product_id: int) -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    if not Product.cached(product_id):
+        return jsonify(
+            Log().error(
+                Product.ERROR_NOT_FOUND,
+                f"Product not found. (Product ID: {product_id})",
+            )
+        )
+
+    if not time_range.bucket:
+        return jsonify(Sale.totals(Sale.product_id, product_id, time_range))
+
+    page_request, page_error = pagination.parse_request(request, Sale.sold_at)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = Sale.buckets(Sale.product_id, product_id, page_request, time_range)
+    return page.apply(jsonify(page.items))
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/<int:product_id>/rollup", methods=["GET"])
+def get_product_rollup(product_id: int) -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    period, period_error = parse_period(time_range)
+    if period is None:
+        return jsonify(Log().error(time_series.ERROR, period_error))
+
+    page_request, page_error = pagination.parse_request(request, SaleRollup.bucket)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    if not Product.cached(product_id):
+        return jsonify(
+            Log().error(
+                Product.ERROR_NOT_FOUND,
+                f"Product not found. (Product ID: {product_id})",
+            )
+        )
+
+    page = SaleRollup.buckets(
+        SaleRollup.product_id, product_id, period, page_request, time_range
+    )
+    return page.apply(jsonify(page.items))
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/rollup", methods=["GET"])
+def get_products_rollup() -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    period, period_error = parse_period(time_range)
+    if period is None:
+        return jsonify(Log().error(time_series.ERROR, period_error))
+
+    page_request, page_error = pagination.parse_request(request, SaleRollup.product_id)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = SaleRollup.ranking(SaleRollup.product_id, period, page_request, time_range)
+    return page.apply(jsonify(page.items))
+
+
+@bp.route("/cache", methods=["GET"])
+def get_catalog_stats() -> Response:
+    return jsonify(product_catalog.stats())
@@ -0,0 +1,78 @@
+"""
+Reports changes made to a model once the transaction containing them commits.
+
+Values are captured as objects are flushed ( they are expired by the commit ),
+held on the session, and handed to subscribers after a successful commit. Changes
+belonging to a transaction which is rolled back are dropped.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Type
+
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+Captured = Dict[str, Any]
+
+# subscriber(changed={ primary_key: captured values }, deleted={ primary_key, ... })
+Subscriber = Callable[[Dict[Hashable, Captured], Set[Hashable]], None]
+
+
+class CommitTracker:
+    def __init__(
+        self, model: Type, key: str, capture: Callable[[Any], Captured]
+    ) -> None:
+        self.model = model
+        self.key = key
+        self.capture = capture
+        self.info_key = f"commit_tracker.{model.__name__}.{key}"
+        self.subscribers: List[Subscriber] = []
+
+        event.listen(Session, "after_flush", self._collect)
+        event.listen(Session, "after_commit", self._release)
+        event.listen(Session, "after_transaction_end", self._discard)
+
+    def subscribe(self, subscriber: Subscriber) -> Subscriber:
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    # Reports a change the session does not see, such as one made by a bulk
+    # statement, along with those flushed in the same transaction
+    def mark(
+        self, session: Session, key: Hashable, captured: Optional[Captured] = None
+    ) -> None:
+        pending = session.info.setdefault(self.info_key, ({}, set()))
+        pending[0][key] = captured or {}
+        pending[1].discard(key)
+
+    def _collect(self, session: Session, _flush_context: Any) -> None:  # noqa: ANN401
+        changed = [
+            obj for obj in [*session.new, *session.dirty] if isinstance(obj, self.model)
+        ]
+        deleted = [obj for obj in session.deleted if isinstance(obj, self.model)]
+
+        if not changed and not deleted:
+            return
+
+        pending = session.info.setdefault(self.info_key, ({}, set()))
+        for obj in changed:
+            key = getattr(obj, self.key)
+            pending[0][key] = self.capture(obj)
+            pending[1].discard(key)
+        for obj in deleted:
+            key = getattr(obj, self.key)
+            pending[0].pop(key, None)
+            pending[1].add(key)
+
+    def _release(self, session: Session) -> None:
+        pending = session.info.pop(self.info_key, None)
+        if pending is None or not has_app_context():
+            return
+
+        changed, deleted = pending
+        for subscriber in self.subscribers:
+            subscriber(changed, deleted)
+
+    def _discard(self, session: Session, transaction: SessionTransaction) -> None:
+        if transaction.parent is None:
+            session.info.pop(self.info_key, None)
@@ -17,3 +17,8 @@ def isnumber(s: str) -> bool:
         number = s[1:]
 
     return number.replace(".", "", 1).isdigit()
+
+
+# For flags passed through the query string ( ?in_stock_only=true )
+def istrue(s: str) -> bool:
+    return s.lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,158 @@
+"""
+Group commit: concurrent requests touching the same key share one transaction.
+
+The first request for a key becomes its leader. It waits `<PREFIX>_WINDOW` seconds
+for others to queue behind it, then applies up to `<PREFIX>_MAX_BATCH` queued items,
+in arrival order, in a single transaction, and hands every waiting request its own
+result. Items queued while a batch runs are taken by the next leader, the first of
+them, so no request waits for more than the batch ahead of it plus its own.
+
+Grouping is only active when `<PREFIX>_MODE` is set to "grouped", otherwise callers
+do their own work and commit.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+from flask import Flask, current_app
+
+from app.extensions import db
+
+Item = TypeVar("Item")
+Outcome = TypeVar("Outcome")
+
+MODE_DIRECT = "direct"
+MODE_GROUPED = "grouped"
+
+
+class _Waiter(Generic[Item, Outcome]):
+    def __init__(self, item: Item) -> None:
+        self.item = item
+        self.outcome: Optional[Outcome] = None
+        self.error: Optional[BaseException] = None
+        self.lead = False
+        self.done = threading.Event()
+
+
+class _Groups:
+    def __init__(self, app: Flask, window: float, max_batch: int) -> None:
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self.queues: Dict[Hashable, List[_Waiter]] = {}
+        self.lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+
+
+class GroupCommit(Generic[Item, Outcome]):
+    """
+    `apply(key, items)` runs in an app context of its own, must return one outcome
+    per item, in order, and leave committing to the group commit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config_prefix: str,
+        apply: Callable[[Hashable, List[Item]], List[Outcome]],
+    ) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+        self.apply = apply
+
+    def init_app(self, app: Flask) -> None:
+        if app.config.get(f"{self.config_prefix}_MODE", MODE_DIRECT) != MODE_GROUPED:
+            app.extensions.pop(self.name, None)
+            return
+
+        app.extensions[self.name] = _Groups(
+            app=app,
+            window=app.config.get(f"{self.config_prefix}_WINDOW", 0.005),
+            max_batch=app.config.get(f"{self.config_prefix}_MAX_BATCH", 100),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.name in current_app.extensions
+
+    @property
+    def _groups(self) -> _Groups:
+        return current_app.extensions[self.name]
+
+    # Queues the item behind others of the same key and returns its outcome
+    # once the batch holding it has committed
+    def submit(self, key: Hashable, item: Item) -> Outcome:
+        groups = self._groups
+        waiter = _Waiter(item)
+
+        with groups.lock:
+            queue = groups.queues.setdefault(key, [])
+            queue.append(waiter)
+            waiter.lead = len(queue) == 1
+
+        if waiter.lead:
+            # Give others a moment to join the batch
+            time.sleep(groups.window)
+        else:
+            waiter.done.wait()
+
+        # Either the first to arrive, or handed the lead by the previous batch
+        if waiter.lead:
+            self._lead(groups, key)
+
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.outcome
+
+    def _lead(self, groups: _Groups, key: Hashable) -> None:
+        with groups.lock:
+            batch = groups.queues[key][: groups.max_batch]
+
+        try:
+            self._run(groups, key, batch)
+        finally:
+            with groups.lock:
+                queue = groups.queues[key]
+                del queue[: len(batch)]
+
+                # Pass the lead on to whoever queued up meanwhile
+                if queue:
+                    queue[0].lead = True
+                    queue[0].done.set()
+                else:
+                    del groups.queues[key]
+
+            for waiter in batch[1:]:
+                waiter.done.set()
+
+    def _run(self, groups: _Groups, key: Hashable, batch: List[_Waiter]) -> None:
+        # A fresh app context gets its own session, kept apart from the
+        # request of the leader
+        with groups.app.app_context():
+            try:
+                outcomes = self.apply(key, [waiter.item for waiter in batch])
+                db.session.commit()
+            except Exception as error:
+                db.session.rollback()
+                for waiter in batch:
+                    waiter.error = error
+                return
+
+        for waiter, outcome in zip(batch, outcomes):
+            waiter.outcome = outcome
+
+        with groups.lock:
+            groups.batches += 1
+            groups.items += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        groups = self._groups
+        with groups.lock:
+            return {
+                "batches": groups.batches,
+                "items": groups.items,
+                "waiting": sum(len(queue) for queue in groups.queues.values()),
+            }
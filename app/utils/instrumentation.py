@@ -0,0 +1,149 @@
+"""
+Per request SQL instrumentation.
+
+Counts the statements, time spent in the database and commits of every request,
+from the engine's events, and reports them in a `Server-Timing` header:
+
+    Server-Timing: db;dur=3.412, queries;desc="4", savepoints;desc="2", commits;desc="1", total;dur=9.870
+
+and in one JSON log line per request ( logger "app.sql", INFO ). Statements beginning
+transactions are not counted, statements setting, releasing or rolling back to a
+savepoint are counted apart from queries, as savepoints. Statements issued outside of a
+request, by background workers, or while streaming a response, are not counted.
+Enabled with SQL_INSTRUMENTATION = True.
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from flask import Flask, Response, g, has_request_context, request
+from sqlalchemy import Connection, event
+from sqlalchemy.engine.interfaces import DBAPICursor, ExceptionContext
+
+from app.extensions import db
+
+# Statements working with savepoints, counted apart from queries
+SAVEPOINT_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO")
+
+# Statements beginning transactions or working with savepoints, not queries
+TRANSACTION_CONTROL = ("BEGIN", *SAVEPOINT_STATEMENTS)
+
+logger = logging.getLogger("app.sql")
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    savepoints: int = 0
+    db_seconds: float = 0.0
+    commits: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+
+class SQLInstrumentation:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config.get("SQL_INSTRUMENTATION", True):
+            return
+
+        with app.app_context():
+            engine = db.engine
+
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._failed)
+        event.listen(engine, "commit", self._commit)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions[self.name] = self
+
+    @staticmethod
+    def current() -> Optional[RequestStats]:
+        if not has_request_context():
+            return None
+        return g.get("sql_stats")
+
+    @staticmethod
+    def _start() -> None:
+        g.sql_stats = RequestStats()
+
+    @staticmethod
+    def _before_execute(
+        conn: Connection, cursor: DBAPICursor, statement: str, *args: object
+    ) -> None:
+        if SQLInstrumentation.current() is not None:
+            conn.info["sql_started"] = time.perf_counter()
+
+    @staticmethod
+    def _after_execute(
+        conn: Connection, cursor: DBAPICursor, statement: str, *args: object
+    ) -> None:
+        SQLInstrumentation._finish_statement(conn, statement)
+
+    # A statement which fails never reaches after_cursor_execute,
+    # it is counted all the same
+    @staticmethod
+    def _failed(context: ExceptionContext) -> None:
+        if context.connection is not None and context.statement is not None:
+            SQLInstrumentation._finish_statement(context.connection, context.statement)
+
+    @staticmethod
+    def _finish_statement(conn: Connection, statement: str) -> None:
+        started = conn.info.pop("sql_started", None)
+        stats = SQLInstrumentation.current()
+        if stats is None or started is None:
+            return
+
+        stats.db_seconds += time.perf_counter() - started
+        if statement.startswith(SAVEPOINT_STATEMENTS):
+            stats.savepoints += 1
+        elif not statement.startswith(TRANSACTION_CONTROL):
+            stats.queries += 1
+
+    @staticmethod
+    def _commit(conn: Connection) -> None:
+        if stats := SQLInstrumentation.current():
+            stats.commits += 1
+
+    @staticmethod
+    def _finish(response: Response) -> Response:
+        stats = SQLInstrumentation.current()
+        if stats is None:
+            return response
+
+        total = time.perf_counter() - stats.started
+        response.headers.add(
+            "Server-Timing",
+            f"db;dur={stats.db_seconds * 1000:.3f}, "
+            f'queries;desc="{stats.queries}", '
+            f'savepoints;desc="{stats.savepoints}", '
+            f'commits;desc="{stats.commits}", '
+            f"total;dur={total * 1000:.3f}",
+        )
+
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "queries": stats.queries,
+                    "savepoints": stats.savepoints,
+                    "db_ms": round(stats.db_seconds * 1000, 3),
+                    "commits": stats.commits,
+                    "total_ms": round(total * 1000, 3),
+                }
+            )
+        )
+        return response
+
+
+# Disabled with SQL_INSTRUMENTATION = False
+sql_instrumentation = SQLInstrumentation(name="sql_instrumentation")
@@ -0,0 +1,52 @@
+"""
+Optimistic inserts, leaving duplicate detection to the database's unique keys.
+
+Checking for an existing row before inserting costs a query and still lets two
+concurrent requests insert the same row. Inserting right away and catching the
+key violation is correct across processes, but it is not free: so that a duplicate
+only undoes the insert, the insert runs in a savepoint, which costs a SAVEPOINT and
+a RELEASE round trip ( and a BEGIN on SQLite ) in place of the SELECT. Callers whose
+transaction holds nothing but the insert can do without the savepoint.
+"""
+
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+
+# MySQL ER_DUP_ENTRY
+MYSQL_DUPLICATE_ENTRY = 1062
+
+
+def is_duplicate(error: IntegrityError) -> bool:
+    orig = error.orig
+    if orig is not None and orig.args and orig.args[0] == MYSQL_DUPLICATE_ENTRY:
+        return True
+
+    # SQLite reports primary key violations the same way
+    return "UNIQUE constraint failed" in str(orig)
+
+
+# Inserts `obj` inside a savepoint, so a duplicate only undoes this insert and
+# not the rest of the transaction. With `savepoint` False, a duplicate rolls back
+# the whole transaction instead, only for callers with nothing else in it.
+# Returns False if `obj` is a duplicate.
+def try_insert(obj: db.Model, savepoint: bool = True) -> bool:
+    # Already loaded by this session, no need to ask the database
+    key = db.inspect(type(obj)).identity_key_from_instance(obj)
+    if None not in key[1] and key in db.session.identity_map:
+        return False
+
+    try:
+        if savepoint:
+            with db.session.begin_nested():
+                db.session.add(obj)
+        else:
+            db.session.add(obj)
+            db.session.flush()
+    except IntegrityError as error:
+        if not is_duplicate(error):
+            raise
+        if not savepoint:
+            db.session.rollback()
+        return False
+    return True
@@ -0,0 +1,142 @@
+"""
+In-process read-through cache, least recently used entries are evicted first and
+entries older than `<PREFIX>_TTL` seconds are refetched.
+
+Misses are loaded in one batch through `load`, so looking up many keys costs at
+most one query. Writers call `invalidate` ( typically once their transaction has
+committed ); the TTL bounds how long writes made by other processes stay unseen.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+from flask import Flask, current_app
+
+Key = TypeVar("Key", bound=Hashable)
+Value = TypeVar("Value")
+
+
+class LRUCache(Generic[Key, Value]):
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[Key, Tuple[float, Value]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Bumped by every invalidation, so that values loaded before it
+        # are not cached after it
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the cached values among `keys`, and the generation they belong to
+    def get_many(self, keys: Iterable[Key]) -> Tuple[Dict[Key, Value], int]:
+        found = {}
+        now = time.monotonic()
+
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or (self.ttl and now - entry[0] > self.ttl):
+                    self.misses += 1
+                    continue
+
+                self.entries.move_to_end(key)
+                found[key] = entry[1]
+                self.hits += 1
+
+            return found, self.generation
+
+    def put_many(self, values: Dict[Key, Value], generation: int) -> None:
+        now = time.monotonic()
+
+        with self.lock:
+            # Something was invalidated while these were being loaded
+            if generation != self.generation:
+                return
+
+            for key, value in values.items():
+                self.entries[key] = (now, value)
+                self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Key]) -> None:
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class ReadThroughCache(Generic[Key, Value]):
+    """
+    Keeps one LRUCache per app, sized by `<PREFIX>_SIZE`. Keys `load` does not
+    return a value for are not cached.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config_prefix: str,
+        load: Callable[[Iterable[Key]], Dict[Key, Value]],
+    ) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+        self.load = load
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[self.name] = LRUCache(
+            max_size=app.config.get(f"{self.config_prefix}_SIZE", 1024),
+            ttl=app.config.get(f"{self.config_prefix}_TTL", 300.0),
+        )
+
+    @property
+    def _cache(self) -> LRUCache:
+        return current_app.extensions[self.name]
+
+    def get_many(self, keys: Iterable[Key]) -> Dict[Key, Value]:
+        cache = self._cache
+        keys = list(keys)
+
+        found, generation = cache.get_many(keys)
+        if missing := [key for key in keys if key not in found]:
+            loaded = self.load(missing)
+            cache.put_many(loaded, generation)
+            found.update(loaded)
+
+        return found
+
+    def get(self, key: Key) -> Optional[Value]:
+        return self.get_many([key]).get(key)
+
+    def invalidate(self, keys: Iterable[Key]) -> None:
+        self._cache.invalidate(keys)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
@@ -0,0 +1,201 @@
+"""
+In-process n-gram index for substring search over short names.
+
+Every substring of up to GRAM characters of a name is indexed, so a query of up to
+GRAM characters is answered by a single lookup, and a longer one by intersecting the
+posting sets of its GRAM long pieces and checking the few candidates left. The cost
+depends on how common the searched text is, not on how many names are indexed.
+Matching is case insensitive.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import Flask, current_app
+
+GRAM = 3
+
+# Rank of a match, lower is better
+EXACT = 0
+PREFIX = 1
+SUBSTRING = 2
+
+
+def grams(text: str, size: int) -> Set[str]:
+    return {text[i : i + size] for i in range(len(text) - size + 1)}  # noqa: E203
+
+
+class NgramIndex:
+    def __init__(self) -> None:
+        self.names: Dict[int, str] = {}
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _fold(name: str) -> str:
+        return name.casefold()
+
+    @staticmethod
+    def _pieces(folded: str) -> Set[str]:
+        pieces: Set[str] = set()
+        for size in range(1, GRAM + 1):
+            pieces |= grams(folded, size)
+        return pieces
+
+    def add(self, key: int, name: str) -> None:
+        self.remove(key)
+        folded = self._fold(name)
+        self.names[key] = folded
+        for piece in self._pieces(folded):
+            self.postings[piece].add(key)
+
+    def remove(self, key: int) -> None:
+        folded = self.names.pop(key, None)
+        if folded is None:
+            return
+
+        for piece in self._pieces(folded):
+            if keys := self.postings.get(piece):
+                keys.discard(key)
+                if not keys:
+                    del self.postings[piece]
+
+    # Returns ( rank, key ) of matching names, best matches first
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        folded = self._fold(query)
+        if not folded:
+            return []
+
+        if len(folded) <= GRAM:
+            candidates = self.postings.get(folded, set())
+        else:
+            # Start from the rarest piece to keep the intersection small
+            posting_sets = sorted(
+                (self.postings.get(piece, set()) for piece in grams(folded, GRAM)),
+                key=len,
+            )
+            candidates = set(posting_sets[0]).intersection(*posting_sets[1:])
+
+        matches = []
+        for key in candidates:
+            name = self.names[key]
+            if name == folded:
+                matches.append((EXACT, name, key))
+            elif name.startswith(folded):
+                matches.append((PREFIX, name, key))
+            elif folded in name:
+                matches.append((SUBSTRING, name, key))
+
+        matches.sort()
+        return [(rank, key) for rank, _, key in matches[:limit]]
+
+
+class _IndexState:
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.index: Optional[NgramIndex] = None
+        self.built_at = 0.0
+        # Guards everything above and below, never held while loading
+        self.lock = threading.Lock()
+
+        # Bumped by `clear`, a rebuild started before it is thrown away
+        self.generation = 0
+        # Per running rebuild, the changes applied since it started, replayed
+        # onto the index it builds
+        self.rebuilds: List[List[Tuple[Dict[int, str], List[int]]]] = []
+
+
+class NameSearch:
+    """
+    Keeps one NgramIndex per app. The index is built from `load` on first use and
+    rebuilt once `<PREFIX>_TTL` seconds old, which bounds how long writes made by
+    other processes stay invisible. Writes made by this process are applied as
+    they are committed through `apply`.
+
+    Rebuilds happen outside the lock, searches meanwhile use the old index, and the
+    new one is swapped in along with the writes applied while it was being built.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config_prefix: str,
+        load: Callable[[], Iterable[Tuple[int, str]]],
+    ) -> None:
+        self.name = name
+        self.config_prefix = config_prefix
+        self.load = load
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions[self.name] = _IndexState(
+            ttl=app.config.get(f"{self.config_prefix}_TTL", 60.0)
+        )
+
+    @property
+    def _state(self) -> _IndexState:
+        return current_app.extensions[self.name]
+
+    # Loads a new index and swaps it in, unless cleared meanwhile, and returns
+    # it. While another rebuild is running, the old index is returned instead.
+    def _rebuild(self, state: _IndexState) -> NgramIndex:
+        with state.lock:
+            if state.rebuilds and state.index is not None:
+                return state.index
+            generation = state.generation
+            missed: List[Tuple[Dict[int, str], List[int]]] = []
+            state.rebuilds.append(missed)
+
+        try:
+            index = NgramIndex()
+            for key, name in self.load():
+                index.add(key, name)
+        except Exception:
+            with state.lock:
+                state.rebuilds.remove(missed)
+            raise
+
+        with state.lock:
+            state.rebuilds.remove(missed)
+            for changed, deleted in missed:
+                self._apply(index, changed, deleted)
+            if state.generation == generation:
+                state.index = index
+                state.built_at = time.monotonic()
+        return index
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        state = self._state
+        with state.lock:
+            expired = state.ttl and time.monotonic() - state.built_at > state.ttl
+            if state.index is not None and not expired:
+                return state.index.search(query, limit)
+
+        index = self._rebuild(state)
+        with state.lock:
+            return index.search(query, limit)
+
+    @staticmethod
+    def _apply(index: NgramIndex, changed: Dict[int, str], deleted: List[int]) -> None:
+        for key, name in changed.items():
+            index.add(key, name)
+        for key in deleted:
+            index.remove(key)
+
+    def apply(self, changed: Dict[int, str], deleted: Iterable[int]) -> None:
+        state = self._state
+        deleted = list(deleted)
+        with state.lock:
+            for missed in state.rebuilds:
+                missed.append((changed, deleted))
+            if state.index is not None:
+                self._apply(state.index, changed, deleted)
+
+    def clear(self) -> None:
+        state = self._state
+        with state.lock:
+            state.index = None
+            state.generation += 1
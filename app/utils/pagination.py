@@ -0,0 +1,194 @@
+"""
+Keyset ( cursor ) pagination.
+
+Rather than skipping rows with OFFSET, each page continues after the key of the last
+row of the previous page, so every page costs the same index range scan however deep
+the client pages. Clients pass `limit` and `after`, the opaque cursor handed back in
+the X-Next-Cursor response header, which is absent on the last page. Passing
+`count=true` also returns the number of matching rows in the X-Total-Count header,
+which costs an extra COUNT query and is left out otherwise.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, TypeAlias, Union
+
+from flask import Request, Response
+from sqlalchemy import ColumnElement, Select
+
+from app.extensions import db
+from app.utils import common
+from app.utils.result import Result
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+ERROR = "Pagination Error"
+
+# Whatever identifies the last row of a page, it round trips through JSON
+# ( datetimes as ISO 8601 strings )
+KeyValue: TypeAlias = Union[int, float, str, datetime]
+CursorKey: TypeAlias = Union[KeyValue, List[KeyValue]]
+
+# The column(s) a page is ordered by, most significant first
+PageKey: TypeAlias = Union[ColumnElement, Sequence[ColumnElement]]
+
+
+@dataclass
+class PageRequest:
+    limit: int
+    after: Optional[CursorKey] = None
+    with_total: bool = False
+
+
+@dataclass
+class Page:
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+    # Attaches the cursor of the next page, and the total if it was
+    # asked for, to the response
+    def apply(self, response: Response) -> Response:
+        if self.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+        if self.total is not None:
+            response.headers[TOTAL_COUNT_HEADER] = str(self.total)
+        return response
+
+
+def _key_columns(key: PageKey) -> List[ColumnElement]:
+    if isinstance(key, (list, tuple)):
+        return list(key)
+    return [key]
+
+
+def _json_default(value: Any) -> str:  # noqa: ANN401
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can not use {type(value).__name__} in a cursor.")
+
+
+def encode_cursor(key: CursorKey) -> str:
+    raw = json.dumps(key, separators=(",", ":"), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CursorKey:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+# Converts a decoded cursor back into values of the key columns,
+# None if it does not fit them
+def _cursor_values(
+    after: Any, columns: List[ColumnElement]  # noqa: ANN401
+) -> Optional[List[KeyValue]]:
+    values = after if len(columns) > 1 else [after]
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+
+    converted = []
+    for value, column in zip(values, columns):
+        expected = column.type.python_type
+        if expected is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return None
+        elif expected is int:
+            if not isinstance(value, int) or isinstance(value, bool):
+                return None
+        elif not isinstance(value, (int, float, str)):
+            return None
+
+        converted.append(value)
+    return converted
+
+
+# Reads `limit`, `after` and `count` from the query string. The cursor is
+# checked against the key column(s) of the page, when given.
+def parse_request(request: Request, key: Optional[PageKey] = None) -> Result:
+    limit = request.args.get("limit", default=DEFAULT_LIMIT, type=int)
+    if limit <= 0:
+        return Result.error(f"Invalid limit. ({limit} <= 0)")
+
+    after = None
+    if cursor := request.args.get("after"):
+        try:
+            after = decode_cursor(cursor)
+        except (binascii.Error, ValueError):
+            after = None
+
+        if key is not None:
+            after = _cursor_values(after, _key_columns(key))
+            if after is not None and not isinstance(key, (list, tuple)):
+                after = after[0]
+
+        if not isinstance(after, (int, float, str, list, datetime)):
+            return Result.error(f"Invalid cursor. (got {cursor})")
+
+    return Result(
+        PageRequest(
+            limit=min(limit, MAX_LIMIT),
+            after=after,
+            with_total=request.args.get("count", False, type=common.istrue),
+        )
+    )
+
+
+# ( k1, k2, ... ) > ( v1, v2, ... ), spelled out so that it works on every
+# backend and the leading column can still be range scanned
+def _after(columns: List[ColumnElement], values: List[KeyValue]) -> ColumnElement:
+    column, *rest = columns
+    value, *rest_values = values
+    if not rest:
+        return column > value
+    return db.or_(column > value, db.and_(column == value, _after(rest, rest_values)))
+
+
+# Orders `stmt` by the given key column(s), starting after `after` if set
+def order_after(stmt: Select, key: PageKey, after: Optional[CursorKey]) -> Select:
+    columns = _key_columns(key)
+    if after is not None:
+        values = after if isinstance(key, (list, tuple)) else [after]
+        stmt = stmt.where(_after(columns, values))
+    return stmt.order_by(*columns)
+
+
+# Runs `stmt` ordered by, and continuing after, the given key column(s).
+# The key has to be unique, otherwise rows sharing a key across a page
+# boundary are skipped. With `scalars`, items are the first entity of each
+# row rather than the rows themselves.
+def paginate(
+    stmt: Select, key: PageKey, page_request: PageRequest, scalars: bool = False
+) -> Page:
+    columns = _key_columns(key)
+
+    total = None
+    if page_request.with_total:
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(stmt.order_by(None).subquery())
+        ).scalar_one()
+
+    # Fetch one extra row to know whether there is a next page
+    stmt = order_after(stmt, key, page_request.after).limit(page_request.limit + 1)
+    result = db.session.execute(stmt)
+    rows = result.scalars().all() if scalars else result.all()
+
+    if len(rows) <= page_request.limit:
+        return Page(items=rows, total=total)
+
+    rows = rows[: page_request.limit]
+    last = [getattr(rows[-1], column.key) for column in columns]
+    return Page(
+        items=rows,
+        next_cursor=encode_cursor(last if isinstance(key, (list, tuple)) else last[0]),
+        total=total,
+    )
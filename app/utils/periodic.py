@@ -0,0 +1,59 @@
+"""
+Background thread running a task every `interval` seconds, or sooner when woken up.
+"""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    def __init__(self, name: str, interval: float, task: Callable[[], None]) -> None:
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # Safe to call repeatedly, only the first call spawns the thread
+    def start(self) -> None:
+        with self._start_lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            self._thread.start()
+
+    # Runs the task now instead of waiting for the interval to pass
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            if self._stop.is_set():
+                break
+
+            try:
+                self.task()
+            except Exception:  # pragma: no cover
+                logger.exception("Periodic task '%s' failed.", self.name)
@@ -0,0 +1,34 @@
+"""
+SQLite specifics, for running without a MySQL server.
+
+Every connection is set up with SQLITE_PRAGMAS, by default WAL journaling ( reads carry
+on while a write commits ), relaxed syncing, enforced foreign keys and a busy timeout,
+so concurrent requests wait for the write lock rather than fail.
+
+pysqlite only begins a transaction ahead of a statement changing data, so a SAVEPOINT
+issued first would become the transaction itself, and releasing it would commit
+everything before the outer transaction is done. The transaction is begun ahead of
+the savepoint instead, as pysqlite would have done ahead of the insert.
+"""
+
+from typing import Any, Dict
+
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.engine.interfaces import DBAPIConnection
+from sqlalchemy.pool import ConnectionPoolEntry
+
+
+def configure(engine: Engine, pragmas: Dict[str, Any]) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(
+        dbapi_connection: DBAPIConnection, _record: ConnectionPoolEntry
+    ) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    @event.listens_for(engine, "savepoint")
+    def _begin_first(connection: Connection, _name: str) -> None:
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
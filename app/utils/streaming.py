@@ -0,0 +1,55 @@
+"""
+Newline delimited JSON ( NDJSON ) responses for listings too long to build in memory.
+
+Rows are read through a server-side cursor, STREAM_BATCH_SIZE at a time, and written
+out one JSON object per line as they arrive. Memory use stays flat however many rows
+match. Clients opt in with `Accept: application/x-ndjson`.
+"""
+
+import itertools
+from typing import Dict, Iterator, Optional
+
+from flask import Request, Response, current_app, stream_with_context
+from sqlalchemy import Select
+
+from app.extensions import db
+from app.utils.pagination import CursorKey, PageKey, order_after
+
+NDJSON = "application/x-ndjson"
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def accepts_ndjson(request: Request) -> bool:
+    return request.accept_mimetypes.best_match(["application/json", NDJSON]) == NDJSON
+
+
+# Yields the rows of `stmt` as dictionaries, in key order, fetching them in batches
+def stream_rows(
+    stmt: Select, key: PageKey, after: Optional[CursorKey] = None
+) -> Iterator[Dict]:
+    batch_size = current_app.config.get("STREAM_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    result = db.session.execute(
+        order_after(stmt, key, after).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        yield row._asdict()
+
+
+# Streams the rows as NDJSON. Returns None when there are none to stream,
+# unless `allow_empty`, so that callers can report that as usual.
+def ndjson_response(
+    rows: Iterator[Dict], allow_empty: bool = False
+) -> Optional[Response]:
+    first = next(rows, None)
+    if first is None and not allow_empty:
+        return None
+
+    def generate() -> Iterator[str]:
+        if first is None:
+            return
+        for row in itertools.chain([first], rows):
+            yield current_app.json.dumps(row) + "\n"
+
+    # Keep the request ( and with it the session ) alive while streaming
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
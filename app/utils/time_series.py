@@ -0,0 +1,105 @@
+"""
+Time range filters and dialect aware time buckets.
+
+Clients narrow a time series down with `from` and `to` ( ISO 8601, `from` inclusive,
+`to` exclusive ). Times are stored as naive local time, so values with a UTC offset
+are converted to it. Clients may ask for it to be summarised per `bucket` ( minute, hour or
+day ), in which case the grouping is done by the database.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from flask import Request
+from sqlalchemy import ColumnElement, Select
+
+from app.extensions import db
+from app.utils.result import Result
+
+ERROR = "Time Range Error"
+
+# Supported bucket sizes and the timestamp format truncating to them, per dialect
+BUCKET_FORMATS = {
+    "mysql": {
+        "minute": "%Y-%m-%d %H:%i:00",
+        "hour": "%Y-%m-%d %H:00:00",
+        "day": "%Y-%m-%d 00:00:00",
+    },
+    # Matches how SQLAlchemy stores datetimes in SQLite ( with microseconds ),
+    # so that buckets compare equal to datetime parameters
+    "sqlite": {
+        "minute": "%Y-%m-%d %H:%M:00.000000",
+        "hour": "%Y-%m-%d %H:00:00.000000",
+        "day": "%Y-%m-%d 00:00:00.000000",
+    },
+}
+
+BUCKETS = tuple(BUCKET_FORMATS["mysql"])
+
+
+@dataclass
+class TimeRange:
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    bucket: Optional[str] = None
+
+    # Restricts `stmt` to rows whose `column` falls within the range
+    def apply(self, stmt: Select, column: ColumnElement) -> Select:
+        if self.start is not None:
+            stmt = stmt.where(column >= self.start)
+        if self.end is not None:
+            stmt = stmt.where(column < self.end)
+        return stmt
+
+
+# Truncates `column` to the start of its bucket, as a datetime
+def bucket_start(column: ColumnElement, bucket: str) -> ColumnElement:
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        truncated = db.func.date_format(column, BUCKET_FORMATS[dialect][bucket])
+        return db.cast(truncated, db.DateTime)
+    elif dialect == "sqlite":
+        truncated = db.func.strftime(BUCKET_FORMATS[dialect][bucket], column)
+        return db.type_coerce(truncated, db.DateTime)
+    else:  # pragma: no cover
+        raise NotImplementedError(f"Time buckets are not supported for '{dialect}'.")
+
+
+def _parse_datetime(name: str, value: Optional[str]) -> Result:
+    if value is None:
+        return Result(None)
+
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return Result.error(
+            f"Invalid '{name}'. (Expected an ISO 8601 date/time, got {value})"
+        )
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return Result(parsed)
+
+
+# Reads `from`, `to` and `bucket` from the query string
+def parse_request(request: Request) -> Result:
+    start, start_error = _parse_datetime("from", request.args.get("from"))
+    if start_error:
+        return Result.error(start_error)
+
+    end, end_error = _parse_datetime("to", request.args.get("to"))
+    if end_error:
+        return Result.error(end_error)
+
+    if start is not None and end is not None and start >= end:
+        return Result.error(f"Empty time range. ({start} >= {end})")
+
+    bucket = request.args.get("bucket")
+    if bucket is not None and bucket not in BUCKETS:
+        return Result.error(
+            f"Invalid bucket. (Expected one of {', '.join(BUCKETS)}, got {bucket})"
+        )
+
+    return Result(TimeRange(start=start, end=end, bucket=bucket))
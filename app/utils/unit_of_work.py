@@ -0,0 +1,41 @@
+"""
+Request scoped unit of work.
+
+Model methods only stage and flush their changes, everything a request changed is
+committed once, after its view has returned. A view failing with an exception, or
+returning a server error, has its changes rolled back as a whole. Requests which
+can not change anything ( GET, HEAD, OPTIONS ) are never committed.
+"""
+
+from flask import Flask, Response, request
+
+from app.extensions import db
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class UnitOfWork:
+    def init_app(self, app: Flask) -> None:
+        app.after_request(self._finish)
+
+    @staticmethod
+    def _finish(response: Response) -> Response:
+        if request.method in SAFE_METHODS:
+            return response
+
+        if response.status_code >= 500:
+            db.session.rollback()
+            return response
+
+        # Raising here turns the response into a server error, which
+        # is what the client should see if nothing was saved
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return response
+
+
+unit_of_work = UnitOfWork()
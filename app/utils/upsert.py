@@ -0,0 +1,51 @@
+"""
+Dialect aware "insert or update" statements.
+
+The statement returned is meant to be executed with a list of parameter
+dictionaries, so a whole batch of rows is written with a single statement.
+"""
+
+from typing import Iterable
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.sql.dml import Insert
+
+from app.extensions import db
+
+
+def upsert(
+    table: Table,
+    keys: Iterable[str],
+    increment: Iterable[str] = (),
+    replace: Iterable[str] = (),
+) -> Insert:
+    """Returns an INSERT which resolves primary/unique key conflicts in place.
+
+    Args:
+        table (Table): Target table.
+        keys (Iterable[str]): Columns forming the conflicting key.
+        increment (Iterable[str]): Columns added onto the existing value.
+        replace (Iterable[str]): Columns overwritten with the new value.
+
+    Returns:
+        Insert: Statement to execute with a list of row dictionaries.
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        new_values = stmt.inserted
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        new_values = stmt.excluded
+    else:  # pragma: no cover
+        raise NotImplementedError(f"Upsert is not supported for '{dialect}'.")
+
+    changes = {name: table.c[name] + new_values[name] for name in increment}
+    changes.update({name: new_values[name] for name in replace})
+
+    if dialect == "mysql":
+        return stmt.on_duplicate_key_update(changes)
+
+    return stmt.on_conflict_do_update(index_elements=list(keys), set_=changes)
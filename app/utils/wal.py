@@ -0,0 +1,84 @@
+"""
+Append-only write-ahead log of JSON records, kept as numbered segment files.
+
+Records are appended to the open segment and handed to the OS right away, so they
+survive the process crashing ( with `sync`, every append is also fsync'ed, so they
+survive the machine crashing too ). Once the records of a segment are safely stored
+elsewhere, the segment is sealed with `rotate` and deleted with `discard`. `replay`
+yields every record still on disk, oldest first.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+Record = Dict[str, Any]
+
+
+class WriteAheadLog:
+    def __init__(self, directory: str, name: str, sync: bool = False) -> None:
+        self.directory = Path(directory)
+        self.name = name
+        self.sync = sync
+        self.lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        self._segment = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if segments := self.segments():
+            self._segment = self._number(segments[-1])
+
+    def _path(self, number: int) -> Path:
+        return self.directory / f"{self.name}.{number:08d}.wal"
+
+    @staticmethod
+    def _number(path: Path) -> int:
+        return int(path.suffixes[-2].lstrip("."))
+
+    # Segment files on disk, oldest first
+    def segments(self) -> List[Path]:
+        return sorted(self.directory.glob(f"{self.name}.*.wal"), key=self._number)
+
+    def append(self, record: Record) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self._file is None:
+                self._segment += 1
+                self._file = open(self._path(self._segment), "a", encoding="utf-8")
+
+            self._file.write(line)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    # Closes the open segment, records appended from now on go to a new one.
+    # Returns every sealed segment, to be discarded once stored elsewhere.
+    def rotate(self) -> List[Path]:
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return [path for path in self.segments() if path.exists()]
+
+    def discard(self, segments: List[Path]) -> None:
+        for path in segments:
+            path.unlink(missing_ok=True)
+
+    # Yields every record on disk. A torn last line, left by a crash in the
+    # middle of an append, is skipped.
+    def replay(self) -> Iterator[Record]:
+        for path in self.segments():
+            with open(path, encoding="utf-8") as segment:
+                for line in segment:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def close(self) -> None:
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
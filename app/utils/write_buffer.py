@@ -0,0 +1,203 @@
+"""
+Write-behind buffering for rows which do not have to be written inside the request producing them.
+
+Rows are staged on the session and only queued once its transaction commits, so
+nothing is written for work which ends up rolled back. A newer row replaces a queued
+one with the same key, and rows are handed to a writer in batches once
+`<PREFIX>_BUFFER_SIZE` rows are waiting or `<PREFIX>_FLUSH_INTERVAL` seconds have
+passed. Buffering is only active when `<PREFIX>_MODE` is set to "buffered",
+otherwise callers write synchronously.
+
+A batch the database rejects (a row referencing a deleted parent, say) is retried
+row by row, rows violating a constraint are dropped and logged rather than queued
+again, so one bad row can't hold back every other. Rows of something being deleted
+should be dropped beforehand with `discard`.
+"""
+
+import atexit
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, SessionTransaction
+
+from app.extensions import db
+from app.utils.periodic import PeriodicWorker
+
+Row = Dict[str, Any]
+Writer = Callable[[List[Row]], None]
+
+MODE_SYNC = "sync"
+MODE_BUFFERED = "buffered"
+
+
+class _PendingRows:
+    def __init__(
+        self, app: Flask, name: str, writer: Writer, max_size: int, interval: float
+    ) -> None:
+        self.app = app
+        self.writer = writer
+        self.max_size = max_size
+        self.rows: Dict[Hashable, Row] = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.worker = PeriodicWorker(f"{name}-flusher", interval, self.flush)
+
+    def put(self, key: Hashable, row: Row) -> None:
+        with self.lock:
+            self.rows[key] = row
+            full = len(self.rows) >= self.max_size
+
+        self.worker.start()
+        if full:
+            self.worker.wake()
+
+    # Writes out everything queued so far, returns the number of rows written
+    def flush(self) -> int:
+        with self.flush_lock:
+            with self.lock:
+                rows, self.rows = self.rows, {}
+
+            if not rows:
+                return 0
+
+            # A fresh app context gets its own session, so flushing never
+            # commits work belonging to whoever happens to trigger it
+            with self.app.app_context():
+                try:
+                    self.writer(list(rows.values()))
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    return self._write_each(rows)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Failed to write buffered rows.")
+                    self._requeue(rows)
+                    return 0
+
+            return len(rows)
+
+    # Writes rows one at a time, dropping those the database rejects
+    def _write_each(self, rows: Dict[Hashable, Row]) -> int:
+        written = 0
+        keys = list(rows)
+        for index, key in enumerate(keys):
+            try:
+                self.writer([rows[key]])
+                db.session.commit()
+                written += 1
+            except IntegrityError:
+                db.session.rollback()
+                self.app.logger.exception(f"Dropped buffered row: {rows[key]}")
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Failed to write buffered rows.")
+                self._requeue({k: rows[k] for k in keys[index:]})
+                break
+        return written
+
+    # Puts rows back unless something newer was queued meanwhile
+    def _requeue(self, rows: Dict[Hashable, Row]) -> None:
+        with self.lock:
+            for key, row in rows.items():
+                self.rows.setdefault(key, row)
+
+    def discard(self, values: Row) -> None:
+        with self.lock:
+            self.rows = {
+                key: row for key, row in self.rows.items() if not _matches(row, values)
+            }
+
+    def close(self) -> None:
+        self.worker.stop()
+        self.flush()
+
+
+def _matches(row: Row, values: Row) -> bool:
+    return all(row.get(column) == value for column, value in values.items())
+
+
+class WriteBehindBuffer:
+    def __init__(self, name: str, config_prefix: str, writer: Writer):  # noqa: ANN204
+        self.name = name
+        self.config_prefix = config_prefix
+        self.writer = writer
+
+        event.listen(Session, "after_commit", self._release)
+        event.listen(Session, "after_transaction_end", self._drop_staged)
+
+    def init_app(self, app: Flask) -> None:
+        prefix = self.config_prefix
+        if app.config.get(f"{prefix}_MODE", MODE_SYNC) != MODE_BUFFERED:
+            return
+
+        pending = _PendingRows(
+            app=app,
+            name=self.name,
+            writer=self.writer,
+            max_size=app.config.get(f"{prefix}_BUFFER_SIZE", 500),
+            interval=app.config.get(f"{prefix}_FLUSH_INTERVAL", 1.0),
+        )
+        app.extensions[self.name] = pending
+
+        # Nothing queued should be lost when the process exits normally
+        atexit.register(pending.close)
+
+    @property
+    def enabled(self) -> bool:
+        return self.name in current_app.extensions
+
+    # Queues a row once the current transaction commits. Returns False when
+    # buffering is disabled and the caller is expected to write the row itself
+    def put(self, key: Hashable, row: Row) -> bool:
+        if self.name not in current_app.extensions:
+            return False
+
+        db.session.info.setdefault(self.name, {})[key] = row
+        return True
+
+    # Queues a row right away, for work which is not part of a transaction.
+    # Returns False when buffering is disabled, as `put` does.
+    def queue(self, key: Hashable, row: Row) -> bool:
+        if pending := current_app.extensions.get(self.name):
+            pending.put(key, row)
+            return True
+        return False
+
+    def flush(self) -> int:
+        if pending := current_app.extensions.get(self.name):
+            return pending.flush()
+        return 0
+
+    # Drops every row with the given column values, staged on the current
+    # session or queued, e.g. the rows of a machine being deleted
+    def discard(self, **values: object) -> None:
+        if self.name not in current_app.extensions:
+            return
+
+        if staged := db.session.info.get(self.name):
+            for key in [k for k, row in staged.items() if _matches(row, values)]:
+                del staged[key]
+
+        current_app.extensions[self.name].discard(values)
+
+    def pending(self) -> int:
+        if pending := current_app.extensions.get(self.name):
+            return len(pending.rows)
+        return 0
+
+    def _release(self, session: Session) -> None:
+        staged = session.info.pop(self.name, None)
+        if not staged or not has_app_context():
+            return
+
+        if pending := current_app.extensions.get(self.name):
+            for key, row in staged.items():
+                pending.put(key, row)
+
+    def _drop_staged(self, session: Session, transaction: SessionTransaction) -> None:
+        if transaction.parent is None:
+            session.info.pop(self.name, None)
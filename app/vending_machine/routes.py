@@ -1,10 +1,16 @@
 from flask import Response, jsonify, request
 
 from app.extensions import db
+from app.models.sale import Sale
+from app.models.sale_rollup import SaleRollup, parse_period
 from app.models.vending_machine import Machine
-from app.models.vending_machine_record import StockRecord
+from app.models.vending_machine_record import (
+    MACHINE_RECORDS_KEY,
+    PRODUCT_RECORDS_KEY,
+    StockRecord,
+)
 from app.models.vending_machine_stock import MachineStock
-from app.utils import common
+from app.utils import common, pagination, streaming, time_series
 from app.utils.log import Log
 from app.vending_machine import bp
 
@@ -13,12 +19,9 @@ from app.vending_machine import bp
 def create(location: str, name: str) -> Response:
     log = Log()
 
-    result = Machine.make(location, name)
-    machine, _ = result
-
-    if machine:
-        db.session.add(machine)
-        db.session.commit()
+    # Creating the machine is all this request does, a duplicate
+    # can roll it back as a whole
+    result = Machine.make(location, name, savepoint=False)
 
     log.add_result(
         name="Machine",
@@ -60,8 +63,6 @@ def add_product_to_machine(machine_id: int) -> Response:
             stock_list = MachineStock.process_raw(raw_stock_list)
             log = target_machine.add_products(stocks=stock_list)
 
-            db.session.commit()
-
             return jsonify(log)
 
         return jsonify(common.JSON_ERROR)
@@ -71,7 +72,7 @@ def add_product_to_machine(machine_id: int) -> Response:
 
 @bp.route("/<int:machine_id>", methods=["GET"])
 def get_machine_by_id(machine_id: int) -> Response:
-    machine, machine_not_found_msg = Machine.find_by_id(machine_id)
+    machine, machine_not_found_msg = Machine.find_by_id(machine_id, with_stock=True)
     if machine:
         return jsonify(machine)
 
@@ -118,8 +119,6 @@ def edit_machine(machine_id: int) -> Response:
                 new_stock=stock_information_list,
             )
 
-            db.session.commit()
-
             # Return log info
             return jsonify(changelog)
 
@@ -128,11 +127,21 @@ def edit_machine(machine_id: int) -> Response:
     return jsonify(Log().error(Machine.ERROR_NOT_FOUND, machine_not_found_msg))
 
 
+"""
+Optional query string:
+    limit=<int>, after=<cursor>, count=<bool>
+"""
+
+
 @bp.route("/all", methods=["GET"])
 def get_all_machines() -> Response:
-    machines = Machine.query.all()
-    if machines:
-        return jsonify(machines)
+    page_request, page_error = pagination.parse_request(request, Machine.machine_id)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = Machine.page(page_request)
+    if page.items or page_request.after is not None:
+        return page.apply(jsonify(page.items))
 
     return jsonify(
         Log().error(Machine.ERROR_NOT_FOUND, "There are no existing machines")
@@ -160,6 +169,32 @@ def buy_product_from_machine(machine_id: int, product_id: (int | str)) -> Respon
     return jsonify(Log().error(Machine.ERROR_NOT_FOUND, machine_not_found_msg))
 
 
+"""
+Buys several products at once, either all of them or none.
+Expects: Json{ 'payment': <float>, 'cart':[ {product_id:<int>, quantity:<int>}, ... ] }
+"""
+
+
+@bp.route("/<int:machine_id>/cart", methods=["POST"])
+def buy_cart_from_machine(machine_id: int) -> Response:
+    target_machine, machine_not_found_msg = Machine.find_by_id(machine_id)
+
+    if target_machine:
+
+        # Valid JSON body
+        if content := request.get_json():
+            payment: float = content.get("payment")
+            cart = MachineStock.process_raw(content.get("cart"))
+
+            purchase_log = target_machine.buy_products(cart=cart, payment=payment)
+
+            return jsonify(purchase_log)
+
+        return jsonify(common.JSON_ERROR)
+
+    return jsonify(Log().error(Machine.ERROR_NOT_FOUND, machine_not_found_msg))
+
+
 @bp.route("/<int:machine_id>/remove/<product_id>", methods=["POST"])
 def remove_product_from_machine(machine_id: int, product_id: str) -> Response:
     target_machine, machine_not_found_msg = Machine.find_by_id(machine_id)
@@ -167,9 +202,6 @@ def remove_product_from_machine(machine_id: int, product_id: str) -> Response:
 
         result = target_machine.remove_stock(product_id=product_id)
 
-        if result.object:
-            db.session.commit()
-
         return jsonify(
             Log().add_result(
                 "Machine",
@@ -188,23 +220,166 @@ def remove_machine(machine_id: int) -> Response:
 
     if target_machine:
         msg = target_machine.destroy()
-        db.session.commit()
         return jsonify(Log().add("Machine", f"Machine ID {machine_id}", msg))
 
     return jsonify(Log().error(Machine.ERROR_NOT_FOUND, machine_not_found_msg))
 
 
+"""
+Records are listed oldest first.
+Optional query string:
+    limit=<int>, after=<cursor>, count=<bool>,
+    from=<ISO 8601>, to=<ISO 8601> ( from inclusive, to exclusive ),
+    bucket=<minute|hour|day>
+
+With `bucket`, each bucket is summarised per product ( or per machine ) as:
+    { bucket, product_id/machine_id, last, min, max, net_change }
+
+With `Accept: application/x-ndjson` every record ( after the cursor, if given )
+is streamed instead, one per line, and `limit` and `count` are ignored.
+"""
+
+
 @bp.route("/product/<int:product_id>/records", methods=["GET"])
 def get_product_time_stamp_from_records(product_id: int) -> Response:
-    records = StockRecord.product_time_stamp_in_records(product_id)
-    if records:
-        return jsonify(records)
+    page_request, page_error = pagination.parse_request(request, PRODUCT_RECORDS_KEY)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    if time_range.bucket:
+        page = StockRecord.product_buckets(product_id, page_request, time_range)
+    elif streaming.accepts_ndjson(request):
+        rows = StockRecord.product_record_rows(
+            product_id, page_request.after, time_range
+        )
+        if response := streaming.ndjson_response(
+            rows, allow_empty=page_request.after is not None
+        ):
+            return response
+        return jsonify(Log().error(StockRecord.ERROR_NOT_FOUND, "Product not found"))
+    else:
+        page = StockRecord.product_records(product_id, page_request, time_range)
+
+    if page.items or page_request.after is not None:
+        return page.apply(jsonify(page.items))
     return jsonify(Log().error(StockRecord.ERROR_NOT_FOUND, "Product not found"))
 
 
 @bp.route("/<int:machine_id>/records", methods=["GET"])
 def get_machine_time_stamp_from_records(machine_id: int) -> Response:
-    records = StockRecord.machine_time_stamp_in_records(machine_id)
-    if records:
-        return jsonify(records)
+    page_request, page_error = pagination.parse_request(request, MACHINE_RECORDS_KEY)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    if time_range.bucket:
+        page = StockRecord.machine_buckets(machine_id, page_request, time_range)
+    elif streaming.accepts_ndjson(request):
+        rows = StockRecord.machine_record_rows(
+            machine_id, page_request.after, time_range
+        )
+        if response := streaming.ndjson_response(
+            rows, allow_empty=page_request.after is not None
+        ):
+            return response
+        return jsonify(Log().error(StockRecord.ERROR_NOT_FOUND, "Machine not found"))
+    else:
+        page = StockRecord.machine_records(machine_id, page_request, time_range)
+
+    if page.items or page_request.after is not None:
+        return page.apply(jsonify(page.items))
     return jsonify(Log().error(StockRecord.ERROR_NOT_FOUND, "Machine not found"))
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<minute|hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/<int:machine_id>/sales", methods=["GET"])
+def get_machine_sales(machine_id: int) -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    if not db.session.get(Machine, machine_id):
+        return jsonify(
+            Log().error(
+                Machine.ERROR_NOT_FOUND, f"No machine with id {machine_id} found."
+            )
+        )
+
+    if not time_range.bucket:
+        return jsonify(Sale.totals(Sale.machine_id, machine_id, time_range))
+
+    page_request, page_error = pagination.parse_request(request, Sale.sold_at)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = Sale.buckets(Sale.machine_id, machine_id, page_request, time_range)
+    return page.apply(jsonify(page.items))
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/<int:machine_id>/rollup", methods=["GET"])
+def get_machine_rollup(machine_id: int) -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    period, period_error = parse_period(time_range)
+    if period is None:
+        return jsonify(Log().error(time_series.ERROR, period_error))
+
+    page_request, page_error = pagination.parse_request(request, SaleRollup.bucket)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    if not db.session.get(Machine, machine_id):
+        return jsonify(
+            Log().error(
+                Machine.ERROR_NOT_FOUND, f"No machine with id {machine_id} found."
+            )
+        )
+
+    page = SaleRollup.buckets(
+        SaleRollup.machine_id, machine_id, period, page_request, time_range
+    )
+    return page.apply(jsonify(page.items))
+
+
+"""
+Optional query string:
+    from=<datetime>, to=<datetime>, bucket=<hour|day>, limit=<int>, after=<cursor>
+"""
+
+
+@bp.route("/rollup", methods=["GET"])
+def get_machines_rollup() -> Response:
+    time_range, time_range_error = time_series.parse_request(request)
+    if time_range is None:
+        return jsonify(Log().error(time_series.ERROR, time_range_error))
+
+    period, period_error = parse_period(time_range)
+    if period is None:
+        return jsonify(Log().error(time_series.ERROR, period_error))
+
+    page_request, page_error = pagination.parse_request(request, SaleRollup.machine_id)
+    if page_request is None:
+        return jsonify(Log().error(pagination.ERROR, page_error))
+
+    page = SaleRollup.ranking(SaleRollup.machine_id, period, page_request, time_range)
+    return page.apply(jsonify(page.items))
@@ -4,8 +4,12 @@ This contains all the configurations for the flask application.
 Note that you WILL need to have the docker container running.
 Execute run_docker.sh to set it up and have it running.
 Once you do, the URI below should work perfectly.
+
+Set DATABASE_URL to use another database, or use one of the SQLite profiles below
+to run without docker.
 """
 
+import os
 
 mysql_user = "root"
 mysql_password = "vendingpass"
@@ -20,10 +24,102 @@ Configuration details of the flask app
 class Config:
     """Config class for the flask application."""
 
-    SQLALCHEMY_DATABASE_URI = (
-        f"mysql://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}"
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        "DATABASE_URL",
+        f"mysql://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}",
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Applied to every SQLite connection
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "busy_timeout": 10000,  # Milliseconds
+        "temp_store": "MEMORY",
+        "cache_size": -65536,  # KiB
+    }
+
+    # Stock snapshots, "sync" writes each one inside the request,
+    # "buffered" queues them and writes them out in batches.
+    SNAPSHOT_MODE = "buffered"
+    SNAPSHOT_BUFFER_SIZE = 500
+    SNAPSHOT_FLUSH_INTERVAL = 1.0  # Seconds
+
+    # Sales ledger, written the same way as snapshots
+    SALE_MODE = "buffered"
+    SALE_BUFFER_SIZE = 500
+    SALE_FLUSH_INTERVAL = 1.0  # Seconds
+
+    # The product name index is rebuilt from the database once this old,
+    # picking up products written by other processes ( 0 = never )
+    PRODUCT_SEARCH_TTL = 60.0  # Seconds
+
+    # Purchases, "direct" commits each one on its own, "grouped" collects
+    # purchases of the same machine for up to PURCHASE_WINDOW seconds and
+    # commits them together, at most PURCHASE_MAX_BATCH at a time.
+    PURCHASE_MODE = "direct"
+    PURCHASE_WINDOW = 0.005  # Seconds
+    PURCHASE_MAX_BATCH = 100
+
+    # Inventory, "database" sells straight from the database, "memory" sells
+    # from counters held in-process, logging every sale to INVENTORY_WAL_DIR
+    # ( defaults to instance/inventory ) and writing them back to the database
+    # every INVENTORY_FLUSH_INTERVAL seconds. Only one process may serve
+    # purchases in "memory" mode.
+    INVENTORY_MODE = "database"
+    INVENTORY_WAL_DIR = None
+    INVENTORY_WAL_SYNC = False  # fsync every sale
+    INVENTORY_FLUSH_INTERVAL = 0.5  # Seconds
+
+    # Hourly and daily sales rollups are refreshed every ROLLUP_INTERVAL
+    # seconds, adding up sales older than ROLLUP_LAG seconds
+    ROLLUP_INTERVAL = 300.0  # Seconds ( 0 = never )
+    ROLLUP_LAG = 60.0  # Seconds
+
+    # Balances are credited onto one of BALANCE_SHARDS rows per machine,
+    # folded back into the machine row every BALANCE_COMPACT_INTERVAL seconds
+    BALANCE_SHARDS = 8
+    BALANCE_COMPACT_INTERVAL = 60.0  # Seconds ( 0 = never )
+
+    # Products cached in-process for read only lookups, entries older than
+    # the TTL are refetched, picking up products edited by other processes
+    PRODUCT_CATALOG_SIZE = 1024
+    PRODUCT_CATALOG_TTL = 300.0  # Seconds
+
+    # Rows fetched per round trip when streaming NDJSON responses
+    STREAM_BATCH_SIZE = 1000
+
+    # Schema migrations ( flask db upgrade ) wait at most MIGRATION_LOCK_TIMEOUT
+    # seconds for table locks, and backfill MIGRATION_BATCH_SIZE rows per
+    # transaction, pausing MIGRATION_BATCH_PAUSE seconds between batches
+    MIGRATION_LOCK_TIMEOUT = 5  # Seconds
+    MIGRATION_BATCH_SIZE = 1000
+    MIGRATION_BATCH_PAUSE = 0.0  # Seconds
+
+    # Queries, database time and commits of each request, reported in the
+    # Server-Timing header and logged to "app.sql"
+    SQL_INSTRUMENTATION = True
+
     # TODO: Remove me
     WTF_CSRF_ENABLED = False
+
+
+class SqliteConfig(Config):
+    """File backed SQLite, kept in the instance folder."""
+
+    SQLALCHEMY_DATABASE_URI = "sqlite:///vending.db"
+
+
+class SqliteMemoryConfig(Config):
+    """In-memory SQLite, gone with the process.
+
+    Every thread shares the one connection, so background writers are disabled
+    and everything is written within the request.
+    """
+
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SNAPSHOT_MODE = "sync"
+    SALE_MODE = "sync"
+    ROLLUP_INTERVAL = 0
+    BALANCE_COMPACT_INTERVAL = 0
@@ -1,7 +1,7 @@
 """
-Note: This will need to be executed everytime you.
+Note: This drops every table, and all data, and recreates them from the models.
 
-make any modifications to the database tables ( adding, editting tables, etc )
+To update the tables of an existing database, run `flask db upgrade` instead.
 """
 
 if __name__ == "__main__":  # pragma: no cover
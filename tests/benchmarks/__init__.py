@@ -0,0 +1,10 @@
+"""
+Endpoint benchmarks, driven through the Flask test client.
+
+    python -m tests.benchmarks --save baseline.json
+    python -m tests.benchmarks --compare baseline.json
+
+Seeds a synthetic fleet, then measures throughput and p50/p99 latency of the hot
+endpoints. With `--compare`, exits with status 1 if any endpoint regressed past
+`--threshold` against the baseline. See `python -m tests.benchmarks --help`.
+"""
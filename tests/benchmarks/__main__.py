@@ -0,0 +1,104 @@
+import argparse
+import sys
+import tempfile
+from dataclasses import asdict
+
+from sqlalchemy.engine import make_url
+
+from app import create_app, reset_db
+from config import Config
+from tests.benchmarks import runner
+from tests.benchmarks.fleet import FleetSize, seed
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None
+
+
+def parse_args() -> argparse.Namespace:
+    defaults = FleetSize()
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks", description=__doc__
+    )
+    parser.add_argument("--machines", type=int, default=defaults.machines)
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument(
+        "--stock",
+        type=int,
+        default=defaults.stock,
+        help="Products stocked per machine.",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument(
+        "--only", nargs="+", help="Scenarios to run, all of them by default."
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Database to run against, WIPED FIRST. A temporary SQLite file by default.",
+    )
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON.")
+    parser.add_argument(
+        "--compare",
+        metavar="PATH",
+        help="Fail if slower than the results saved at PATH.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown tolerated by --compare, 0.2 = 20%% ( the default ).",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+
+    url = args.database_url
+    if url is None:
+        url = f"sqlite:///{tempfile.mkdtemp(prefix='vending-bench-')}/bench.db"
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = url
+
+    app = create_app(config_class=BenchmarkConfig)
+    reset_db(app)
+
+    size = FleetSize(machines=args.machines, products=args.products, stock=args.stock)
+    fleet = seed(app, size)
+    results = runner.run(app, fleet, args.iterations, args.warmup, args.only)
+
+    print(f"{'scenario':<18}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(
+            f"{name:<18}{stats['throughput']:>10.0f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+
+    report = {
+        "database": make_url(url).get_backend_name(),
+        "fleet": asdict(size),
+        "iterations": args.iterations,
+        "results": results,
+    }
+    if args.save:
+        runner.save(args.save, report)
+
+    if args.compare:
+        baseline = runner.load(args.compare)
+        for key in ("database", "fleet"):
+            if baseline.get(key) != report[key]:
+                print(f"Warning: {key} differs from the baseline.", file=sys.stderr)
+
+        regressions = runner.compare(
+            baseline["results"], results, threshold=args.threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from flask import Flask
+
+from tests.fixtures.machine_tester import MachineTester
+from tests.fixtures.product_tester import ProductTester
+
+
+@dataclass
+class FleetSize:
+    machines: int = 50
+    products: int = 200
+    # Products stocked per machine
+    stock: int = 20
+    # Initial quantity of each stocked product
+    quantity: int = 1_000_000
+
+
+@dataclass
+class Fleet:
+    size: FleetSize
+    # ( machine_id, product_id ) of every stocked product
+    stocked: List[Tuple[int, int]]
+
+    @staticmethod
+    def product_name(index: int) -> str:
+        return f"product-{index:05d}"
+
+    @staticmethod
+    def machine_name(index: int) -> str:
+        return f"machine-{index:05d}"
+
+    def products_of(self, machine_id: int) -> List[int]:
+        return [p for m, p in self.stocked if m == machine_id]
+
+
+# Creates the fleet through the endpoints, as clients would. IDs are assumed to
+# start from 1, on an empty database.
+def seed(app: Flask, size: FleetSize) -> Fleet:
+    client = app.test_client()
+    product_tester = ProductTester(client=client)
+    machine_tester = MachineTester(client=client)
+
+    for index in range(size.products):
+        product_tester.create_product(
+            product_name=Fleet.product_name(index), product_price=1.0
+        )
+        assert product_tester.no_error(), product_tester.log
+
+    stocked = []
+    for index in range(size.machines):
+        machine_tester.create_machine(
+            location=f"site-{index % 10}", name=Fleet.machine_name(index)
+        )
+        assert machine_tester.no_error(), machine_tester.log
+
+        machine_id = index + 1
+        products = [
+            (index * size.stock + offset) % size.products + 1
+            for offset in range(min(size.stock, size.products))
+        ]
+        machine_tester.add_product_to_machine(
+            machine_id,
+            json={
+                "stock_list": [
+                    {"product_id": product_id, "quantity": size.quantity}
+                    for product_id in products
+                ]
+            },
+        )
+        assert machine_tester.no_error(), machine_tester.log
+        stocked += [(machine_id, product_id) for product_id in products]
+
+    return Fleet(size=size, stocked=stocked)
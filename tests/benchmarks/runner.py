@@ -0,0 +1,155 @@
+import json
+import math
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from flask import Flask
+from werkzeug.test import TestResponse
+
+from app.utils.log import Log
+from tests.benchmarks.fleet import Fleet
+
+# Sends the i-th request of a scenario
+Call = Callable[[int], TestResponse]
+
+# { metric: value } of one scenario
+Stats = Dict[str, float]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def _check(name: str, response: TestResponse) -> None:
+    if response.status_code >= 400:
+        raise AssertionError(f"{name}: HTTP {response.status_code}")
+
+    if response.is_json and isinstance(response.json, dict):
+        log = Log.make_from_response(response)
+        if log.has_error():
+            raise AssertionError(f"{name}: {response.json}")
+
+
+# Times `iterations` calls, after `warmup` untimed ones. Responses are checked
+# outside of the timings.
+def measure(name: str, call: Call, iterations: int, warmup: int) -> Stats:
+    for i in range(warmup):
+        _check(name, call(i))
+
+    latencies = []
+    responses = []
+    started = time.perf_counter()
+    for i in range(warmup, warmup + iterations):
+        before = time.perf_counter()
+        responses.append(call(i))
+        latencies.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - started
+
+    for response in responses:
+        _check(name, response)
+
+    return {
+        "iterations": iterations,
+        "throughput": iterations / elapsed,  # Requests per second
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+# Requests of every scenario, against random machines and products of the fleet
+def scenarios(app: Flask, fleet: Fleet, seed: int = 0) -> Dict[str, Call]:
+    client = app.test_client()
+    rng = random.Random(seed)
+    picks = [rng.choice(fleet.stocked) for _ in range(4096)]
+
+    def pick(i: int) -> tuple:
+        return picks[i % len(picks)]
+
+    def edit(i: int) -> TestResponse:
+        machine_id, _ = pick(i)
+        quantity = fleet.size.quantity - i % 2
+        stock_list = [
+            {"product_id": product_id, "quantity": quantity}
+            for product_id in fleet.products_of(machine_id)
+        ]
+        return client.post(
+            f"/machine/{machine_id}/edit", json={"stock_list": stock_list}
+        )
+
+    return {
+        "buy": lambda i: client.post(
+            "/machine/{}/buy/{}".format(*pick(i)), json={"payment": 5}
+        ),
+        "add": lambda i: client.post(
+            f"/machine/{pick(i)[0]}/add",
+            json={"stock_list": [{"product_id": pick(i)[1], "quantity": 1}]},
+        ),
+        "edit": edit,
+        "machine_all": lambda i: client.get(
+            "/machine/all", query_string={"limit": 100}
+        ),
+        "product_search": lambda i: client.get(
+            f"/product/search/{Fleet.product_name(pick(i)[1] - 1)}"
+        ),
+        "machine_records": lambda i: client.get(
+            f"/machine/{pick(i)[0]}/records", query_string={"limit": 100}
+        ),
+        "product_records": lambda i: client.get(
+            f"/machine/product/{pick(i)[1]}/records", query_string={"limit": 100}
+        ),
+    }
+
+
+def run(
+    app: Flask,
+    fleet: Fleet,
+    iterations: int,
+    warmup: int,
+    only: Optional[List[str]] = None,
+) -> Dict[str, Stats]:
+    calls = scenarios(app, fleet)
+    return {
+        name: measure(name, call, iterations, warmup)
+        for name, call in calls.items()
+        if not only or name in only
+    }
+
+
+# Lists scenarios slower than the baseline by more than `threshold` ( 0.2 = 20% ),
+# in p50 latency or in throughput. Scenarios missing from either side are skipped.
+def compare(
+    baseline: Dict[str, Stats], current: Dict[str, Stats], threshold: float
+) -> List[str]:
+    regressions = []
+    for name, stats in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+
+        slower = stats["p50_ms"] / before["p50_ms"] - 1
+        if slower > threshold:
+            regressions.append(
+                f"{name}: p50 {before['p50_ms']:.2f}ms -> {stats['p50_ms']:.2f}ms (+{slower:.0%})"
+            )
+
+        fewer = 1 - stats["throughput"] / before["throughput"]
+        if fewer > threshold:
+            regressions.append(
+                f"{name}: throughput {before['throughput']:.0f}/s -> {stats['throughput']:.0f}/s (-{fewer:.0%})"
+            )
+    return regressions
+
+
+def load(path: str) -> Dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save(path: str, report: Dict) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write("\n")
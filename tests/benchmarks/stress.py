@@ -0,0 +1,340 @@
+"""
+Concurrent purchase stress test, through a real WSGI server.
+
+    python -m tests.benchmarks.stress --clients 32 --processes 4
+
+Seeds a small fleet, serves the app with a threaded werkzeug server and fires
+purchases at it from `--clients` threads ( spread over `--processes` processes,
+0 = all in this one ), each buying random products of the fleet. Afterwards checks
+that every successful sale, and only those, was taken from stock and credited to
+its machine, and that no stock went negative. Exits with status 1 when an invariant
+is broken or a request failed with a server error.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from app import create_app, reset_db
+from app.extensions import db
+from app.models.product import Product
+from app.models.vending_machine import Machine
+from app.models.vending_machine_stock import MachineStock
+from config import Config
+from tests.benchmarks import runner
+from tests.benchmarks.fleet import Fleet, FleetSize, seed
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+Pick = Tuple[int, int]
+
+
+@dataclass
+class Outcome:
+    machine_id: int
+    product_id: int
+    status: int
+    # Message of the error in the log, None for a sale
+    error: str
+    latency: float
+
+    @property
+    def sold(self) -> bool:
+        return self.status == 200 and self.error is None
+
+
+@dataclass
+class State:
+    # { ( machine_id, product_id ): quantity }
+    quantities: Dict[Pick, int]
+    balances: Dict[int, Decimal]
+    prices: Dict[int, Decimal]
+
+
+def _error(body: bytes) -> str:
+    try:
+        records = json.loads(body)["logs"]["Error"]["records"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return "; ".join(message for messages in records.values() for message in messages)
+
+
+def _buy(host: str, port: int, picks: List[Pick], payment: float) -> List[Outcome]:
+    outcomes = []
+    for machine_id, product_id in picks:
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        before = time.perf_counter()
+        try:
+            connection.request(
+                "POST",
+                f"/machine/{machine_id}/buy/{product_id}",
+                body=json.dumps({"payment": payment}),
+                headers={"Content-Type": "application/json"},
+            )
+            response = connection.getresponse()
+            status, body = response.status, response.read()
+        except OSError as error:
+            status, body = 0, str(error).encode()
+        finally:
+            connection.close()
+
+        latency = time.perf_counter() - before
+        error = _error(body) if status == 200 else body.decode(errors="replace")
+        outcomes.append(Outcome(machine_id, product_id, status, error, latency))
+    return outcomes
+
+
+# Runs one client thread per list of picks, all starting at once
+def shoot(
+    host: str, port: int, clients: List[List[Pick]], payment: float
+) -> List[Outcome]:
+    start = threading.Barrier(len(clients))
+    results: List[List[Outcome]] = [[] for _ in clients]
+
+    def client(index: int) -> None:
+        start.wait()
+        results[index] = _buy(host, port, clients[index], payment)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [outcome for result in results for outcome in result]
+
+
+def state(app: Flask) -> State:
+    with app.app_context():
+        stock = db.session.execute(
+            db.select(
+                MachineStock.machine_id, MachineStock.product_id, MachineStock.quantity
+            )
+        ).all()
+        balances = db.session.execute(
+            db.select(Machine.machine_id, Machine.balance)
+        ).all()
+        prices = db.session.execute(
+            db.select(Product.product_id, Product.product_price)
+        ).all()
+
+    return State(
+        quantities={(m, p): quantity for m, p, quantity in stock},
+        balances=dict(balances),
+        prices=dict(prices),
+    )
+
+
+# Lists every broken invariant between the states before and after the run
+def check(before: State, after: State, outcomes: List[Outcome]) -> List[str]:
+    violations = []
+    sold = Counter((o.machine_id, o.product_id) for o in outcomes if o.sold)
+
+    for pick, quantity in after.quantities.items():
+        if quantity < 0:
+            violations.append(
+                f"Negative stock of product {pick[1]} in machine {pick[0]}: {quantity}"
+            )
+
+    for pick, initial in before.quantities.items():
+        expected = initial - sold[pick]
+        final = after.quantities.get(pick)
+        if final != expected:
+            violations.append(
+                f"Stock of product {pick[1]} in machine {pick[0]} is {final}, "
+                f"expected {expected} ( {initial} - {sold[pick]} sold )"
+            )
+
+    income: Dict[int, Decimal] = {}
+    for (machine_id, product_id), count in sold.items():
+        income[machine_id] = (
+            income.get(machine_id, Decimal(0)) + before.prices[product_id] * count
+        )
+
+    for machine_id, initial in before.balances.items():
+        expected = initial + income.get(machine_id, Decimal(0))
+        final = after.balances.get(machine_id)
+        if final != expected:
+            violations.append(
+                f"Balance of machine {machine_id} is {final}, expected {expected}"
+            )
+
+    failed = sum(1 for o in outcomes if o.status >= 500 or o.status == 0)
+    if failed:
+        violations.append(f"{failed} request(s) failed with a server error")
+
+    return violations
+
+
+def histogram(latencies: List[float]) -> Dict[str, int]:
+    counts = Counter()
+    for latency in latencies:
+        ms = latency * 1000
+        bound = next((b for b in HISTOGRAM_MS if ms < b), None)
+        counts[f"<{bound}ms" if bound else f">={HISTOGRAM_MS[-1]}ms"] += 1
+
+    labels = [f"<{b}ms" for b in HISTOGRAM_MS] + [f">={HISTOGRAM_MS[-1]}ms"]
+    return {label: counts[label] for label in labels if counts[label]}
+
+
+def summarize(outcomes: List[Outcome], elapsed: float) -> Dict:
+    latencies = [o.latency for o in outcomes]
+    return {
+        "requests": len(outcomes),
+        "sold": sum(1 for o in outcomes if o.sold),
+        "refused": dict(
+            Counter(o.error for o in outcomes if o.status == 200 and o.error)
+        ),
+        "server_errors": sum(1 for o in outcomes if o.status >= 500 or o.status == 0),
+        "throughput": len(outcomes) / elapsed,
+        "p50_ms": runner.percentile(latencies, 50) * 1000,
+        "p99_ms": runner.percentile(latencies, 99) * 1000,
+        "histogram": histogram(latencies),
+    }
+
+
+# Serves `app` and fires `requests` purchases from each of `clients` threads,
+# over `processes` processes ( 0 = this one ). Returns the summary and the
+# broken invariants.
+def stress(
+    app: Flask,
+    fleet: Fleet,
+    clients: int,
+    requests: int,
+    processes: int = 0,
+    payment: float = 5.0,
+    seed_: int = 0,
+) -> Tuple[Dict, List[str]]:
+    rng = random.Random(seed_)
+    picks = [
+        [rng.choice(fleet.stocked) for _ in range(requests)] for _ in range(clients)
+    ]
+
+    before = state(app)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    serving = threading.Thread(target=server.serve_forever, daemon=True)
+    serving.start()
+    host, port = "127.0.0.1", server.server_port
+
+    started = time.perf_counter()
+    try:
+        if processes:
+            with ProcessPoolExecutor(processes) as pool:
+                batches = [picks[i::processes] for i in range(processes)]
+                futures = [
+                    pool.submit(shoot, host, port, batch, payment)
+                    for batch in batches
+                    if batch
+                ]
+                outcomes = [
+                    outcome for future in futures for outcome in future.result()
+                ]
+        else:
+            outcomes = shoot(host, port, picks, payment)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    from app.models.inventory import inventory
+
+    # Sales held in memory are only counted once written back
+    with app.app_context():
+        if inventory.enabled:
+            inventory.flush()
+
+    return summarize(outcomes, elapsed), check(before, state(app), outcomes)
+
+
+class StressConfig(Config):
+    SQLALCHEMY_DATABASE_URI = None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks.stress", description=__doc__
+    )
+    parser.add_argument("--machines", type=int, default=4)
+    parser.add_argument("--products", type=int, default=8)
+    parser.add_argument(
+        "--stock", type=int, default=4, help="Products stocked per machine."
+    )
+    parser.add_argument(
+        "--quantity",
+        type=int,
+        default=100,
+        help="Initial quantity of each stocked product.",
+    )
+    parser.add_argument("--clients", type=int, default=16, help="Client threads.")
+    parser.add_argument(
+        "--processes", type=int, default=0, help="Processes to spread clients over."
+    )
+    parser.add_argument(
+        "--requests", type=int, default=50, help="Purchases per client."
+    )
+    parser.add_argument(
+        "--purchase-mode", choices=("direct", "grouped"), default="direct"
+    )
+    parser.add_argument(
+        "--inventory-mode", choices=("database", "memory"), default="database"
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Database to run against, WIPED FIRST. A temporary SQLite file by default.",
+    )
+    parser.add_argument("--save", metavar="PATH", help="Write the summary as JSON.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    directory = tempfile.mkdtemp(prefix="vending-stress-")
+    StressConfig.SQLALCHEMY_DATABASE_URI = (
+        args.database_url or f"sqlite:///{directory}/stress.db"
+    )
+    StressConfig.PURCHASE_MODE = args.purchase_mode
+    StressConfig.INVENTORY_MODE = args.inventory_mode
+    StressConfig.INVENTORY_WAL_DIR = directory
+
+    app = create_app(config_class=StressConfig)
+    reset_db(app)
+    size = FleetSize(
+        machines=args.machines,
+        products=args.products,
+        stock=args.stock,
+        quantity=args.quantity,
+    )
+    fleet = seed(app, size)
+
+    summary, violations = stress(
+        app, fleet, args.clients, args.requests, args.processes
+    )
+    summary["fleet"] = asdict(size)
+    summary["violations"] = violations
+
+    print(json.dumps(summary, indent=2, default=str))
+    if args.save:
+        runner.save(args.save, summary)
+
+    for violation in violations:
+        print(f"VIOLATION {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Isolation of tests sharing one database.
+
+The schema is created once per session. Most tests then run inside a transaction
+rolled back afterwards, every commit of the app releasing a savepoint instead. Tests
+which need their writes committed ( threads, other connections, counting commits,
+changing the schema ) run in `committed` mode, where every row is deleted afterwards.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, Set
+
+from flask import Flask
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Connection, create_engine, event
+from sqlalchemy.engine import make_url
+
+from app import migrations
+from app.extensions import db
+
+
+class BoundSession(Session):
+    # Flask-SQLAlchemy picks the engine of the app, ignoring `bind`
+    def get_bind(self, *args, **kwargs):  # noqa: ANN002, ANN003
+        if self.bind is not None:
+            return self.bind
+        return super().get_bind(*args, **kwargs)
+
+
+# Creates the database of the URI on the server unless it exists, for MySQL
+def create_database(uri: str) -> None:
+    url = make_url(uri)
+    if url.get_backend_name() != "mysql":
+        return
+
+    server = create_engine(url.set(database=""))
+    with server.begin() as connection:
+        connection.exec_driver_sql(f"CREATE DATABASE IF NOT EXISTS `{url.database}`")
+    server.dispose()
+
+
+# MySQL keeps counting IDs from rolled back inserts while tests expect IDs from 1.
+# Collects the tables with an AUTO_INCREMENT column `connection` inserts into, so
+# that only their counters are reset afterwards.
+def _track_inserts(connection: Connection) -> Set[str]:
+    tables: Set[str] = set()
+    if connection.dialect.name != "mysql":
+        return tables
+
+    def record(
+        conn, cursor, statement, parameters, context, executemany
+    ):  # noqa: ANN001
+        if context is None or not context.isinsert or context.compiled is None:
+            return
+        table = getattr(context.compiled.statement, "table", None)
+        if table is not None and table.autoincrement_column is not None:
+            tables.add(table.name)
+
+    event.listen(connection, "after_cursor_execute", record)
+    return tables
+
+
+# ALTER TABLE commits implicitly, only run once the test's transaction is over
+def _reset_ids(connection: Connection, tables: Set[str]) -> None:
+    for table in sorted(tables):
+        connection.exec_driver_sql(f"ALTER TABLE `{table}` AUTO_INCREMENT = 1")
+
+
+@contextmanager
+def rolled_back(app: Flask) -> Iterator[Flask]:
+    with app.app_context():
+        connection = db.engine.connect()
+    inserted = _track_inserts(connection)
+    transaction = connection.begin()
+
+    factory = db.session.session_factory
+    factory.class_ = BoundSession
+    factory.configure(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield app
+    finally:
+        factory.class_ = Session
+        factory.kw.pop("bind")
+        factory.kw.pop("join_transaction_mode")
+        transaction.rollback()
+        _reset_ids(connection, inserted)
+        connection.close()
+
+
+# Leaves every table empty, as created
+def clear_db(app: Flask) -> None:
+    from app.models.inventory import inventory
+
+    with app.app_context():
+        if inventory.enabled:
+            inventory.reset()
+
+        tables = [
+            table
+            for table in reversed(db.metadata.sorted_tables)
+            if table is not migrations.SchemaMigration.__table__
+        ]
+        with db.engine.begin() as connection:
+            if connection.dialect.name == "mysql":
+                connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")
+                for table in tables:
+                    connection.exec_driver_sql(f"TRUNCATE TABLE `{table.name}`")
+                connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+            else:
+                for table in tables:
+                    connection.execute(table.delete())
+
+
+@contextmanager
+def committed(app: Flask) -> Iterator[Flask]:
+    try:
+        yield app
+    finally:
+        clear_db(app)
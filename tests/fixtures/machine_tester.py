@@ -31,8 +31,8 @@ class MachineTester(Tester):
         return self.client.post(f"/machine/{machine_id}/edit", json=json)
 
     @save_response
-    def get_all_machines(self) -> TestResponse:
-        return self.client.get("/machine/all")
+    def get_all_machines(self, **params) -> TestResponse:  # noqa: ANN003
+        return self.client.get("/machine/all", query_string=params)
 
     @save_response
     def buy_product_from_machine(
@@ -40,6 +40,10 @@ class MachineTester(Tester):
     ):
         return self.client.post(f"/machine/{machine_id}/buy/{product_id}", json=json)
 
+    @save_response
+    def buy_cart_from_machine(self, machine_id: int, json: Dict[str, Any]):
+        return self.client.post(f"/machine/{machine_id}/cart", json=json)
+
     @save_response
     def remove_product_from_machine(self, machine_id: int, product_id: int):
         return self.client.post(f"/machine/{machine_id}/remove/{product_id}")
@@ -49,9 +53,19 @@ class MachineTester(Tester):
         return self.client.post(f"/machine/{machine_id}/destroy")
 
     @save_response
-    def get_product_time_stamp_from_records(self, product_id: int):
-        return self.client.get(f"/machine/product/{product_id}/records")
+    def get_product_time_stamp_from_records(
+        self, product_id: int, **params  # noqa: ANN003
+    ):
+        return self.client.get(
+            f"/machine/product/{product_id}/records", query_string=params
+        )
+
+    @save_response
+    def get_machine_sales(self, machine_id: int, **params):  # noqa: ANN003
+        return self.client.get(f"/machine/{machine_id}/sales", query_string=params)
 
     @save_response
-    def get_machine_time_stamp_from_records(self, machine_id: int):
-        return self.client.get(f"/machine/{machine_id}/records")
+    def get_machine_time_stamp_from_records(
+        self, machine_id: int, **params  # noqa: ANN003
+    ):
+        return self.client.get(f"/machine/{machine_id}/records", query_string=params)
@@ -42,9 +42,13 @@ class ProductTester(Tester):
         return self.client.post(f"/product/{product_id}/edit", json=json)
 
     @save_response
-    def get_all_machines(self):
-        return self.client.get("/product/all")
+    def get_all_machines(self, **params):  # noqa: ANN003
+        return self.client.get("/product/all", query_string=params)
 
     @save_response
-    def where_product(self, product_id: int):
-        return self.client.get(f"/product/{product_id}/where")
+    def get_product_sales(self, product_id: int, **params):  # noqa: ANN003
+        return self.client.get(f"/product/{product_id}/sales", query_string=params)
+
+    @save_response
+    def where_product(self, product_id: int, **params):  # noqa: ANN003
+        return self.client.get(f"/product/{product_id}/where", query_string=params)
@@ -0,0 +1,46 @@
+"""
+Statement counts in tests, all taken from the app's SQL instrumentation
+( app/utils/instrumentation.py ): `server_timing` reads them off a response,
+`measure` collects them for work done outside of a request.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from flask import Flask, g
+from werkzeug.test import TestResponse
+
+from app.utils.instrumentation import RequestStats
+
+
+# Counts the statements and commits sent while active, as for a request
+@contextmanager
+def measure(app: Flask) -> Iterator[RequestStats]:
+    with app.test_request_context():
+        g.sql_stats = stats = RequestStats()
+        yield stats
+
+
+# Metrics of the Server-Timing header of a response, { name: dur or desc }
+def server_timing(response: TestResponse) -> Dict[str, float]:
+    metrics = {}
+    for metric in response.headers.get("Server-Timing", "").split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if key in ("dur", "desc"):
+                metrics[name] = float(value.strip('"'))
+    return metrics
+
+
+# Fails unless the request behind `response` issued at most `limit` queries
+# and `savepoints` savepoint statements
+def assert_max_queries(response: TestResponse, limit: int, savepoints: int = 0) -> None:
+    timing = server_timing(response)
+    request = f"{response.request.method} {response.request.path}"
+    assert (
+        timing["queries"] <= limit
+    ), f"{request} issued {timing['queries']:.0f} queries, expected at most {limit}"
+    assert (
+        timing["savepoints"] <= savepoints
+    ), f"{request} issued {timing['savepoints']:.0f} savepoints, expected at most {savepoints}"
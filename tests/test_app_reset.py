@@ -1,8 +1,13 @@
-from app import reset_db
+import pytest
+
+from app import create_app, reset_db
 from app.extensions import db
 from app.models.vending_machine import Machine
+from tests.conftest import AppTestConfig
+from tests.fixtures.database import rolled_back
 
 
+@pytest.mark.committed
 def test_create_fresh_app(app):
     reset_db(app)
     with app.app_context():
@@ -26,3 +31,14 @@ def test_app_db_drop(app):
         number_of_machines = len(Machine.query.all())
 
         assert number_of_machines == 0
+
+
+def test_commits_are_rolled_back_after_the_test(schema):
+    app = create_app(config_class=AppTestConfig)
+    with rolled_back(app):
+        app.test_client().post("/machine/create/here/john")
+        with app.app_context():
+            assert Machine.query.count() == 1
+
+    with app.app_context():
+        assert Machine.query.count() == 0
@@ -0,0 +1,59 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import create_app, reset_db
+from app.extensions import db
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.vending_machine import Machine
+from app.models.vending_machine_stock import MachineStock
+from config import SqliteMemoryConfig
+
+
+class MemoryTestConfig(SqliteMemoryConfig):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+
+
+def test_money_and_times_round_trip(app):
+    with app.app_context():
+        db.session.add(Machine.make(location="here", name="john").object)
+        db.session.add(Product.make(name="Candy", price="0.10").object)
+        db.session.commit()
+        db.session.add(MachineStock.make(machine_id=1, product_id=1, quantity=9).object)
+        db.session.commit()
+
+    for _ in range(3):
+        app.test_client().post("/machine/1/buy/1", json={"payment": 0.1})
+
+    with app.app_context():
+        machine = db.session.get(Machine, 1)
+        assert machine.balance == Decimal("0.30")
+        assert db.session.get(Product, 1).product_price == Decimal("0.10")
+
+        sale = db.session.execute(db.select(Sale)).scalars().first()
+        assert sale.amount == Decimal("0.10")
+        assert isinstance(sale.sold_at, datetime)
+
+
+def test_sqlite_pragmas(app):
+    with app.app_context():
+        if db.engine.dialect.name != "sqlite":
+            pytest.skip("SQLite only")
+
+        with db.engine.connect() as connection:
+            pragma = connection.exec_driver_sql
+            assert pragma("PRAGMA journal_mode").scalar() == "wal"
+            assert pragma("PRAGMA foreign_keys").scalar() == 1
+            assert pragma("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+
+def test_in_memory_profile():
+    app = create_app(config_class=MemoryTestConfig)
+    reset_db(app)
+
+    client = app.test_client()
+    client.post("/machine/create/here/john")
+    assert client.get("/machine/1").json["machine_name"] == "john"
@@ -0,0 +1,39 @@
+from tests.benchmarks import runner
+from tests.benchmarks.fleet import FleetSize, seed
+
+
+def stats(p50_ms, throughput):
+    return {"p50_ms": p50_ms, "throughput": throughput}
+
+
+def test_every_scenario_runs(app):
+    fleet = seed(app, FleetSize(machines=3, products=5, stock=2, quantity=100))
+    assert len(fleet.stocked) == 6
+
+    results = runner.run(app, fleet, iterations=3, warmup=1)
+    assert set(results) == set(runner.scenarios(app, fleet))
+    for result in results.values():
+        assert result["iterations"] == 3
+        assert 0 < result["p50_ms"] <= result["p99_ms"]
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    baseline = {"buy": stats(2.0, 500), "edit": stats(4.0, 250)}
+    current = {
+        "buy": stats(2.3, 430),
+        "edit": stats(5.0, 190),
+        "new": stats(1.0, 1000),
+    }
+
+    assert runner.compare(baseline, current, threshold=0.2) == [
+        "edit: p50 4.00ms -> 5.00ms (+25%)",
+        "edit: throughput 250/s -> 190/s (-24%)",
+    ]
+    assert len(runner.compare(baseline, current, threshold=0.1)) == 4
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    assert runner.percentile(samples, 50) == 50
+    assert runner.percentile(samples, 99) == 99
+    assert runner.percentile([7.0], 99) == 7.0
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models.product import Product
+from app.models.vending_machine import Machine, purchase_scheduler
+from app.models.vending_machine_stock import MachineStock
+from app.utils.group_commit import GroupCommit
+from app.utils.log import Log
+from tests.conftest import AppTestConfig
+from tests.fixtures.database import committed
+
+
+class GroupedConfig(AppTestConfig):
+    PURCHASE_MODE = "grouped"
+    PURCHASE_WINDOW = 0.05
+    PURCHASE_MAX_BATCH = 100
+
+
+@pytest.fixture()
+def grouped_app(schema):
+    with committed(create_app(config_class=GroupedConfig)) as app:
+        yield app
+
+
+def run_concurrently(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_items_of_a_key_share_a_batch(grouped_app):
+    batches = []
+
+    def apply(key, items):
+        batches.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+
+    group = GroupCommit(name="test_group", config_prefix="PURCHASE", apply=apply)
+    group.init_app(grouped_app)
+
+    def submit(i):
+        with grouped_app.app_context():
+            return group.submit(i % 2, i)
+
+    results = run_concurrently(10, submit)
+
+    # Every caller gets the outcome of its own item
+    assert results == [f"{i % 2}:{i}" for i in range(10)]
+
+    # Fewer transactions than items, each batch holding a single key
+    assert len(batches) < 10
+    assert sorted(item for _, items in batches for item in items) == list(range(10))
+    for key, items in batches:
+        assert all(item % 2 == key for item in items)
+
+
+def test_failed_batch_reports_to_every_caller(grouped_app):
+    def apply(key, items):
+        raise ValueError("boom")
+
+    group = GroupCommit(name="test_group", config_prefix="PURCHASE", apply=apply)
+    group.init_app(grouped_app)
+
+    def submit(i):
+        with grouped_app.app_context():
+            try:
+                group.submit("key", i)
+            except ValueError as error:
+                return str(error)
+
+    assert run_concurrently(4, submit) == ["boom"] * 4
+
+
+def test_grouped_purchases(grouped_app):
+    with grouped_app.app_context():
+        db.session.add(Machine.make(location="some_place", name="john").object)
+        db.session.add(Product.make(name="Candy", price=10.0).object)
+        db.session.commit()
+        db.session.add(MachineStock.make(machine_id=1, product_id=1, quantity=5).object)
+        db.session.commit()
+
+    def buy(i):
+        client = grouped_app.test_client()
+        payment = 5 if i == 0 else 20
+        response = client.post("/machine/1/buy/1", json={"payment": payment})
+        return Log.make_from_response(response)
+
+    logs = run_concurrently(8, buy)
+
+    # Too little money, unless applied after the product sold out
+    assert logs[0].has_error(
+        Machine.ERROR_PURCHASE_FAIL, "Not enough money, costs 10.0 Baht, got 5.0 Baht."
+    ) or logs[0].has_error(Machine.ERROR_PURCHASE_FAIL, "Product is out of stock.")
+
+    bought = [log for log in logs[1:] if not log.has_error()]
+    sold_out = [log for log in logs[1:] if log.has_error()]
+    assert len(bought) == 5
+    assert all(log.has_entry("Transaction", "Change", "10.0") for log in bought)
+    assert all(
+        log.has_error(Machine.ERROR_PURCHASE_FAIL, "Product is out of stock.")
+        for log in sold_out
+    )
+
+    with grouped_app.app_context():
+        assert float(db.session.get(Machine, 1).balance) == 50.0
+        assert MachineStock.get(machine_id=1, product_id=1).quantity == 0
+
+        stats = purchase_scheduler.stats()
+        assert stats["items"] == 8
+        assert stats["batches"] < 8
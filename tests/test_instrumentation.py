@@ -0,0 +1,163 @@
+import json
+import logging
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+from app import create_app
+from app.extensions import db
+from app.utils.instrumentation import TRANSACTION_CONTROL, SQLInstrumentation
+from tests.benchmarks.fleet import FleetSize, seed
+from tests.conftest import AppTestConfig
+from tests.fixtures.database import rolled_back
+from tests.fixtures.query_counter import assert_max_queries, server_timing
+
+
+class UninstrumentedConfig(AppTestConfig):
+    SQL_INSTRUMENTATION = False
+
+
+# ( method, url, json ) and the most queries and savepoints it may issue, whatever
+# the size of the fleet, so that a query or a savepoint per machine or per product
+# fails. Rolled back tests run each request in a savepoint of their own, released
+# when the request commits, which is counted here too.
+QUERY_LIMITS = [
+    (("get", "/machine/all", None), 2, 1),
+    (("get", "/machine/1", None), 2, 1),
+    (("get", "/product/1/where", None), 1, 1),
+    (("get", "/product/all", None), 1, 1),
+    (("get", "/product/search/product-00001", None), 2, 1),
+    (("get", "/machine/1/records", None), 1, 1),
+    (("get", "/machine/product/1/records", None), 1, 1),
+    (("post", "/machine/1/buy/1", {"payment": 5}), 8, 2),
+    (
+        (
+            "post",
+            "/machine/1/cart",
+            {"payment": 50, "cart": [{"product_id": 1, "quantity": 1}]},
+        ),
+        7,
+        4,
+    ),
+    (
+        (
+            "post",
+            "/machine/1/edit",
+            {"stock_list": [{"product_id": 1, "quantity": 3}]},
+        ),
+        6,
+        2,
+    ),
+    (
+        (
+            "post",
+            "/machine/1/add",
+            {"stock_list": [{"product_id": 2, "quantity": 3}]},
+        ),
+        5,
+        2,
+    ),
+]
+
+
+@pytest.mark.parametrize("machines", [2, 8])
+@pytest.mark.parametrize("call, limit, savepoints", QUERY_LIMITS)
+def test_query_count_does_not_grow_with_the_fleet(
+    app, machines, call, limit, savepoints
+):
+    seed(app, FleetSize(machines=machines, products=8, stock=4, quantity=100))
+
+    method, url, body = call
+    response = getattr(app.test_client(), method)(url, json=body)
+    assert response.status_code == 200
+    assert_max_queries(response, limit, savepoints)
+
+
+def test_server_timing_matches_the_statements_sent(app):
+    seed(app, FleetSize(machines=3, products=3, stock=3))
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):  # noqa: ANN001, ANN002
+        if not statement.startswith(TRANSACTION_CONTROL):
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = app.test_client().get("/machine/all")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    timing = server_timing(response)
+    assert timing["queries"] == len(statements)
+    assert timing["commits"] == 0
+    assert 0 < timing["db"] <= timing["total"]
+
+
+@pytest.mark.committed
+def test_commits_are_counted(app):
+    response = app.test_client().post("/machine/create/here/john")
+    assert server_timing(response)["commits"] == 1
+
+    response = app.test_client().get("/machine/1")
+    assert server_timing(response)["commits"] == 0
+
+
+@pytest.mark.committed
+def test_creating_takes_no_savepoint(app):
+    client = app.test_client()
+    product = {"product_name": "Candy", "product_price": 10.0}
+
+    # Duplicates included
+    for _ in range(2):
+        response = client.post("/machine/create/here/john")
+        assert_max_queries(response, 1, savepoints=0)
+
+        response = client.post("/product/create", json=product)
+        assert_max_queries(response, 1, savepoints=0)
+
+    assert len(client.get("/machine/all").json) == 1
+    assert len(client.get("/product/all").json) == 1
+
+
+def test_each_request_is_logged(app, caplog):
+    with caplog.at_level(logging.INFO, logger="app.sql"):
+        app.test_client().post("/machine/create/here/john")
+
+    (record,) = [r for r in caplog.records if r.name == "app.sql"]
+    line = json.loads(record.getMessage())
+    assert line["method"] == "POST"
+    assert line["path"] == "/machine/create/here/john"
+    assert line["endpoint"] == "vending_machine.create"
+    assert line["status"] == 200
+    assert line["queries"] >= 1
+
+
+def test_failed_statements_are_counted(app):
+    with app.test_request_context():
+        app.preprocess_request()
+        with pytest.raises(DBAPIError):
+            db.session.execute(db.text("SELECT * FROM no_such_table"))
+
+        assert SQLInstrumentation.current().queries == 1
+        assert "sql_started" not in db.session.connection().info
+
+
+def test_disabled(schema):
+    with rolled_back(create_app(config_class=UninstrumentedConfig)) as app:
+        response = app.test_client().get("/machine/all")
+    assert "Server-Timing" not in response.headers
+
+
+def test_assert_max_queries(app):
+    response = app.test_client().get("/machine/all")
+    assert_max_queries(response, 1, savepoints=1)
+
+    with pytest.raises(AssertionError, match="GET /machine/all issued 1 queries"):
+        assert_max_queries(response, 0, savepoints=1)
+
+    with pytest.raises(AssertionError, match="GET /machine/all issued 1 savepoints"):
+        assert_max_queries(response, 1)
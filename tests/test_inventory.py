@@ -0,0 +1,197 @@
+import atexit
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models.inventory import InventoryCheckpoint, inventory
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.vending_machine import Machine
+from app.models.vending_machine_stock import MachineStock
+from app.utils.log import Log
+from app.utils.time_series import TimeRange
+from tests.conftest import AppTestConfig
+from tests.fixtures.database import committed
+
+
+class MemoryConfig(AppTestConfig):
+    INVENTORY_MODE = "memory"
+    # Flushed by hand in these tests
+    INVENTORY_FLUSH_INTERVAL = 60.0
+
+
+@pytest.fixture()
+def memory_app(tmp_path, monkeypatch, schema):
+    monkeypatch.setattr(MemoryConfig, "INVENTORY_WAL_DIR", str(tmp_path))
+    with committed(create_app(config_class=MemoryConfig)) as app:
+        with app.app_context():
+            db.session.add(Machine.make(location="some_place", name="john").object)
+            db.session.add(Product.make(name="Candy", price=10.0).object)
+            db.session.commit()
+            db.session.add(
+                MachineStock.make(machine_id=1, product_id=1, quantity=5).object
+            )
+            db.session.commit()
+
+        yield app
+
+
+def buy(app, payment=20):
+    response = app.test_client().post("/machine/1/buy/1", json={"payment": payment})
+    return Log.make_from_response(response)
+
+
+def stored(app):
+    with app.app_context():
+        return (
+            MachineStock.get(machine_id=1, product_id=1).quantity,
+            float(db.session.get(Machine, 1).balance),
+        )
+
+
+# Stops the engine of `app` without writing anything back
+def crash(app):
+    state = app.extensions.pop(inventory.name)
+    atexit.unregister(state.close)
+    state.worker.stop()
+    state.wal.close()
+
+
+def test_sales_are_written_back_on_flush(memory_app):
+    assert all(not buy(memory_app).has_error() for _ in range(3))
+
+    # Nothing reaches the database before the flusher runs, except the sales
+    assert stored(memory_app) == (5, 0.0)
+    with memory_app.app_context():
+        assert Sale.totals(Sale.machine_id, 1, TimeRange())["units"] == 3
+
+    with memory_app.app_context():
+        assert inventory.flush() == 1
+        assert db.session.get(InventoryCheckpoint, "memory").seq == 3
+
+    assert stored(memory_app) == (2, 30.0)
+
+
+def test_sales_are_refused_once_sold_out(memory_app):
+    logs = [buy(memory_app) for _ in range(7)]
+
+    assert sum(not log.has_error() for log in logs) == 5
+    assert logs[-1].has_error(Machine.ERROR_PURCHASE_FAIL, "Product is out of stock.")
+
+    with memory_app.app_context():
+        inventory.flush()
+    assert stored(memory_app) == (0, 50.0)
+
+
+def test_unflushed_sales_are_recovered_once(memory_app):
+    buy(memory_app)
+    with memory_app.app_context():
+        inventory.flush()
+    buy(memory_app)
+    buy(memory_app)
+    crash(memory_app)
+
+    # A new process picks up the log where the database left off
+    restarted = create_app(config_class=MemoryConfig)
+    assert not buy(restarted).has_error()
+    with restarted.app_context():
+        assert inventory.flush() == 1
+        assert inventory.flush() == 0
+        assert inventory.reconcile() == []
+
+    assert stored(restarted) == (1, 40.0)
+
+
+def test_restocking_reloads_the_machine(memory_app):
+    buy(memory_app)
+
+    response = memory_app.test_client().post(
+        "/machine/1/add", json={"stock_list": [{"product_id": 1, "quantity": 10}]}
+    )
+    assert not Log.make_from_response(response).has_error()
+
+    with memory_app.app_context():
+        inventory.flush()
+        assert inventory.reconcile() == []
+    assert stored(memory_app) == (14, 10.0)
+
+
+def test_reconcile_reports_drift(memory_app):
+    buy(memory_app)
+
+    # Changed behind the back of the engine
+    with memory_app.app_context():
+        db.session.execute(db.update(MachineStock).values(quantity=2))
+        db.session.commit()
+
+        assert inventory.reconcile(fix=True) == [
+            {"machine_id": 1, "product_id": 1, "memory": 4, "database": 1}
+        ]
+        assert inventory.reconcile() == []
+
+
+def test_destroyed_machines_are_forgotten(memory_app):
+    buy(memory_app)
+
+    response = memory_app.test_client().post("/machine/1/destroy")
+    assert not Log.make_from_response(response).has_error()
+
+    with memory_app.app_context():
+        assert inventory.flush() == 0
+        assert db.session.get(Machine, 1) is None
+
+
+def test_replayed_sales_of_destroyed_machines_are_skipped(memory_app):
+    buy(memory_app)
+    crash(memory_app)
+    memory_app.test_client().post("/machine/1/destroy")
+
+    restarted = create_app(config_class=MemoryConfig)
+    with restarted.app_context():
+        inventory.flush()
+        assert db.session.get(InventoryCheckpoint, "memory").seq == 1
+        assert inventory.flush() == 0
+
+
+def test_removing_stock_drops_unflushed_sales(memory_app):
+    buy(memory_app)
+    buy(memory_app)
+
+    response = memory_app.test_client().post("/machine/1/remove/1")
+    assert not Log.make_from_response(response).has_error()
+
+    with memory_app.app_context():
+        inventory.flush()
+    assert stored(memory_app) == (0, 20.0)
+
+
+@pytest.mark.parametrize("quantity", [3, 10])
+def test_editing_stock_drops_unflushed_sales(memory_app, quantity):
+    buy(memory_app)
+    buy(memory_app)
+
+    response = memory_app.test_client().post(
+        "/machine/1/edit",
+        json={"stock_list": [{"product_id": 1, "quantity": quantity}]},
+    )
+    assert not Log.make_from_response(response).has_error()
+
+    with memory_app.app_context():
+        inventory.flush()
+        assert inventory.reconcile() == []
+    assert stored(memory_app) == (quantity, 20.0)
+
+
+def test_reset_releases_the_old_engine(memory_app, monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(atexit, "unregister", unregistered.append)
+
+    buy(memory_app)
+    state = memory_app.extensions[inventory.name]
+    with memory_app.app_context():
+        inventory.reset()
+
+    assert unregistered == [state.close]
+    assert state.wal._file is None
+    assert memory_app.extensions[inventory.name] is not state
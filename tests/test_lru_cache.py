@@ -0,0 +1,44 @@
+from app.utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=0)
+    cache.put_many({1: "a", 2: "b"}, generation=0)
+
+    # Touch 1, so 2 is the one evicted
+    assert cache.get_many([1])[0] == {1: "a"}
+    cache.put_many({3: "c"}, generation=0)
+
+    found, _ = cache.get_many([1, 2, 3])
+    assert found == {1: "a", 3: "c"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    import app.utils.lru_cache as lru_cache
+
+    now = [100.0]
+    monkeypatch.setattr(lru_cache.time, "monotonic", lambda: now[0])
+
+    cache = LRUCache(max_size=10, ttl=5)
+    cache.put_many({1: "a"}, generation=0)
+    assert cache.get_many([1])[0] == {1: "a"}
+
+    now[0] += 6
+    assert cache.get_many([1])[0] == {}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_loads_racing_an_invalidation_are_not_cached():
+    cache = LRUCache(max_size=10, ttl=0)
+
+    _, generation = cache.get_many([1])
+    cache.invalidate([1])
+    cache.put_many({1: "stale"}, generation)
+    assert cache.get_many([1])[0] == {}
+
+    _, generation = cache.get_many([1])
+    cache.put_many({1: "fresh"}, generation)
+    assert cache.get_many([1])[0] == {1: "fresh"}
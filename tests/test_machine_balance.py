@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+import pytest
+
+from app.extensions import db
+from app.models.machine_balance import MachineBalance
+from app.models.vending_machine import Machine
+
+
+@pytest.fixture()
+def machine(app):
+    with app.app_context():
+        db.session.add(Machine.make(location="some_place", name="john").object)
+        db.session.commit()
+        yield db.session.get(Machine, 1)
+
+
+def shards():
+    return db.session.execute(
+        db.select(MachineBalance.shard, MachineBalance.amount)
+    ).all()
+
+
+def test_credits_are_spread_over_shards(app, machine):
+    for _ in range(50):
+        machine.credit(Decimal("1.5"))
+    db.session.commit()
+
+    assert 1 < len(shards()) <= app.config["BALANCE_SHARDS"]
+    assert sum(amount for _, amount in shards()) == Decimal("75")
+
+    # The machine row itself is left alone until compacted
+    assert machine.settled_balance == 0
+    assert machine.balance == Decimal("75")
+
+
+def test_compact_folds_shards_into_the_machine(app, machine):
+    for _ in range(10):
+        machine.credit(Decimal("2.25"))
+    db.session.commit()
+
+    count = len(shards())
+    assert MachineBalance.compact() == count
+    db.session.commit()
+    db.session.expire_all()
+
+    assert shards() == []
+    assert machine.settled_balance == Decimal("22.5")
+    assert machine.balance == Decimal("22.5")
+
+    # Credits after compaction add up with the folded balance
+    machine.credit(Decimal("1"))
+    db.session.commit()
+    assert MachineBalance.compact() == 1
+    db.session.commit()
+    assert app.test_client().get("/machine/1").json["balance"] == "23.50"
+
+
+def test_destroy_removes_shards(machine):
+    machine.credit(Decimal("5"))
+    machine.destroy()
+    db.session.commit()
+
+    assert shards() == []
@@ -5,6 +5,7 @@ import pytest
 from app.models.vending_machine import Machine
 from tests.fixtures.machine_tester import MachineTester
 from tests.fixtures.product_tester import ProductTester
+from tests.fixtures.query_counter import server_timing
 
 
 @pytest.fixture
@@ -107,6 +108,67 @@ def test_add_product_to_machine(machine_tester, product_tester):
     assert machine_tester.log_has_entry(broad="Product", specific="Product ID 1")
 
 
+def test_add_many_products_to_machine(machine_tester, product_tester):
+    for product_num in range(1, 4):
+        _ = product_tester.create_product(
+            product_name=f"product_{product_num}", product_price=100.00
+        )
+        assert product_tester.no_error()
+
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+    assert machine_tester.no_error()
+
+    _ = machine_tester.add_product_to_machine(
+        machine_id=1, json={"stock_list": [{"product_id": 1, "quantity": 5}]}
+    )
+    assert machine_tester.no_error()
+
+    _ = machine_tester.add_product_to_machine(
+        machine_id=1,
+        json={
+            "stock_list": [
+                {"product_id": 1, "quantity": 10},
+                {"product_id": 2, "quantity": 3},
+                {"product_id": 2, "quantity": 4},
+                {"product_id": 42, "quantity": 1},
+                {"product_id": 3, "quantity": 0},
+            ]
+        },
+    )
+    assert machine_tester.log_has_entry(
+        broad="Product", specific="Product ID 1", value="Updated stock: 5 -> 15"
+    )
+    assert machine_tester.log_has_entry(
+        broad="Product",
+        specific="Product ID 2",
+        value="Added product 2 to machine 1 successfully. (qt=3)",
+    )
+    assert machine_tester.log_has_entry(
+        broad="Product", specific="Product ID 2", value="Updated stock: 3 -> 7"
+    )
+    assert machine_tester.expect_error(
+        expected_error="Product ID 42", value="No product with ID 42 found."
+    )
+    assert machine_tester.expect_error(
+        expected_error="Product ID 3", value="Invalid quantity. (0 <= 0)"
+    )
+
+    _ = machine_tester.get_machine_by_id(1)
+    stock = {
+        entry["product_id"]: entry["quantity"]
+        for entry in machine_tester.prev_response.json["machine_products"]
+    }
+    assert stock == {1: 15, 2: 7}
+
+    # One snapshot per product, holding the final quantity
+    _ = machine_tester.get_machine_time_stamp_from_records(1)
+    records = {
+        record["product_id"]: record["quantity"]
+        for record in machine_tester.prev_response.json
+    }
+    assert records == {1: 15, 2: 7}
+
+
 @pytest.mark.parametrize(
     "mid, json, expected, value",
     [
@@ -219,6 +281,58 @@ def test_edit_machine(machine_tester, product_tester):
     assert len(machine_tester.prev_response.json.get("machine_products")) == 1
 
 
+def test_edit_machine_stock_writes_only_changes(app, machine_tester, product_tester):
+    from app.extensions import db
+    from app.models.vending_machine_record import StockRecord
+
+    for product_id in range(1, 5):
+        _ = product_tester.create_product(
+            product_name=f"product_{product_id}", product_price=1.0
+        )
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+    _ = machine_tester.add_product_to_machine(
+        machine_id=1,
+        json={
+            "stock_list": [
+                {"product_id": product_id, "quantity": 5} for product_id in range(1, 4)
+            ]
+        },
+    )
+    assert machine_tester.no_error()
+
+    with app.app_context():
+        db.session.execute(db.delete(StockRecord))
+        db.session.commit()
+
+    # 1 unchanged, 2 updated, 3 removed, 4 added
+    response = machine_tester.edit_machine(
+        machine_id=1,
+        json={
+            "stock_list": [
+                {"product_id": 1, "quantity": 5},
+                {"product_id": 2, "quantity": 7},
+                {"product_id": 4, "quantity": 2},
+            ]
+        },
+    )
+    assert machine_tester.no_error()
+
+    # The machine, the products and the current stock are read, then one
+    # DELETE, UPDATE and INSERT of stock and one INSERT of records written
+    assert server_timing(response)["queries"] == 3 + 4
+
+    with app.app_context():
+        records = db.session.execute(
+            db.select(StockRecord.product_id, StockRecord.quantity).order_by(
+                StockRecord.product_id
+            )
+        ).all()
+    assert records == [(2, 7), (3, 0), (4, 2)]
+
+    _, stock = machine_state(machine_tester)
+    assert stock == {1: 5, 2: 7, 4: 2}
+
+
 def test_edit_machine_error_not_found(machine_tester):
     # Machine not found
     _ = machine_tester.edit_machine(
@@ -320,6 +434,255 @@ def test_get_all_machines(machine_tester):
     assert machine_tester.no_error() and len(machine_tester.prev_response.json) == 5
 
 
+def test_get_all_machines_pages(machine_tester):
+    for i in range(5):
+        _ = machine_tester.create_machine(
+            location="some_location", name=f"some_name_{i}"
+        )
+
+    first = machine_tester.get_all_machines(limit=2)
+    assert [machine["machine_id"] for machine in first.json] == [1, 2]
+    assert "X-Total-Count" not in first.headers
+
+    second = machine_tester.get_all_machines(
+        limit=10, after=first.headers["X-Next-Cursor"], count=1
+    )
+    assert [machine["machine_id"] for machine in second.json] == [3, 4, 5]
+    assert second.headers["X-Total-Count"] == "5"
+    assert "X-Next-Cursor" not in second.headers
+
+    # Past the end is an empty page rather than an error
+    from app.utils.pagination import encode_cursor
+
+    last = machine_tester.get_all_machines(after=encode_cursor(5))
+    assert last.json == []
+
+
+# Two machines, each with records of two products at three time stamps
+def seed_records(app, machine_tester):
+    from datetime import datetime, timedelta
+
+    from app.extensions import db
+    from app.models.product import Product
+    from app.models.vending_machine_record import StockRecord
+
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+    _ = machine_tester.create_machine(location="some_location", name="other_name")
+
+    start = datetime(2022, 1, 1)
+    with app.app_context():
+        for product_name in ["a", "b"]:
+            db.session.add(Product(name=product_name, price=1.0))
+        db.session.flush()
+
+        # Two products snapshotted at each time stamp
+        for minute in range(3):
+            for machine_id in [1, 2]:
+                for product_id in [1, 2]:
+                    db.session.add(
+                        StockRecord(
+                            machine_id=machine_id,
+                            product_id=product_id,
+                            time_stamp=start + timedelta(minutes=minute),
+                            quantity=minute,
+                        )
+                    )
+        db.session.commit()
+
+
+def test_get_machine_records_pages(app, machine_tester):
+    seed_records(app, machine_tester)
+
+    def collect(get, **params):  # noqa: ANN001, ANN003, ANN202
+        pages = []
+        while True:
+            response = get(limit=4, **params)
+            pages.append(response.json)
+            if "X-Next-Cursor" not in response.headers:
+                return pages
+            params["after"] = response.headers["X-Next-Cursor"]
+
+    pages = collect(
+        lambda **params: machine_tester.get_machine_time_stamp_from_records(1, **params)
+    )
+    assert [len(page) for page in pages] == [4, 2]
+    assert [
+        (record["quantity"], record["product_id"]) for page in pages for record in page
+    ] == [(0, 1), (0, 2), (1, 1), (1, 2), (2, 1), (2, 2)]
+
+    pages = collect(
+        lambda **params: machine_tester.get_product_time_stamp_from_records(
+            2, **params
+        ),
+        count="yes",
+    )
+    assert [len(page) for page in pages] == [4, 2]
+    assert [
+        (record["quantity"], record["machine_id"]) for page in pages for record in page
+    ] == [(0, 1), (0, 2), (1, 1), (1, 2), (2, 1), (2, 2)]
+
+    # A cursor of another endpoint does not fit the key of this one
+    _ = machine_tester.get_machine_time_stamp_from_records(
+        1, after=machine_tester.get_all_machines(limit=1).headers["X-Next-Cursor"]
+    )
+    assert machine_tester.expect_error(expected_error="Pagination Error")
+
+
+def test_stream_machine_records(app, client, machine_tester):
+    import json
+
+    seed_records(app, machine_tester)
+    app.config["STREAM_BATCH_SIZE"] = 2
+    ndjson = {"Accept": "application/x-ndjson"}
+
+    for url in ["/machine/1/records", "/machine/product/2/records"]:
+        response = client.get(url, headers=ndjson)
+        assert response.mimetype == "application/x-ndjson"
+        assert response.is_streamed
+
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line) for line in lines] == client.get(url).json
+
+    # Resuming from a cursor
+    first = client.get("/machine/1/records?limit=4")
+    response = client.get(
+        "/machine/1/records",
+        query_string={"after": first.headers["X-Next-Cursor"]},
+        headers=ndjson,
+    )
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+    # Nothing to stream is reported as usual
+    _ = machine_tester.get_machine_time_stamp_from_records(3)
+    response = client.get("/machine/3/records", headers=ndjson)
+    assert response.json == machine_tester.prev_response.json
+
+
+def test_machine_records_time_range_and_buckets(app, client, machine_tester):
+    from datetime import datetime
+
+    from app.extensions import db
+    from app.models.product import Product
+    from app.models.vending_machine_record import StockRecord
+
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+
+    history = [
+        (1, "10:00", 10),
+        (1, "10:20", 7),
+        (2, "10:30", 3),
+        (1, "10:40", 9),
+        (1, "11:05", 4),
+        (1, "11:50", 6),
+    ]
+    with app.app_context():
+        for product_name in ["a", "b"]:
+            db.session.add(Product(name=product_name, price=1.0))
+        db.session.flush()
+
+        for product_id, time, quantity in history:
+            db.session.add(
+                StockRecord(
+                    machine_id=1,
+                    product_id=product_id,
+                    time_stamp=datetime.fromisoformat(f"2022-01-01 {time}"),
+                    quantity=quantity,
+                )
+            )
+        db.session.commit()
+
+    response = machine_tester.get_machine_time_stamp_from_records(
+        1, **{"from": "2022-01-01T10:30", "to": "2022-01-01T11:30"}
+    )
+    assert [(record["product_id"], record["quantity"]) for record in response.json] == [
+        (2, 3),
+        (1, 9),
+        (1, 4),
+    ]
+
+    def summary(bucket):  # noqa: ANN001, ANN202
+        return (
+            bucket["bucket"],
+            bucket["product_id"],
+            bucket["last"],
+            bucket["min"],
+            bucket["max"],
+            bucket["net_change"],
+        )
+
+    response = machine_tester.get_machine_time_stamp_from_records(1, bucket="hour")
+    assert machine_tester.no_error()
+    assert [summary(bucket) for bucket in response.json] == [
+        ("Sat, 01 Jan 2022 10:00:00 GMT", 1, 9, 7, 10, -1),
+        ("Sat, 01 Jan 2022 10:00:00 GMT", 2, 3, 3, 3, 0),
+        ("Sat, 01 Jan 2022 11:00:00 GMT", 1, 6, 4, 6, -3),
+    ]
+
+    # Buckets are paged like records
+    first = machine_tester.get_machine_time_stamp_from_records(
+        1, bucket="hour", limit=2
+    )
+    second = machine_tester.get_machine_time_stamp_from_records(
+        1, bucket="hour", limit=2, after=first.headers["X-Next-Cursor"]
+    )
+    assert [summary(bucket) for bucket in first.json + second.json] == [
+        summary(bucket) for bucket in response.json
+    ]
+
+    response = machine_tester.get_machine_time_stamp_from_records(
+        1, bucket="day", **{"from": "2022-01-01T10:30"}
+    )
+    assert [summary(bucket) for bucket in response.json] == [
+        ("Sat, 01 Jan 2022 00:00:00 GMT", 1, 6, 4, 9, -3),
+        ("Sat, 01 Jan 2022 00:00:00 GMT", 2, 3, 3, 3, 0),
+    ]
+
+    response = client.get(
+        "/machine/product/1/records?bucket=minute&to=2022-01-01T10:30"
+    )
+    assert [(bucket["machine_id"], bucket["last"]) for bucket in response.json] == [
+        (1, 10),
+        (1, 7),
+    ]
+
+
+@pytest.mark.parametrize(
+    "params, value",
+    [
+        (
+            {"from": "yesterday"},
+            "Invalid 'from'. (Expected an ISO 8601 date/time, got yesterday)",
+        ),
+        ({"from": "2022-01-02", "to": "2022-01-01"}, None),
+        ({"from": "2022-01-02T00:00+00:00", "to": "2022-01-01"}, None),
+        (
+            {"bucket": "week"},
+            "Invalid bucket. (Expected one of minute, hour, day, got week)",
+        ),
+    ],
+)
+def test_machine_records_bad_time_range(machine_tester, params, value):
+    _ = machine_tester.get_machine_time_stamp_from_records(1, **params)
+    assert machine_tester.expect_error(expected_error="Time Range Error", value=value)
+
+
+def test_time_range_with_mixed_offsets(app):
+    from datetime import datetime, timezone
+
+    from flask import request
+
+    from app.utils import time_series
+
+    query = {"from": "2022-01-01T00:00+00:00", "to": "2022-01-03"}
+    with app.test_request_context(query_string=query):
+        time_range, error = time_series.parse_request(request)
+
+    assert not error
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc).astimezone()
+    assert time_range.start == start.replace(tzinfo=None)
+    assert time_range.end == datetime(2022, 1, 3)
+
+
 def test_get_all_machines_error_missing(machine_tester):
     _ = machine_tester.get_all_machines()
     assert machine_tester.expect_error(
@@ -327,6 +690,47 @@ def test_get_all_machines_error_missing(machine_tester):
     )
 
 
+@pytest.mark.parametrize("machines_count", [1, 3, 8])
+def test_get_all_machines_query_count(
+    app, machine_tester, product_tester, machines_count: int
+):
+    for product_num in range(3):
+        _ = product_tester.create_product(
+            product_name=f"product_{product_num}", product_price=10.0
+        )
+
+    for machine_id in range(1, machines_count + 1):
+        _ = machine_tester.create_machine(
+            location="some_location", name=f"some_name_{machine_id}"
+        )
+        _ = machine_tester.add_product_to_machine(
+            machine_id=machine_id,
+            json={
+                "stock_list": [
+                    {"product_id": product_id, "quantity": 5}
+                    for product_id in range(1, 4)
+                ]
+            },
+        )
+        assert machine_tester.no_error()
+
+    # Machines, then their stock joined with products
+    response = machine_tester.get_all_machines()
+    assert server_timing(response)["queries"] == 2
+
+    assert len(response.json) == machines_count
+    for machine in response.json:
+        assert [stock["product_name"] for stock in machine["machine_products"]] == [
+            "product_0",
+            "product_1",
+            "product_2",
+        ]
+
+    response = machine_tester.get_machine_by_id(machine_id=1)
+    assert server_timing(response)["queries"] == 2
+    assert len(response.json["machine_products"]) == 3
+
+
 @pytest.mark.parametrize("payment", [100.00, 120.00, 1000])
 def test_buy_product_from_machine(machine_tester, product_tester, payment: int):
     _ = product_tester.create_product(product_name="product_1", product_price=100.00)
@@ -356,6 +760,37 @@ def test_buy_product_from_machine(machine_tester, product_tester, payment: int):
     )
 
 
+def test_buy_product_updates_stock_and_balance(machine_tester, product_tester):
+    _ = product_tester.create_product(product_name="product_1", product_price=12.50)
+    assert product_tester.no_error()
+
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+    assert machine_tester.no_error()
+
+    _ = machine_tester.add_product_to_machine(
+        machine_id=1, json={"stock_list": [{"product_id": 1, "quantity": 3}]}
+    )
+    assert machine_tester.no_error()
+
+    for _ in range(3):
+        _ = machine_tester.buy_product_from_machine(
+            machine_id=1, product_id=1, json={"payment": 20}
+        )
+        assert machine_tester.no_error()
+
+    _ = machine_tester.buy_product_from_machine(
+        machine_id=1, product_id=1, json={"payment": 20}
+    )
+    assert machine_tester.expect_error(
+        expected_error=Machine.ERROR_PURCHASE_FAIL, value="Product is out of stock."
+    )
+
+    _ = machine_tester.get_machine_by_id(1)
+    machine = machine_tester.prev_response.json
+    assert float(machine["balance"]) == 37.5
+    assert machine["machine_products"][0]["quantity"] == 0
+
+
 @pytest.mark.parametrize(
     "mid, pid, payment_json, expected_error, value",
     [
@@ -571,3 +1006,251 @@ def test_get_machine_time_stamp_from_records_error(machine_tester):
     assert machine_tester.expect_error(
         expected_error=StockRecord.ERROR_NOT_FOUND, value="Machine not found"
     )
+
+
+def stock_cart_machine(machine_tester, product_tester):
+    for product_name, price in [("product_1", 12.50), ("product_2", 5.0)]:
+        _ = product_tester.create_product(
+            product_name=product_name, product_price=price
+        )
+    _ = product_tester.create_product(product_name="product_3", product_price=1.0)
+
+    _ = machine_tester.create_machine(location="some_location", name="some_name")
+    _ = machine_tester.add_product_to_machine(
+        machine_id=1,
+        json={
+            "stock_list": [
+                {"product_id": 1, "quantity": 3},
+                {"product_id": 2, "quantity": 5},
+            ]
+        },
+    )
+    assert machine_tester.no_error()
+
+
+def machine_state(machine_tester):
+    machine = machine_tester.get_machine_by_id(1).json
+    return float(machine["balance"]), {
+        stock["product_id"]: stock["quantity"] for stock in machine["machine_products"]
+    }
+
+
+def test_buy_cart(app, machine_tester, product_tester):
+    from app.models.vending_machine_record import StockRecord
+
+    stock_cart_machine(machine_tester, product_tester)
+
+    _ = machine_tester.buy_cart_from_machine(
+        machine_id=1,
+        json={
+            "payment": 50,
+            "cart": [
+                {"product_id": 1, "quantity": 2},
+                {"product_id": 2, "quantity": 1},
+                {"product_id": 2, "quantity": 2},
+            ],
+        },
+    )
+    assert machine_tester.no_error()
+    assert machine_tester.log_has_entry(
+        broad="Cart", specific="Product ID 1", value="Bought 2 for 25.0 Baht."
+    )
+    assert machine_tester.log_has_entry(
+        broad="Cart", specific="Product ID 2", value="Bought 3 for 15.0 Baht."
+    )
+    assert machine_tester.log_has_entry(
+        broad="Transaction", specific="Change", value="10.0"
+    )
+
+    assert machine_state(machine_tester) == (40.0, {1: 1, 2: 2})
+
+    with app.app_context():
+        records = StockRecord.machine_time_stamp_in_records(machine_id=1)
+        latest = {}
+        for record in sorted(records, key=lambda record: record.time_stamp):
+            latest[record.product_id] = record.quantity
+        assert latest == {1: 1, 2: 2}
+
+
+@pytest.mark.parametrize(
+    "json, expected_error, value",
+    [
+        (
+            {"payment": 100, "cart": []},
+            Machine.ERROR_PURCHASE_FAIL,
+            "The cart is empty.",
+        ),
+        ({"payment": 100}, Machine.ERROR_PURCHASE_FAIL, "The cart is empty."),
+        (
+            {"payment": 100, "cart": [{"product_id": 1, "quantity": 4}]},
+            "Product ID 1",
+            "Not enough stock. (wanted 4, 3 left)",
+        ),
+        (
+            {
+                "payment": 100,
+                "cart": [
+                    {"product_id": 1, "quantity": 1},
+                    {"product_id": 3, "quantity": 1},
+                ],
+            },
+            "Product ID 3",
+            "Product is not in stock.",
+        ),
+        (
+            {"payment": 100, "cart": [{"product_id": 2, "quantity": 0}]},
+            "Product ID 2",
+            "Invalid quantity. (0 <= 0)",
+        ),
+        (
+            {
+                "payment": 29.5,
+                "cart": [
+                    {"product_id": 1, "quantity": 2},
+                    {"product_id": 2, "quantity": 1},
+                ],
+            },
+            Machine.ERROR_PURCHASE_FAIL,
+            "Not enough money, costs 30.0 Baht, got 29.5 Baht.",
+        ),
+    ],
+)
+def test_buy_cart_fail(machine_tester, product_tester, json, expected_error, value):
+    stock_cart_machine(machine_tester, product_tester)
+
+    _ = machine_tester.buy_cart_from_machine(machine_id=1, json=json)
+    assert machine_tester.expect_error(expected_error=expected_error, value=value)
+
+    # Nothing was bought
+    assert machine_state(machine_tester) == (0.0, {1: 3, 2: 5})
+
+
+def test_take_many_is_all_or_nothing(app, machine_tester, product_tester):
+    from app.extensions import db
+    from app.models.vending_machine_stock import MachineStock
+
+    stock_cart_machine(machine_tester, product_tester)
+
+    with app.app_context():
+        assert not MachineStock.take_many(machine_id=1, amounts={1: 1, 2: 6})
+        db.session.rollback()
+        assert MachineStock.take_many(machine_id=1, amounts={1: 3, 2: 5})
+        db.session.commit()
+
+    assert machine_state(machine_tester) == (0.0, {1: 0, 2: 0})
+
+
+def test_failed_cart_keeps_the_rest_of_the_transaction(
+    app, machine_tester, product_tester
+):
+    from app.extensions import db
+
+    stock_cart_machine(machine_tester, product_tester)
+
+    with app.app_context():
+        machine = db.session.get(Machine, 1)
+        machine.machine_name = "renamed"
+        db.session.flush()
+
+        assert not machine._take_all({1: 1, 2: 6})
+        db.session.commit()
+
+    assert (
+        machine_tester.get_machine_by_id(machine_id=1).json["machine_name"] == "renamed"
+    )
+    assert machine_state(machine_tester) == (0.0, {1: 3, 2: 5})
+
+
+def test_sales_ledger(app, machine_tester, product_tester):
+    from app.extensions import db
+    from app.models.sale import Sale
+
+    stock_cart_machine(machine_tester, product_tester)
+
+    _ = machine_tester.buy_product_from_machine(
+        machine_id=1, product_id=2, json={"payment": 20}
+    )
+    _ = machine_tester.buy_cart_from_machine(
+        machine_id=1,
+        json={
+            "payment": 50,
+            "cart": [
+                {"product_id": 1, "quantity": 2},
+                {"product_id": 2, "quantity": 1},
+            ],
+        },
+    )
+    assert machine_tester.no_error()
+
+    with app.app_context():
+        sales = db.session.execute(db.select(Sale).order_by(Sale.sale_id)).scalars()
+        assert [
+            (sale.product_id, sale.quantity, float(sale.amount), float(sale.change))
+            for sale in sales
+        ] == [(2, 1, 5.0, 15.0), (1, 2, 25.0, 20.0), (2, 1, 5.0, 20.0)]
+
+    response = machine_tester.get_machine_sales(1)
+    assert response.json == {
+        "machine_id": 1,
+        "sales": 3,
+        "units": 4,
+        "revenue": "35.00",
+    }
+
+    response = product_tester.get_product_sales(2)
+    assert response.json == {
+        "product_id": 2,
+        "sales": 2,
+        "units": 2,
+        "revenue": "10.00",
+    }
+
+    # Nothing sold in the future
+    response = machine_tester.get_machine_sales(1, **{"from": "2999-01-01"})
+    assert response.json["units"] == 0
+
+    response = machine_tester.get_machine_sales(1, bucket="day")
+    assert len(response.json) == 1
+    assert response.json[0]["units"] == 4
+    assert response.json[0]["revenue"] == "35.00"
+
+
+def test_sales_not_found(machine_tester, product_tester):
+    _ = machine_tester.get_machine_sales(1)
+    assert machine_tester.expect_error(
+        expected_error=Machine.ERROR_NOT_FOUND, value="No machine with id 1 found."
+    )
+
+    _ = product_tester.get_product_sales(1)
+    assert product_tester.expect_error(
+        expected_error="Product Not Found", value="Product not found. (Product ID: 1)"
+    )
+
+
+@pytest.mark.committed
+def test_mutating_endpoints_commit_once(app, machine_tester, product_tester):
+    def commits(call, *args, **kwargs):  # noqa: ANN002, ANN003
+        return server_timing(call(*args, **kwargs))["commits"]
+
+    stock_list = {"stock_list": [{"product_id": 1, "quantity": 5}]}
+
+    assert (
+        commits(product_tester.create_product, product_name="a", product_price=10.0)
+        == 1
+    )
+    assert commits(machine_tester.create_machine, location="here", name="m") == 1
+    assert commits(machine_tester.add_product_to_machine, 1, json=stock_list) == 1
+    assert commits(machine_tester.edit_machine, 1, json=stock_list) == 1
+    assert commits(machine_tester.buy_product_from_machine, 1, 1, {"payment": 20}) == 1
+    assert (
+        commits(
+            machine_tester.buy_cart_from_machine,
+            1,
+            json={"payment": 20, "cart": [{"product_id": 1, "quantity": 1}]},
+        )
+        == 1
+    )
+    assert commits(product_tester.edit_product, 1, new_price=12.0) == 1
+    assert commits(machine_tester.remove_product_from_machine, 1, 1) == 1
+    assert commits(machine_tester.remove_machine, 1) == 1
+    assert machine_tester.no_error() and product_tester.no_error()
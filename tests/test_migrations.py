@@ -0,0 +1,138 @@
+import pytest
+
+from app import migrations, reset_db
+from app.extensions import db
+from app.migrations.operations import Operations
+from app.migrations.versions.v0001_baseline import machine
+from app.models.vending_machine import Machine
+from tests.fixtures.query_counter import measure
+
+# Changes the schema, which can't be rolled back on MySQL
+pytestmark = pytest.mark.committed
+
+
+@pytest.fixture()
+def empty_app(app):
+    with app.app_context():
+        db.drop_all()
+    yield app
+    reset_db(app)
+
+
+def upgrade(app, *revision):  # noqa: ANN002
+    return app.test_cli_runner().invoke(args=["db", "upgrade", *revision])
+
+
+def add_machines(app, *machines):  # noqa: ANN002
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                db.insert(machine),
+                [
+                    {"location": location, "machine_name": name, "balance": 0}
+                    for location, name in machines
+                ],
+            )
+
+
+def test_upgrade_creates_the_schema_of_the_models(empty_app):
+    result = upgrade(empty_app)
+    assert result.exit_code == 0
+    assert "Applied 0001." in result.output
+    assert f"At revision {migrations.head()}." in result.output
+
+    with empty_app.app_context():
+        inspector = db.inspect(db.engine)
+        assert set(db.metadata.tables) <= set(inspector.get_table_names())
+
+        ops = Operations()
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                assert ops.has_index(table.name, index.name)
+        assert ops.has_index("machine", "uq_machine_location_name")
+
+    # Nothing left to do
+    result = upgrade(empty_app)
+    assert result.exit_code == 0
+    assert "Applied" not in result.output
+
+
+def test_upgrade_keeps_existing_data(empty_app):
+    assert upgrade(empty_app, "0001").exit_code == 0
+    add_machines(empty_app, ("here", "john"), ("here", "jane"), ("there", "john"))
+
+    assert upgrade(empty_app).exit_code == 0
+
+    with empty_app.app_context():
+        assert Machine.query.count() == 3
+        machine, message = Machine.make(location="here", name="john")
+        assert machine is None
+        assert "already exists" in message
+
+
+def test_duplicates_stop_the_upgrade_until_resolved(empty_app):
+    assert upgrade(empty_app, "0001").exit_code == 0
+    add_machines(empty_app, ("here", "john"), ("here", "john"))
+
+    result = upgrade(empty_app)
+    assert result.exit_code == 1
+    assert "Duplicate values of (location, machine_name) in machine" in result.output
+
+    with empty_app.app_context():
+        assert migrations.current() == "0001"
+        with db.engine.begin() as connection:
+            connection.execute(db.delete(machine).where(machine.c.machine_id == 2))
+
+    # Steps completed by the failed run are skipped
+    assert upgrade(empty_app).exit_code == 0
+    with empty_app.app_context():
+        assert migrations.current() == migrations.head()
+
+
+def test_reset_databases_are_up_to_date(app):
+    with app.app_context():
+        assert migrations.current() == migrations.head()
+        assert migrations.pending() == []
+
+    result = app.test_cli_runner().invoke(args=["db", "history"])
+    assert "[x] 0001" in result.output
+
+
+def test_stamp(empty_app):
+    result = empty_app.test_cli_runner().invoke(args=["db", "stamp", "0001"])
+    assert result.exit_code == 0
+    assert "At revision 0001." in result.output
+
+    result = empty_app.test_cli_runner().invoke(args=["db", "stamp", "nope"])
+    assert result.exit_code == 1
+    assert "Unknown revision. (nope)" in result.output
+
+
+def test_backfill_in_batches(empty_app):
+    assert upgrade(empty_app, "0001").exit_code == 0
+    add_machines(empty_app, *[("here", f"m{i}") for i in range(5)], ("there", "m"))
+
+    with empty_app.app_context():
+        ops = Operations()
+        ops.add_column("machine", db.Column("label", db.String(40), nullable=True))
+        ops.add_column("machine", db.Column("label", db.String(40), nullable=True))
+
+        table = ops.table("machine")
+        with measure(empty_app) as stats:
+            updated = ops.backfill(
+                table,
+                {"label": table.c.location + "/" + table.c.machine_name},
+                where=table.c.location == "here",
+                batch_size=2,
+            )
+        assert updated == 5
+        # A transaction per batch finding its keys and updating them,
+        # and one finding nothing left
+        assert stats.commits == 4
+        assert stats.queries == 3 * 2 + 1
+
+        with ops.begin() as connection:
+            labels = connection.scalars(
+                db.select(table.c.label).order_by(table.c.machine_id)
+            ).all()
+        assert labels == [f"here/m{i}" for i in range(5)] + [None]
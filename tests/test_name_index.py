@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from app.utils.name_index import EXACT, PREFIX, SUBSTRING, NameSearch, NgramIndex
+
+
+@pytest.fixture
+def index():
+    index = NgramIndex()
+    for key, name in enumerate(
+        ["Cola", "Coca Cola", "Cola Zero", "Chocolate", "Candy", "Pepsi"], start=1
+    ):
+        index.add(key, name)
+    return index
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("cola", [(EXACT, 1), (PREFIX, 3), (SUBSTRING, 4), (SUBSTRING, 2)]),
+        ("COLA Z", [(PREFIX, 3)]),
+        ("c", [(PREFIX, 5), (PREFIX, 4), (PREFIX, 2), (PREFIX, 1), (PREFIX, 3)]),
+        ("psi", [(SUBSTRING, 6)]),
+        ("chocolates", []),
+        ("", []),
+    ],
+)
+def test_search(index, query, expected):
+    assert index.search(query) == expected
+
+
+def test_search_limit(index):
+    assert index.search("co", limit=2) == [(PREFIX, 2), (PREFIX, 1)]
+
+
+def test_remove_and_rename(index):
+    index.remove(1)
+    assert index.search("cola") == [(PREFIX, 3), (SUBSTRING, 4), (SUBSTRING, 2)]
+
+    index.add(3, "Sprite")
+    assert index.search("cola") == [(SUBSTRING, 4), (SUBSTRING, 2)]
+    assert index.search("zero") == []
+    assert len(index) == 5
+
+
+def test_rebuild_does_not_block_searches():
+    names = {1: "Cola"}
+    loading = threading.Event()
+    resume = threading.Event()
+
+    def load():
+        if names.get(2):
+            loading.set()
+            assert resume.wait(timeout=5)
+        return list(names.items())
+
+    app = Flask(__name__)
+    app.config["TEST_SEARCH_TTL"] = 60.0
+    search = NameSearch(name="test_search", config_prefix="TEST_SEARCH", load=load)
+    search.init_app(app)
+
+    with app.app_context():
+        assert search.search("cola") == [(EXACT, 1)]
+        names[2] = "Pepsi"
+        app.extensions[search.name].built_at = 0.0
+
+    def rebuild():
+        with app.app_context():
+            search.search("pepsi")
+
+    thread = threading.Thread(target=rebuild)
+    thread.start()
+    assert loading.wait(timeout=5)
+
+    # The old index answers meanwhile, changes reach both
+    with app.app_context():
+        assert search.search("pepsi") == []
+        search.apply({3: "Coca Cola"}, [1])
+        assert search.search("cola") == [(SUBSTRING, 3)]
+
+    resume.set()
+    thread.join(timeout=5)
+
+    with app.app_context():
+        assert search.search("pepsi") == [(EXACT, 2)]
+        assert search.search("cola") == [(SUBSTRING, 3)]
@@ -2,6 +2,8 @@ import pytest
 
 from app.extensions import db
 from app.models.product import Product
+from app.utils.log import Log
+from app.utils.pagination import encode_cursor
 from tests.fixtures.machine_tester import MachineTester
 from tests.fixtures.product_tester import ProductTester
 
@@ -116,9 +118,44 @@ def test_search_product_2(product_tester):
     assert len(search_response.json) == 3
 
 
+def test_search_product_ranking(product_tester):
+    for product_name in ["Cola Zero", "Coca Cola", "Cola", "Candy"]:
+        _ = product_tester.create_product(product_name=product_name, product_price=10.0)
+        assert product_tester.no_error()
+
+    response = product_tester.search_product(product_name="cola")
+    assert [product["product_name"] for product in response.json] == [
+        "Cola",
+        "Cola Zero",
+        "Coca Cola",
+    ]
+
+    response = product_tester.client.get("/product/search/cola?limit=1")
+    assert [product["product_name"] for product in response.json] == ["Cola"]
+
+    for limit in [0, -1]:
+        response = product_tester.client.get(f"/product/search/cola?limit={limit}")
+        assert Log.make_from_response(response).has_error(
+            "Pagination Error", f"Invalid limit. ({limit} <= 0)"
+        )
+
+    # Renames are picked up by the index once committed
+    _ = product_tester.edit_product(product_id=3, new_name="Sprite")
+    assert product_tester.no_error()
+
+    response = product_tester.search_product(product_name="cola")
+    assert [product["product_name"] for product in response.json] == [
+        "Cola Zero",
+        "Coca Cola",
+    ]
+
+    response = product_tester.search_product(product_name="spr")
+    assert [product["product_id"] for product in response.json] == [3]
+
+
 @pytest.mark.parametrize(
     "product_name",
-    ["product", "John", "Atlantis"],
+    ["product", "John", "Atlantis", "1.5", "-2"],
 )
 def test_search_product_not_found(product_tester, product_name: str):
     _ = product_tester.search_product(product_name=product_name)
@@ -248,6 +285,32 @@ def test_edit_product_fail_2(product_tester, client):
     )
 
 
+def test_get_product_cached(app, product_tester):
+    from tests.fixtures.query_counter import server_timing
+
+    _ = product_tester.create_product(product_name="Cola", product_price=10.0)
+
+    _ = product_tester.get(product_id=1)
+    response = product_tester.get(product_id=1)
+    assert server_timing(response)["queries"] == 0
+    assert response.json == {
+        "product_id": 1,
+        "product_name": "Cola",
+        "product_price": "10.00",
+    }
+
+    # Committed edits invalidate the cached copy
+    _ = product_tester.edit_product(product_id=1, new_name="Pepsi", new_price=12.5)
+    assert product_tester.no_error()
+    response = product_tester.get(product_id=1)
+    assert response.json["product_name"] == "Pepsi"
+    assert response.json["product_price"] == "12.50"
+
+    stats = product_tester.client.get("/product/cache").json
+    assert stats["size"] == 1
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
 def test_get_all_products(product_tester):
     # Add 10 products
     for product_num in range(10):
@@ -266,6 +329,39 @@ def test_get_all_products(product_tester):
         assert product_tester.no_error()
 
 
+def test_get_all_products_pages(product_tester):
+    for product_num in range(7):
+        _ = product_tester.create_product(
+            product_name=f"product_{product_num}", product_price=1.0
+        )
+
+    seen = []
+    params = {"limit": 3, "count": "true"}
+    while True:
+        response = product_tester.get_all_machines(**params)
+        assert product_tester.no_error()
+        assert response.headers["X-Total-Count"] == "7"
+        seen.append([product["product_id"] for product in response.json])
+
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after"] = response.headers["X-Next-Cursor"]
+
+    assert seen == [[1, 2, 3], [4, 5, 6], [7]]
+
+    # The total is only counted when asked for
+    response = product_tester.get_all_machines(limit=3)
+    assert "X-Total-Count" not in response.headers
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"after": "bm9wZQ"}])
+def test_get_all_products_bad_page(product_tester, params):
+    _ = product_tester.create_product(product_name="product", product_price=1.0)
+
+    _ = product_tester.get_all_machines(**params)
+    assert product_tester.expect_error(expected_error="Pagination Error")
+
+
 def test_get_all_products_fail(product_tester):
     _ = product_tester.get_all_machines()
     assert product_tester.expect_error(
@@ -309,6 +405,67 @@ def test_get_machine_with_product(product_tester, machine_tester, app):
         )
 
 
+def test_get_machine_with_product_filters(product_tester, machine_tester):
+    _ = product_tester.create_product(product_name="product_1", product_price=100.0)
+    assert product_tester.no_error()
+
+    # Machine n holds n - 1 of the product
+    for machine_id in range(1, 8):
+        _ = machine_tester.create_machine(
+            location=f"location_{machine_id}", name="John"
+        )
+        _ = machine_tester.add_product_to_machine(
+            machine_id=machine_id,
+            json={"stock_list": [{"product_id": 1, "quantity": 1}]},
+        )
+        _ = machine_tester.buy_product_from_machine(
+            machine_id=machine_id, product_id=1, json={"payment": 100}
+        )
+        _ = machine_tester.add_product_to_machine(
+            machine_id=machine_id,
+            json={"stock_list": [{"product_id": 1, "quantity": machine_id - 1}]},
+        )
+        assert machine_tester.no_error()
+
+    response = product_tester.where_product(product_id=1)
+    assert len(response.json) == 7
+
+    response = product_tester.where_product(product_id=1, in_stock_only="true")
+    assert [machine["machine_id"] for machine in response.json] == [2, 3, 4, 5, 6, 7]
+
+    response = product_tester.where_product(product_id=1, min_quantity=5)
+    assert [machine["quantity"] for machine in response.json] == [5, 6]
+
+    # Walk through the pages using the returned cursor
+    seen = []
+    params = {"limit": 3}
+    while True:
+        response = product_tester.where_product(product_id=1, **params)
+        assert len(response.json) <= 3
+        seen.extend(machine["machine_id"] for machine in response.json)
+
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["after"] = response.headers["X-Next-Cursor"]
+
+    assert seen == list(range(1, 8))
+
+    # Cursors which can't be a machine id
+    for cursor in ["???", encode_cursor([1, 2]), encode_cursor("one")]:
+        _ = product_tester.where_product(product_id=1, after=cursor)
+        assert product_tester.expect_error(expected_error="Pagination Error")
+
+    for min_quantity in ["-1", "two", "1.5"]:
+        _ = product_tester.where_product(product_id=1, min_quantity=min_quantity)
+        assert product_tester.expect_error(
+            expected_error="Pagination Error",
+            value=f"Invalid min_quantity. (Expected a non-negative integer, got {min_quantity})",
+        )
+
+    response = product_tester.where_product(product_id=1, min_quantity="0")
+    assert len(response.json) == 7
+
+
 def test_get_machine_with_product_fail(product_tester):
     # product not found
     _ = product_tester.where_product(product_id=42)
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.extensions import db
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.sale_rollup import SaleRollup
+from app.models.vending_machine import Machine
+from app.utils import time_series
+from app.utils.log import Log
+
+
+@pytest.fixture()
+def seeded(app):
+    with app.app_context():
+        for name in ("john", "jane"):
+            db.session.add(Machine.make(location="some_place", name=name).object)
+        for name in ("Candy", "Soda"):
+            db.session.add(Product.make(name=name, price=10.0).object)
+        db.session.commit()
+    return app
+
+
+def sell(machine_id, product_id, sold_at, quantity=1, price="10"):
+    amount = Decimal(price) * quantity
+    Sale.write(
+        [
+            {
+                "purchase_id": "x",
+                "machine_id": machine_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": Decimal(price),
+                "amount": amount,
+                "paid": amount,
+                "change": Decimal(0),
+                "sold_at": sold_at,
+            }
+        ]
+    )
+    db.session.commit()
+
+
+def rollups(period):
+    return db.session.execute(
+        db.select(
+            SaleRollup.bucket,
+            SaleRollup.machine_id,
+            SaleRollup.product_id,
+            SaleRollup.sales,
+            SaleRollup.units,
+            SaleRollup.revenue,
+        )
+        .where(SaleRollup.period == period)
+        .order_by(SaleRollup.bucket, SaleRollup.machine_id, SaleRollup.product_id)
+    ).all()
+
+
+def test_refresh_is_incremental(seeded):
+    with seeded.app_context():
+        sell(1, 1, datetime(2022, 1, 1, 10, 5))
+        sell(1, 1, datetime(2022, 1, 1, 10, 50), quantity=2)
+        sell(1, 2, datetime(2022, 1, 1, 11, 0))
+        sell(2, 1, datetime(2022, 1, 2, 9, 0), price="2.5")
+
+        assert SaleRollup.refresh(lag=0) == 4
+        db.session.commit()
+
+        assert rollups("day") == [
+            (datetime(2022, 1, 1), 1, 1, 2, 3, Decimal("30")),
+            (datetime(2022, 1, 1), 1, 2, 1, 1, Decimal("10")),
+            (datetime(2022, 1, 2), 2, 1, 1, 1, Decimal("2.5")),
+        ]
+        assert len(rollups("hour")) == 3
+
+        # Nothing new, nothing added
+        assert SaleRollup.refresh(lag=0) == 0
+
+        # Added onto the existing buckets
+        sell(1, 1, datetime(2022, 1, 1, 10, 59))
+        assert SaleRollup.refresh(lag=0) == 1
+        db.session.commit()
+
+        assert rollups("hour")[0] == (
+            datetime(2022, 1, 1, 10),
+            1,
+            1,
+            3,
+            4,
+            Decimal("40"),
+        )
+        assert rollups("day")[0] == (datetime(2022, 1, 1), 1, 1, 3, 4, Decimal("40"))
+
+
+def test_refresh_leaves_recent_sales(seeded):
+    with seeded.app_context():
+        sell(1, 1, datetime.today() - timedelta(hours=1))
+        sell(1, 1, datetime.today())
+
+        assert SaleRollup.refresh(lag=60) == 1
+        assert SaleRollup.refresh(lag=0) == 1
+
+
+def test_rollup_endpoints(seeded):
+    with seeded.app_context():
+        sell(1, 1, datetime(2022, 1, 1, 10, 5))
+        sell(1, 2, datetime(2022, 1, 1, 11, 0), quantity=3)
+        sell(2, 1, datetime(2022, 1, 2, 9, 0))
+
+    result = seeded.test_cli_runner().invoke(args=["rollup", "refresh", "--lag", "0"])
+    assert result.output == "Added 3 sale(s) to the rollups.\n"
+
+    client = seeded.test_client()
+
+    response = client.get("/machine/1/rollup", query_string={"bucket": "hour"})
+    assert [(row["units"], row["revenue"]) for row in response.json] == [
+        (1, "10.00"),
+        (3, "30.00"),
+    ]
+
+    response = client.get("/machine/rollup")
+    assert response.json == [
+        {"machine_id": 1, "sales": 2, "units": 4, "revenue": "40.00"},
+        {"machine_id": 2, "sales": 1, "units": 1, "revenue": "10.00"},
+    ]
+
+    response = client.get("/product/rollup", query_string={"from": "2022-01-02"})
+    assert response.json == [
+        {"product_id": 1, "sales": 1, "units": 1, "revenue": "10.00"}
+    ]
+
+    response = client.get("/product/1/rollup")
+    assert [row["units"] for row in response.json] == [1, 1]
+
+
+def test_rollup_bucket_must_be_stored(seeded):
+    response = seeded.test_client().get(
+        "/machine/rollup", query_string={"bucket": "minute"}
+    )
+    assert Log.make_from_response(response).has_error(
+        time_series.ERROR, "Invalid bucket. (Expected one of hour, day, got minute)"
+    )
@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+import pytest
+
+from tests.benchmarks import stress
+from tests.benchmarks.fleet import FleetSize, seed
+
+
+# Served to threads of a real server, on their own connections
+@pytest.mark.committed
+def test_concurrent_purchases_keep_the_invariants(app):
+    fleet = seed(app, FleetSize(machines=2, products=3, stock=2, quantity=10))
+
+    summary, violations = stress.stress(app, fleet, clients=8, requests=10)
+
+    assert violations == []
+    assert summary["requests"] == 80
+    # More purchases than stock, every unit is sold and the rest refused
+    assert summary["sold"] == 40
+    assert summary["refused"] == {"Product is out of stock.": 40}
+    assert sum(summary["histogram"].values()) == 80
+
+
+def test_check_reports_oversold_stock():
+    before = stress.State(
+        quantities={(1, 1): 1},
+        balances={1: Decimal("0.00")},
+        prices={1: Decimal("2.50")},
+    )
+    after = stress.State(
+        quantities={(1, 1): -1},
+        balances={1: Decimal("5.00")},
+        prices={1: Decimal("2.50")},
+    )
+    sold = [stress.Outcome(1, 1, 200, None, 0.01) for _ in range(2)]
+    failed = [stress.Outcome(1, 1, 500, "boom", 0.01)]
+
+    assert stress.check(before, after, sold + failed) == [
+        "Negative stock of product 1 in machine 1: -1",
+        "1 request(s) failed with a server error",
+    ]
+    assert stress.check(before, before, sold) == [
+        "Stock of product 1 in machine 1 is 1, expected -1 ( 1 - 2 sold )",
+        "Balance of machine 1 is 0.00, expected 5.00",
+    ]
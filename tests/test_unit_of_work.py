@@ -0,0 +1,58 @@
+import pytest
+
+from app.extensions import db
+from app.models.product import Product
+
+
+def stage_product(name):
+    db.session.add(Product.make(name=name, price=1.0).object)
+
+
+def products(app):
+    with app.app_context():
+        return [product.product_name for product in Product.query.all()]
+
+
+def test_changes_are_committed_after_the_view(app):
+    def view():
+        stage_product("Candy")
+        return "ok"
+
+    app.add_url_rule("/stage", view_func=view, methods=["POST"])
+    assert app.test_client().post("/stage").status_code == 200
+    assert products(app) == ["Candy"]
+
+
+def test_failed_requests_are_rolled_back(app):
+    def raising():
+        stage_product("Candy")
+        raise RuntimeError("boom")
+
+    def server_error():
+        stage_product("Soda")
+        return "nope", 500
+
+    app.add_url_rule("/raise", view_func=raising, methods=["POST"])
+    app.add_url_rule("/error", view_func=server_error, methods=["POST"])
+
+    with pytest.raises(RuntimeError):
+        app.test_client().post("/raise")
+    assert app.test_client().post("/error").status_code == 500
+
+    assert products(app) == []
+
+
+def test_duplicates_only_undo_their_own_insert(app):
+    def view():
+        stage_product("Soda")
+        duplicate, _ = Product.make(name="Candy", price=2.0)
+        stage_product("Chips")
+        return "ok" if duplicate is None else "unexpected"
+
+    with app.app_context():
+        db.session.add(Product(name="Candy", price=1.0))
+        db.session.commit()
+
+    app.add_url_rule("/stage", view_func=view, methods=["POST"])
+    assert app.test_client().post("/stage").data == b"ok"
+    assert sorted(products(app)) == ["Candy", "Chips", "Soda"]
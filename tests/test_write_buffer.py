@@ -0,0 +1,167 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models.product import Product
+from app.models.sale import Sale, sale_buffer
+from app.models.vending_machine import Machine
+from app.models.vending_machine_record import StockRecord, snapshot_buffer
+from app.models.vending_machine_stock import MachineStock
+from app.utils.write_buffer import WriteBehindBuffer
+from tests.conftest import AppTestConfig
+from tests.fixtures.database import committed
+
+
+class BufferedConfig(AppTestConfig):
+    SNAPSHOT_MODE = "buffered"
+    SNAPSHOT_BUFFER_SIZE = 1000
+    SNAPSHOT_FLUSH_INTERVAL = 60.0
+    SALE_MODE = "buffered"
+    SALE_BUFFER_SIZE = 1000
+    SALE_FLUSH_INTERVAL = 60.0
+
+
+@pytest.fixture()
+def buffered_app(schema):
+    with committed(create_app(config_class=BufferedConfig)) as app:
+        yield app
+        app.extensions[snapshot_buffer.name].close()
+        app.extensions[sale_buffer.name].close()
+
+
+def seed(app):
+    with app.app_context():
+        db.session.add(Machine.make(location="some_place", name="john").object)
+        db.session.add(Machine.make(location="other_place", name="jane").object)
+        db.session.add(Product.make(name="Candy", price=100.0).object)
+        db.session.add(Product.make(name="Cola", price=100.0).object)
+        db.session.commit()
+
+
+def test_snapshots_are_deferred_until_flush(buffered_app):
+    seed(buffered_app)
+    client = buffered_app.test_client()
+
+    client.post(
+        "/machine/1/add",
+        json={
+            "stock_list": [
+                {"product_id": 1, "quantity": 10},
+                {"product_id": 2, "quantity": 5},
+            ]
+        },
+    )
+    client.post("/machine/1/buy/1", json={"payment": 100})
+    client.post("/machine/1/buy/1", json={"payment": 100})
+
+    with buffered_app.app_context():
+        assert StockRecord.machine_time_stamp_in_records(machine_id=1) == []
+
+        # Records for the same product within one second are coalesced
+        pending = snapshot_buffer.pending()
+        assert 2 <= pending <= 4
+        assert snapshot_buffer.flush() == pending
+        assert snapshot_buffer.pending() == 0
+
+        records = StockRecord.machine_time_stamp_in_records(machine_id=1)
+        latest = {record.product_id: record.quantity for record in records}
+        assert latest == {1: 8, 2: 5}
+
+
+def test_rolled_back_snapshots_are_dropped(buffered_app):
+    seed(buffered_app)
+
+    with buffered_app.app_context():
+        db.session.add(MachineStock.make(machine_id=1, product_id=1, quantity=3).object)
+        db.session.commit()
+
+        stock = MachineStock.get(machine_id=1, product_id=1)
+        stock.add_stock(amount=2)
+        db.session.rollback()
+
+        assert snapshot_buffer.pending() == 0
+        assert snapshot_buffer.flush() == 0
+
+
+def test_destroyed_machine_snapshots_are_discarded(buffered_app):
+    seed(buffered_app)
+    client = buffered_app.test_client()
+
+    for machine_id in [1, 2]:
+        client.post(
+            f"/machine/{machine_id}/add",
+            json={"stock_list": [{"product_id": 1, "quantity": 10}]},
+        )
+    client.post("/machine/1/destroy")
+
+    with buffered_app.app_context():
+        assert snapshot_buffer.pending() == 1
+        assert snapshot_buffer.flush() == 1
+        assert snapshot_buffer.pending() == 0
+
+        records = StockRecord.machine_time_stamp_in_records(machine_id=2)
+        assert [record.quantity for record in records] == [10]
+
+
+def test_destroyed_machine_sales_are_discarded(buffered_app):
+    seed(buffered_app)
+    client = buffered_app.test_client()
+
+    for machine_id in [1, 2]:
+        client.post(
+            f"/machine/{machine_id}/add",
+            json={"stock_list": [{"product_id": 1, "quantity": 10}]},
+        )
+        client.post(f"/machine/{machine_id}/buy/1", json={"payment": 100})
+    client.post("/machine/1/destroy")
+
+    with buffered_app.app_context():
+        assert sale_buffer.pending() == 1
+        assert sale_buffer.flush() == 1
+        assert sale_buffer.pending() == 0
+
+        sales = db.session.execute(db.select(Sale.machine_id)).scalars().all()
+        assert sales == [2]
+
+
+def test_rejected_rows_are_dropped(buffered_app):
+    seed(buffered_app)
+
+    with buffered_app.app_context():
+        time_stamp = datetime(2022, 1, 1)
+        for machine_id in [1, 99]:
+            snapshot_buffer.queue(
+                key=(machine_id, 1, time_stamp),
+                row=StockRecord._row(machine_id, 1, time_stamp, 5),
+            )
+
+        assert snapshot_buffer.flush() == 1
+        assert snapshot_buffer.pending() == 0
+        assert len(StockRecord.machine_time_stamp_in_records(machine_id=1)) == 1
+
+
+def test_buffer_flushes_when_full(buffered_app):
+    written = []
+    done = threading.Event()
+
+    def writer(rows):
+        written.extend(rows)
+        done.set()
+
+    buffer = WriteBehindBuffer(name="test_buffer", config_prefix="TEST", writer=writer)
+    buffered_app.config.update(
+        TEST_MODE="buffered", TEST_BUFFER_SIZE=3, TEST_FLUSH_INTERVAL=60.0
+    )
+    buffer.init_app(buffered_app)
+
+    with buffered_app.app_context():
+        for key, value in [(0, 0), (1, 1), (0, 2), (2, 3)]:
+            assert buffer.put(key=key, row={"value": value})
+        db.session.commit()
+
+    assert done.wait(timeout=5)
+    assert sorted(row["value"] for row in written) == [1, 2, 3]
+    buffered_app.extensions[buffer.name].close()